@@ -1,4 +1,6 @@
-from utils.db_utils import execute_query, execute_write
+from utils.db_utils import execute_query
+from utils.milk_ingest import ingest_milk_records
+from config.database import close_db_connection
 from datetime import datetime, timedelta
 import random
 import logging
@@ -11,8 +13,9 @@ def add_sample_milk_data():
         # Get all cow IDs
         cows = execute_query('animals.db', "SELECT id FROM animal WHERE type = 'Cow'")
         
-        # Add milk production records for the last 7 days
+        # Build milk production records for the last 7 days
         today = datetime.now()
+        rows = []
         for cow in cows:
             for i in range(7):
                 date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
@@ -20,39 +23,23 @@ def add_sample_milk_data():
                 # Morning milk (higher production)
                 morning_amount = round(random.uniform(8.0, 15.0), 2)
                 morning_fat = round(random.uniform(3.0, 5.0), 2)
-                execute_write('animals.db', '''
-                    INSERT INTO milk_production (
-                        animal_id, production_date, amount, 
-                        time_of_day, fat_content
-                    ) VALUES (?, ?, ?, ?, ?)
-                ''', (cow['id'], date, morning_amount, 'morning', morning_fat))
+                rows.append((cow['id'], date, morning_amount, 'morning', morning_fat, None))
                 
                 # Evening milk (lower production)
                 evening_amount = round(random.uniform(6.0, 12.0), 2)
                 evening_fat = round(random.uniform(3.0, 5.0), 2)
-                execute_write('animals.db', '''
-                    INSERT INTO milk_production (
-                        animal_id, production_date, amount, 
-                        time_of_day, fat_content
-                    ) VALUES (?, ?, ?, ?, ?)
-                ''', (cow['id'], date, evening_amount, 'evening', evening_fat))
-                
-                # Update total milk production for the cow
-                execute_write('animals.db', '''
-                    UPDATE animal 
-                    SET milk_production = (
-                        SELECT SUM(amount) 
-                        FROM milk_production 
-                        WHERE animal_id = ? AND production_date = ?
-                    )
-                    WHERE id = ?
-                ''', (cow['id'], date, cow['id']))
+                rows.append((cow['id'], date, evening_amount, 'evening', evening_fat, None))
         
+        # Insert everything in one transaction; daily totals are kept by the
+        # milk_production triggers
+        ingest_milk_records(rows)
         logger.info("Sample milk production data added successfully")
         
     except Exception as e:
         logger.error(f"Error adding sample milk data: {str(e)}")
         raise
+    finally:
+        close_db_connection()
 
 if __name__ == '__main__':
-    add_sample_milk_data()
\ No newline at end of file
+    add_sample_milk_data()
@@ -1,6 +1,11 @@
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
-from config.database import init_db
+from config.database import init_db, close_db_connection
+from config.config import Config
+from utils.scheduler import init_scheduler, shutdown_scheduler
+from utils.socket_handler import socketio, init_socketio
+import atexit
+import os
 import threading
 import webbrowser
 
@@ -8,14 +13,39 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 csrf = CSRFProtect(app)
 
+# The cookie only holds a server-side session id, so it is not re-sent on every response
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+
+# Reject oversized request bodies from their Content-Length before reading them
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+
+# Return pooled database connections at the end of every request
+app.teardown_appcontext(close_db_connection)
+
 # Initialize database
 with app.app_context():
     init_db()
 
 
+# Register the Socket.IO handlers; their background threads start on first use
+init_socketio(app)
+
 # Import routes after app is created to avoid circular imports
 from routes import *
 
+def serve(debug=True):
+    """Run the development Socket.IO server together with the scheduled jobs.
+
+    The scheduler is started here rather than at import, because this
+    module is imported a second time as ``app`` by routes and re-run by
+    every spawned worker process. Under the reloader only the child
+    process that serves requests starts it.
+    """
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_scheduler(app)
+        atexit.register(shutdown_scheduler)
+    socketio.run(app, debug=debug, allow_unsafe_werkzeug=True)
+
 if __name__ == '__main__':
     def _open_browser():
         try:
@@ -25,4 +55,4 @@ if __name__ == '__main__':
             pass
 
     threading.Timer(1.0, _open_browser).start()
-    app.run(debug=True)
+    serve()
@@ -0,0 +1,138 @@
+"""Benchmark the GET /api/animals herd query against the old fan-out query.
+
+Builds a throwaway animals.db with one farmer's herd and ~1M health_metrics
+rows, then times the previous LEFT JOIN + GROUP BY query against the
+animal_latest_state lookup in utils.herd_queries.
+
+    python -m benchmarks.bench_animal_list --animals 200 --health-rows 1000000
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from config import database
+from utils.herd_queries import LATEST_STATE_QUERY
+from utils.migrations import migrate_database
+
+# The query get_all_animals used before the latest-state engine, with its
+# milk subquery pointed at production_date so that it runs at all.
+FAN_OUT_QUERY = '''
+    SELECT a.*,
+           hm.temperature as last_temp,
+           hm.record_date as last_checkup,
+           mp.amount as milk_production,
+           v.next_due_date as next_vaccination
+    FROM animal a
+    LEFT JOIN health_metrics hm ON a.id = hm.animal_id
+    LEFT JOIN (
+        SELECT animal_id, amount
+        FROM milk_production
+        WHERE (animal_id, production_date) IN (
+            SELECT animal_id, MAX(production_date)
+            FROM milk_production
+            GROUP BY animal_id
+        )
+    ) mp ON a.id = mp.animal_id
+    LEFT JOIN vaccinations v ON a.id = v.animal_id
+    WHERE a.user_id = ?
+    GROUP BY a.id
+'''
+
+def populate(conn, animals, health_rows, vaccinations, milk_days):
+    """Fill the database with a single user's herd and its history"""
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    conn.executemany(
+        'INSERT INTO animal (user_id, name, type, breed, age, weight, milk_production) '
+        'VALUES (1, ?, ?, ?, ?, ?, ?)',
+        [(f'Animal {i}', rng.choice(['Cow', 'Buffalo']), 'Gir', rng.randint(6, 120),
+          rng.uniform(250, 600), rng.uniform(0, 20)) for i in range(animals)]
+    )
+
+    per_animal = max(health_rows // animals, 1)
+    batch = []
+    for animal_id in range(1, animals + 1):
+        for i in range(per_animal):
+            batch.append((
+                animal_id,
+                round(rng.uniform(37.0, 40.5), 1),
+                rng.randint(40, 110),
+                rng.randint(15, 45),
+                (start + timedelta(hours=i * 6)).strftime('%Y-%m-%d %H:%M:%S')
+            ))
+        if len(batch) >= 100000:
+            _insert_health(conn, batch)
+            batch = []
+    _insert_health(conn, batch)
+
+    conn.executemany(
+        'INSERT INTO vaccinations (animal_id, vaccine_name, date_given, next_due_date) '
+        'VALUES (?, ?, ?, ?)',
+        [(animal_id, 'FMD', (start + timedelta(days=180 * i)).strftime('%Y-%m-%d'),
+          (start + timedelta(days=180 * (i + 1))).strftime('%Y-%m-%d'))
+         for animal_id in range(1, animals + 1) for i in range(vaccinations)]
+    )
+    conn.executemany(
+        'INSERT INTO milk_production (animal_id, production_date, amount, time_of_day) '
+        'VALUES (?, ?, ?, ?)',
+        [(animal_id, (start + timedelta(days=d)).strftime('%Y-%m-%d'),
+          round(rng.uniform(4, 12), 2), session)
+         for animal_id in range(1, animals + 1)
+         for d in range(milk_days)
+         for session in ('morning', 'evening')]
+    )
+    conn.commit()
+
+def _insert_health(conn, rows):
+    conn.executemany(
+        'INSERT INTO health_metrics (animal_id, temperature, heart_rate, respiratory_rate, record_date) '
+        'VALUES (?, ?, ?, ?, ?)',
+        rows
+    )
+
+def time_query(conn, query, repeat):
+    """Return the best wall-clock time in ms and the row count of a query"""
+    best = float('inf')
+    rows = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = conn.execute(query, (1,)).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--animals', type=int, default=200)
+    parser.add_argument('--health-rows', type=int, default=1_000_000)
+    parser.add_argument('--vaccinations', type=int, default=8, help='per animal')
+    parser.add_argument('--milk-days', type=int, default=365, help='per animal')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-fan-out', action='store_true',
+                        help='do not time the old fan-out query')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_DIR = tmp
+        migrate_database('animals.db')
+        conn = database.get_db_connection('animals.db')
+
+        started = time.perf_counter()
+        populate(conn, args.animals, args.health_rows, args.vaccinations, args.milk_days)
+        print(f"Populated {args.animals} animals / {args.health_rows} health rows "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        latest_ms, latest_rows = time_query(conn, LATEST_STATE_QUERY, args.repeat)
+        print(f"latest-state query : {latest_ms:10.2f} ms  ({latest_rows} rows)")
+
+        if not args.skip_fan_out:
+            fan_out_ms, fan_out_rows = time_query(conn, FAN_OUT_QUERY, 1)
+            print(f"fan-out query      : {fan_out_ms:10.2f} ms  ({fan_out_rows} rows)")
+            print(f"speed-up           : {fan_out_ms / latest_ms:10.1f}x")
+
+        database.close_db_connection()
+        database.dispose_pools()
+
+if __name__ == '__main__':
+    main()
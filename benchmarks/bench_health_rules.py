@@ -0,0 +1,137 @@
+"""Benchmark herd-wide health classification against the per-animal checks.
+
+Builds a throwaway animals.db with a 100k animal herd and times the
+scheduler's scan both ways: dict rows scored one animal at a time in Python
+(as get_animal_health and the scheduler used to do) against column lists
+scored by utils.health_rules.classify_arrays in one NumPy pass.
+
+    python -m benchmarks.bench_health_rules --animals 100000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from config import database
+from config.config import Config
+from utils.health_rules import (
+    SPECIES_RULES, DEFAULT_SPECIES, DAIRY_SPECIES, DRAUGHT_SPECIES, TEMP_MARGIN,
+    classify_arrays, classify_herd
+)
+from utils.herd_queries import fetch_latest_readings, fetch_latest_reading_columns
+from utils.migrations import migrate_database
+
+def _reading(rng, low, high, abnormal):
+    """A reading inside the normal range, or just outside it with probability ``abnormal``"""
+    if rng.random() < abnormal:
+        return high * 1.1 if rng.random() < 0.5 else low * 0.9
+    return rng.uniform(low, high)
+
+def populate(conn, animals, abnormal):
+    """One reading per animal, mostly within its species' normal ranges"""
+    rng = random.Random(42)
+    species = list(SPECIES_RULES)
+    conn.executemany(
+        'INSERT INTO animal (user_id, name, type, breed, weight, milk_production) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [(i % 500 + 1, f'Animal {i}', rng.choice(species), 'Gir',
+          rng.uniform(250, 700), rng.uniform(0, 25)) for i in range(animals)]
+    )
+    rows = []
+    for animal in conn.execute('SELECT id, type FROM animal').fetchall():
+        rules = SPECIES_RULES[animal['type']]
+        rows.append((
+            animal['id'],
+            round(_reading(rng, rules['temp'][0], rules['temp'][1] - TEMP_MARGIN, abnormal), 1),
+            int(_reading(rng, *rules['heart'], abnormal)),
+            None if rng.random() < 0.2 else int(_reading(rng, *rules['resp'], abnormal)),
+        ))
+    conn.executemany(
+        'INSERT INTO health_metrics (animal_id, temperature, heart_rate, respiratory_rate) '
+        'VALUES (?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+
+def classify_loop(rows):
+    """The same rules as classify_arrays, one animal at a time"""
+    statuses = []
+    for row in rows:
+        rules = SPECIES_RULES.get(row['type'], SPECIES_RULES[DEFAULT_SPECIES])
+        status = 0
+        temp = row['last_temp']
+        if temp:
+            if temp > rules['temp'][1]:
+                status = 2
+            elif temp > rules['temp'][1] - TEMP_MARGIN or temp < rules['temp'][0]:
+                status = max(status, 1)
+        heart = row['last_heart_rate']
+        if heart:
+            if heart >= Config.HEART_RATE_CRITICAL:
+                status = 2
+            elif heart > rules['heart'][1] or heart < rules['heart'][0]:
+                status = max(status, 1)
+        resp = row['last_respiratory_rate']
+        if resp and (resp < rules['resp'][0] or resp > rules['resp'][1]):
+            status = max(status, 1)
+        if row['type'] in DAIRY_SPECIES:
+            if row['milk_production'] and row['milk_production'] < rules['milk_min']:
+                status = max(status, 1)
+        elif row['type'] in DRAUGHT_SPECIES:
+            if row['weight'] and row['weight'] < rules['weight_min']:
+                status = max(status, 1)
+        statuses.append(status)
+    return statuses
+
+def best_of(func, repeat):
+    """Return the best wall-clock time in ms and the result of ``func()``"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--animals', type=int, default=100_000)
+    parser.add_argument('--abnormal', type=float, default=0.03,
+                        help='share of readings outside the normal range')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_DIR = tmp
+        migrate_database('animals.db')
+        conn = database.get_db_connection('animals.db')
+        populate(conn, args.animals, args.abnormal)
+
+        rows = fetch_latest_readings(conn)
+        columns = fetch_latest_reading_columns(conn)
+
+        def vectorized(herd):
+            return classify_arrays(
+                herd['type'], herd['last_temp'], herd['last_heart_rate'],
+                herd['last_respiratory_rate'], herd['milk_production'], herd['weight']
+            )
+
+        loop_ms, statuses = best_of(lambda: classify_loop(rows), args.repeat)
+        herd_ms, _ = best_of(lambda: classify_herd(rows), args.repeat)
+        array_ms, health = best_of(lambda: vectorized(columns), args.repeat)
+        scan_loop_ms, _ = best_of(lambda: classify_loop(fetch_latest_readings(conn)), args.repeat)
+        scan_array_ms, _ = best_of(lambda: vectorized(fetch_latest_reading_columns(conn)), args.repeat)
+
+        assert health.status.tolist() == statuses, 'vectorized and per-animal results differ'
+        print(f"{len(rows)} animals: {health.counts()}")
+        print(f"per-animal loop (dict rows)      : {loop_ms:10.2f} ms")
+        print(f"classify_herd (dict rows)        : {herd_ms:10.2f} ms")
+        print(f"classify_arrays (columns)        : {array_ms:10.2f} ms  ({loop_ms / array_ms:.1f}x)")
+        print(f"scan + loop                      : {scan_loop_ms:10.2f} ms")
+        print(f"columnar scan + classify_arrays  : {scan_array_ms:10.2f} ms  ({scan_loop_ms / scan_array_ms:.1f}x)")
+
+        database.close_db_connection()
+        database.dispose_pools()
+
+if __name__ == '__main__':
+    main()
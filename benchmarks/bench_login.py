@@ -0,0 +1,125 @@
+"""Benchmark login throughput with password hashing inline and on the process pool.
+
+Runs concurrent POST /login requests through the Flask test client against
+a throwaway users.db, once with PBKDF2 on the request thread and once on
+utils.password_utils' process pool, and reports requests/s, median and p99
+latency. A 10 ms heartbeat runs alongside, standing in for Socket.IO
+traffic; its worst lag shows how long logins hold up everything else.
+
+Requests run on OS threads, as under the threading Socket.IO server.
+With --eventlet the process is monkey-patched first, so request "threads"
+are green threads sharing one hub.
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 10
+"""
+import sys
+
+if '--eventlet' in sys.argv:
+    import eventlet
+    eventlet.monkey_patch()
+
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+
+from config import database
+from config.config import Config
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def heartbeat(stop, lags, interval=0.01):
+    """Record how late a periodic tick fires while logins run"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        time.sleep(interval)
+        lags.append(max(time.perf_counter() - expected, 0))
+
+def run(app, hasher, workers, users, logins, concurrency):
+    hasher.workers = workers
+    latencies = []
+    failures = []
+    counter = iter(range(logins))
+    counter_lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            # A distinct client address per login keeps the login rate limit out of the way
+            response = test_client.post('/login', data={
+                'email': f'user{n % users}@example.com', 'password': 'Passw0rd1'
+            }, environ_base={'REMOTE_ADDR': f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                failures.append(response.status_code)
+
+    # Warm up the pool so process start-up is not counted
+    if workers:
+        hasher.hash('warm-up')
+    stop = threading.Event()
+    lags = []
+    ticker = threading.Thread(target=heartbeat, args=(stop, lags))
+    ticker.start()
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    ticker.join()
+
+    label = f'pool ({workers} workers)' if workers else 'inline'
+    print(f"{label:18}: {logins / elapsed:8.1f} logins/s, median "
+          f"{statistics.median(latencies) * 1000:7.1f} ms, p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, "
+          f"heartbeat max lag {max(lags, default=0) * 1000:7.1f} ms"
+          + (f", {len(failures)} failed" if failures else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=Config.PASSWORD_HASH_WORKERS or 2)
+    parser.add_argument('--iterations', type=int, default=Config.PASSWORD_HASH_ITERATIONS)
+    parser.add_argument('--eventlet', action='store_true',
+                        help='use eventlet green threads instead of OS threads')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_DIR = tmp
+        Config.PASSWORD_HASH_ITERATIONS = args.iterations
+        from app import app
+        from utils.password_utils import password_hasher, hash_method, _hash
+        app.config['WTF_CSRF_ENABLED'] = False
+        password_hasher.method = hash_method(args.iterations)
+
+        with app.app_context():
+            conn = database.get_db_connection('users.db')
+            password_hash = _hash('Passw0rd1', password_hasher.method)
+            conn.executemany(
+                'INSERT INTO users (name, email, mobile, password) VALUES (?, ?, ?, ?)',
+                [(f'User {i}', f'user{i}@example.com', f'9{i:09d}', password_hash)
+                 for i in range(args.users)]
+            )
+            conn.commit()
+
+        print(f"{args.logins} logins, {args.concurrency} concurrent, "
+              f"pbkdf2 {args.iterations} iterations, "
+              f"{'eventlet green threads' if args.eventlet else 'OS threads'}")
+        run(app, password_hasher, 0, args.users, args.logins, args.concurrency)
+        run(app, password_hasher, args.workers, args.users, args.logins, args.concurrency)
+        password_hasher.shutdown()
+        database.dispose_pools()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Load test cross-process Socket.IO fan-out through the SQLite queue manager.
+
+Starts N worker processes, each a Socket.IO server holding its share of M
+clients spread over animal_<id> rooms. Every worker then emits alerts to
+random rooms plus periodic emergency broadcasts, as the scheduler would, and
+counts what reaches its own clients. Clients are attached at the manager
+level and deliveries are counted where the server hands packets to
+Engine.IO, so the test measures fan-out rather than network transport.
+
+Run once with the default in-process manager to show the messages that never
+leave their worker, and once with utils.socket_queue.SQLiteQueueManager.
+
+    python -m benchmarks.load_socket_fanout --workers 4 --clients 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import socketio
+
+from utils.socket_queue import SQLiteQueueManager
+
+class CountingServer(socketio.Server):
+    """Socket.IO server that records deliveries instead of sending them"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.delivered = 0
+        self.latencies = []
+        self._last_packet = None
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        self.delivered += 1
+        # One encoded packet is shared by all recipients of an emit
+        if eio_pkt is not self._last_packet:
+            self._last_packet = eio_pkt
+            event, data = json.loads(eio_pkt.data[1:])
+            self.latencies.append(time.time() - data['sent_at'])
+
+def schedule(worker, messages, rooms, broadcast_every):
+    """Deterministic (room or None, seq) list of the emits of one worker"""
+    rng = random.Random(worker)
+    return [
+        (None if seq % broadcast_every == 0 else f'animal_{rng.randint(1, rooms)}', seq)
+        for seq in range(1, messages + 1)
+    ]
+
+def run_worker(index, args, queue_url, barrier, results):
+    manager = SQLiteQueueManager(queue_url, poll_interval=args.poll_interval) if queue_url else None
+    server = CountingServer(async_mode='threading', client_manager=manager)
+    server.manager_initialized = True
+    server.manager.initialize()
+
+    local_rooms = {}
+    for client in range(index, args.clients, args.workers):
+        room = f'animal_{client % args.rooms + 1}'
+        sid = server.manager.connect(f'eio-{index}-{client}', '/')
+        server.manager.enter_room(sid, '/', room)
+        local_rooms[room] = local_rooms.get(room, 0) + 1
+    local_clients = sum(local_rooms.values())
+
+    # Every worker's emits are addressed to its own clients when no queue is
+    # shared, and to every worker's clients when one is
+    senders = range(args.workers) if queue_url else [index]
+    expected = sum(
+        local_clients if room is None else local_rooms.get(room, 0)
+        for sender in senders
+        for room, _ in schedule(sender, args.messages, args.rooms, args.broadcast_every)
+    )
+    wanted = sum(
+        local_clients if room is None else local_rooms.get(room, 0)
+        for sender in range(args.workers)
+        for room, _ in schedule(sender, args.messages, args.rooms, args.broadcast_every)
+    )
+
+    barrier.wait()
+    started = time.perf_counter()
+    for room, seq in schedule(index, args.messages, args.rooms, args.broadcast_every):
+        event = 'emergency' if room is None else 'alert'
+        server.emit(event, {'worker': index, 'seq': seq, 'sent_at': time.time()}, to=room)
+
+    deadline = time.monotonic() + args.timeout
+    while server.delivered < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results.put({
+        'worker': index,
+        'delivered': server.delivered,
+        'wanted': wanted,
+        'elapsed': time.perf_counter() - started,
+        'latencies': server.latencies,
+    })
+    results.close()
+    results.join_thread()
+    os._exit(0)  # the listener thread never returns
+
+def run(args, queue_url):
+    barrier = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(i, args, queue_url, barrier, results))
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    reports = [results.get(timeout=args.timeout + 60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    delivered = sum(r['delivered'] for r in reports)
+    wanted = sum(r['wanted'] for r in reports)
+    elapsed = max(r['elapsed'] for r in reports)
+    latencies = sorted(l for r in reports for l in r['latencies'])
+    label = 'sqlite queue' if queue_url else 'in-process'
+    # With fewer clients than rooms a worker's emits may all target empty rooms
+    ratio = f"{100 * delivered / wanted:.1f}%" if wanted else 'n/a'
+    print(f"{label:13}: delivered {delivered}/{wanted} ({ratio}) "
+          f"in {elapsed:.2f}s, {delivered / elapsed:,.0f} deliveries/s")
+    if latencies:
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+        print(f"{'':13}  emit latency median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {p95 * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--rooms', type=int, default=500, help='animal rooms')
+    parser.add_argument('--messages', type=int, default=2000, help='emits per worker')
+    parser.add_argument('--broadcast-every', type=int, default=100,
+                        help='every Nth emit is an emergency broadcast')
+    parser.add_argument('--poll-interval', type=float, default=0.01)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.clients} clients in {args.rooms} rooms, "
+          f"{args.messages} emits per worker")
+    run(args, None)
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args, f'sqlite:///{os.path.join(tmp, "socketio_queue.db")}')
+
+if __name__ == '__main__':
+    main()
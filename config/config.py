@@ -10,10 +10,57 @@ class Config:
     DB_PATH = 'sqlite:///data/'
     POOL_SIZE = 5
     MAX_OVERFLOW = 10
+    POOL_TIMEOUT = 30  # seconds to wait for a free connection
+    SQLITE_BUSY_TIMEOUT = 5000  # ms
+    SQLITE_CACHE_SIZE_KB = 20000  # page cache per connection
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 256MB
+    
+    # Listing Configuration
+    ANIMAL_PAGE_SIZE = 50
+    ANIMAL_PAGE_SIZE_MAX = 500
+    EXPORT_CHUNK_SIZE = 1000  # rows fetched per cursor round trip
+    MILK_BATCH_MAX = 10000  # session records per ingestion request
+    HERD_SUMMARY_CACHE_SIZE = 4096  # per-user herd summaries held in memory
+    
+    # Rollup Configuration
+    ROLLUP_COMPACTION_MINUTES = 5
+    ROLLUP_BATCH_SIZE = 50000  # raw rows folded per compaction transaction
+    ROLLUP_DEFAULT_DAYS = 30   # range served when no start is given
     
     # Socket Configuration
     SOCKET_PING_INTERVAL = 25
     SOCKET_PING_TIMEOUT = 120
+    # The scheduler, alert batcher and telemetry writer emit from native threads
+    SOCKETIO_ASYNC_MODE = 'threading'
+    # Cross-process fan-out for multiple workers: sqlite:///data/socketio_queue.db
+    # for the local SQLite queue, a redis:// or amqp:// URL, or None for one process
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_QUEUE_POLL_INTERVAL = 0.05  # seconds between SQLite queue polls
+    SOCKETIO_QUEUE_RETENTION = 60        # seconds queued messages are kept
+    
+    # Sensor Telemetry Configuration
+    TELEMETRY_QUEUE_SIZE = 50000      # readings held in memory
+    TELEMETRY_BATCH_SIZE = 500        # readings per group commit
+    TELEMETRY_FLUSH_INTERVAL = 1.0    # seconds between flushes
+    TELEMETRY_HIGH_WATERMARK = 0.8    # queue fraction that signals backpressure
+    
+    # Alert Fan-out Configuration
+    ALERT_BATCH_TICK = 0.5       # seconds alerts are collected per room before emitting
+    HEALTH_CHECK_MINUTES = 5     # interval of the full-herd health check, which repeats open alerts
+    # Identical alerts to a room are dropped this long; spanning two health
+    # checks keeps an unchanged condition from being re-sent on every run
+    ALERT_REPEAT_SECONDS = 2 * HEALTH_CHECK_MINUTES * 60
+    
+    # Event Bus Configuration
+    EVENT_BUS_QUEUE_SIZE = 1000   # queued events per async event type
+    EVENT_BUS_WORKERS = 2         # handler threads per async event type
+    EVENT_BUS_OVERFLOW = 'drop'   # 'drop' or 'block' when the queue is full
+    
+    # System Stats Configuration
+    # Comma-separated ids of the users allowed to read /api/system/*; nobody by default
+    SYSTEM_STATS_USER_IDS = frozenset(
+        int(user_id) for user_id in os.environ.get('SYSTEM_STATS_USER_IDS', '').split(',') if user_id.strip()
+    )
     
     # Health Monitoring Thresholds
     TEMPERATURE_HIGH = 39.5  # deg C
@@ -23,12 +70,66 @@ class Config:
     ACTIVITY_LOW = 30         # % of normal
     CHECKUP_REMINDER_DAYS = 30  # Days
     MILK_PRODUCTION_WARNING = 20  # % below average
+    ALERT_DEDUPE_MINUTES = 60   # repeat alerts per animal and type are suppressed this long
+    MONITOR_BATCH_SIZE = 5000   # new health_metrics rows processed per monitor transaction
+    HEALTH_MONITOR_MINUTES = 1  # interval of the incremental health metrics check
+    MILK_RECENT_DAYS = 7        # days averaged for the current milk yield
+    MILK_BASELINE_DAYS = 30     # days before them averaged for the baseline yield
+    MILK_RECENT_MIN_DAYS = 3    # recorded days needed in the recent window
+    MILK_BASELINE_MIN_DAYS = 10  # recorded days needed in the baseline window
+    MILK_DROP_ALERT_HOURS = 24  # one milk drop alert per animal in this window
+    MILK_DROP_CHECK_MINUTES = 15  # interval of the incremental milk yield check
     
+    # Lactation Forecast Configuration
+    LACTATION_HISTORY_DAYS = 400   # milk history read when fitting a lactation curve
+    LACTATION_GAP_DAYS = 45        # days without milk records that end a lactation
+    LACTATION_LENGTH_DAYS = 305    # days in milk after which an animal is forecast dry
+    LACTATION_MIN_POINTS = 14      # recorded days needed to fit Wood's curve
+    FORECAST_DEFAULT_DAYS = 30
+    FORECAST_MAX_DAYS = 90
+    
+    # Dashboard Configuration
+    MILK_PRICE_PER_LITRE = 45       # rupees, for the milk revenue KPIs
+    DASHBOARD_POLL_SECONDS = 30     # how often the dashboard revalidates its KPIs
+    
+    # Fodder Configuration
+    FODDER_CACHE_SIZE = 4096        # per-user, per-season fodder plans held in memory
+    
+    # Rate Limit Configuration
+    RATE_LIMIT_DEFAULT = 5    # requests per window when a route sets no limit
+    RATE_LIMIT_WINDOW = 60    # seconds
+    RATE_LIMIT_SHARDS = 16    # lock stripes of the in-memory counters
+    # Counters shared by multiple workers: sqlite:///data/rate_limit.db, or None per process
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE')
+
+    # Password Hashing Configuration
+    PASSWORD_HASH_ITERATIONS = 600000  # PBKDF2-SHA256 rounds; older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS = 2          # hashing processes, 0 hashes on the request thread
+    PASSWORD_HASH_QUEUE_SIZE = 64      # hashes queued or running before requests are turned away
+    PASSWORD_HASH_TIMEOUT = 10         # seconds to wait for a queue slot or a result
+
     # Session Configuration
     SESSION_TYPE = 'filesystem'
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes
+    SESSION_TIMEOUT = 3600          # idle seconds before a server-side session expires
+    SESSION_TOUCH_INTERVAL = 60     # seconds between last_activity writes per session
+    SESSION_CACHE_SIZE = 10000      # sessions held in the in-process LRU
+    SESSION_CACHE_TTL = 30          # seconds a cached session is trusted before re-reading it
+    SESSION_EXPIRY_MINUTES = 15     # interval of the bulk idle-session sweep
     
+    # QR Code Configuration
+    QR_CACHE_DIR = 'data/qr_cache'  # rendered QR PNGs, keyed on base URL and animal id
+    QR_CACHE_SIZE = 1024            # QR PNGs held in memory
+    QR_SHEET_WORKERS = 2            # processes laying out ear-tag sheet pages, 0 renders inline
+    QR_SHEET_MAX_ANIMALS = 2000     # tags per sheet request
+
     # Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'static/images/animals'
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    UPLOAD_MAX_PHOTO_BYTES = 5 * 1024 * 1024  # photos are cut off while streaming past this
+    UPLOAD_CHUNK_SIZE = 64 * 1024             # bytes copied per read
+    # WebP variants generated per photo: 'thumb' for grids, 'medium' for detail views
+    THUMBNAIL_SIZES = {'thumb': 320, 'medium': 1280}
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_WORKERS = 2                     # thumbnail processes, 0 generates inline
\ No newline at end of file
@@ -1,118 +1,241 @@
 import sqlite3
 import os
+import time
 import logging
-from flask import g
+import threading
+from collections import deque
+from flask import g, has_app_context
+from config.config import Config
 
 logger = logging.getLogger(__name__)
 
+DB_DIR = 'data'
+
+_pools = {}
+_pools_lock = threading.Lock()
+_local = threading.local()
+
 def dict_factory(cursor, row):
     """Convert database row objects to a dictionary"""
     fields = [column[0] for column in cursor.description]
     return {key: value for key, value in zip(fields, row)}
 
-def get_db_connection(db_name):
-    """Get a database connection with thread safety"""
-    if not hasattr(g, 'db_connections'):
-        g.db_connections = {}
-    
-    if db_name not in g.db_connections:
-        db_path = os.path.join('data', db_name)
-        conn = sqlite3.connect(db_path, check_same_thread=False)
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within POOL_TIMEOUT"""
+
+class PooledConnection:
+    """Proxy for a pooled sqlite3 connection; close() checks it back in"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self.closed = False
+
+    def __getattr__(self, name):
+        if self.closed:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        """Return the connection to its pool instead of closing it"""
+        if not self.closed:
+            self.closed = True
+            self._pool.release(self._conn)
+
+class ConnectionPool:
+    """Fixed-size pool of WAL-mode connections to a single SQLite file.
+
+    Up to ``pool_size`` connections are kept open between requests; under
+    load up to ``max_overflow`` extra connections are opened and closed
+    again when they are returned.
+    """
+
+    def __init__(self, db_path, pool_size, max_overflow, timeout):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        """Open a new connection and apply the tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            timeout=Config.SQLITE_BUSY_TIMEOUT / 1000
+        )
         conn.row_factory = dict_factory
-        g.db_connections[db_name] = conn
-        
-    return g.db_connections[db_name]
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(Config.SQLITE_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT)}')
+        return conn
+
+    def checkout(self):
+        """Take a connection from the pool, waiting up to ``timeout`` seconds"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No connection to {self.db_path} available within {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            if waited > 0.001:
+                self._stats['waits'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._stats['in_use'] -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['connects'] += 1
+
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Check a connection back in, discarding it if it is unusable"""
+        discard = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding pooled connection to {self.db_path}: {str(e)}")
+            discard = True
+
+        with self._cond:
+            self._stats['in_use'] -= 1
+            if discard or len(self._idle) >= self.pool_size:
+                self._open -= 1
+            else:
+                self._idle.append(conn)
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            conn.close()
+
+    def dispose(self):
+        """Close all idle connections"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+        stats['pool_size'] = self.pool_size
+        stats['max_overflow'] = self.max_overflow
+        checkouts = stats['checkouts'] or 1
+        stats['avg_wait_ms'] = round(stats.pop('wait_time_total') / checkouts * 1000, 3)
+        stats['max_wait_ms'] = round(stats.pop('wait_time_max') * 1000, 3)
+        return stats
+
+def get_pool(db_name):
+    """Return the connection pool for a database file, creating it on first use"""
+    pool = _pools.get(db_name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_name)
+            if pool is None:
+                os.makedirs(DB_DIR, exist_ok=True)
+                pool = ConnectionPool(
+                    os.path.join(DB_DIR, db_name),
+                    pool_size=Config.POOL_SIZE,
+                    max_overflow=Config.MAX_OVERFLOW,
+                    timeout=Config.POOL_TIMEOUT
+                )
+                _pools[db_name] = pool
+    return pool
+
+def get_pool_stats():
+    """Return checkout and wait-time statistics for every pool"""
+    return {db_name: pool.stats() for db_name, pool in list(_pools.items())}
+
+def dispose_pools():
+    """Close idle pooled connections, e.g. after forking a worker process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.dispose()
+
+def _scoped_connections():
+    """Connections checked out by the current request, or by this thread outside a request"""
+    if has_app_context():
+        if not hasattr(g, 'db_connections'):
+            g.db_connections = {}
+        return g.db_connections
+    if not hasattr(_local, 'db_connections'):
+        _local.db_connections = {}
+    return _local.db_connections
+
+def get_db_connection(db_name):
+    """Check out a pooled connection, reused for the rest of the request"""
+    connections = _scoped_connections()
+    conn = connections.get(db_name)
+    if conn is None or conn.closed:
+        conn = get_pool(db_name).checkout()
+        connections[db_name] = conn
+    return conn
 
 def init_db():
-    """Initialize database tables"""
-    # Users database initialization
-    conn = get_db_connection('users.db')
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            mobile TEXT UNIQUE,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-
-    # Animals database initialization
-    conn = get_db_connection('animals.db')
-    
-    # Create animal table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS animal (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            breed TEXT NOT NULL,
-            age INTEGER,
-            weight REAL,
-            milk_production REAL DEFAULT 0,
-            pregnancy_cycle INTEGER DEFAULT 0,
-            has_horns INTEGER DEFAULT 0,
-            category TEXT,
-            use_purpose TEXT,
-            photo TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create health_metrics table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS health_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_id INTEGER NOT NULL,
-            temperature REAL,
-            heart_rate INTEGER,
-            respiratory_rate INTEGER,
-            weight REAL,
-            body_condition_score INTEGER,
-            record_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT,
-            FOREIGN KEY (animal_id) REFERENCES animal (id)
-        )
-    ''')
-    
-    # Create vaccinations table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS vaccinations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_id INTEGER NOT NULL,
-            vaccine_name TEXT NOT NULL,
-            date_given DATE NOT NULL,
-            next_due_date DATE,
-            vet_name TEXT,
-            notes TEXT,
-            FOREIGN KEY (animal_id) REFERENCES animal (id)
-        )
-    ''')
-
-    # Create milk_production table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS milk_production (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_id INTEGER NOT NULL,
-            production_date DATE NOT NULL,
-            amount REAL NOT NULL,
-            time_of_day TEXT CHECK(time_of_day IN ('morning', 'evening')) NOT NULL,
-            fat_content REAL,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (animal_id) REFERENCES animal (id)
-        )
-    ''')
-    
-    conn.commit()
+    """Initialize database tables by applying pending schema migrations"""
+    from utils.migrations import run_migrations
+    run_migrations()
 
 def close_db_connection(e=None):
-    """Close database connections at the end of request"""
-    db_connections = getattr(g, 'db_connections', {})
-    for conn in db_connections.values():
+    """Check the request's connections back into their pools"""
+    connections = _scoped_connections()
+    for conn in connections.values():
         conn.close()
-    g.db_connections = {}
\ No newline at end of file
+    connections.clear()
\ No newline at end of file
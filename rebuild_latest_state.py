@@ -0,0 +1,24 @@
+from app import app
+from config.database import get_db_connection
+from utils.herd_queries import rebuild_latest_state
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+def rebuild(animal_ids=None):
+    """Recompute animal_latest_state from the history tables"""
+    try:
+        with app.app_context():
+            conn = get_db_connection('animals.db')
+            count = rebuild_latest_state(conn, animal_ids)
+            logger.info(f"Latest state rebuilt for {count} animals")
+            return count
+    except Exception as e:
+        logger.error(f"Error rebuilding latest state: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    # Optional animal ids limit the rebuild, e.g. `python rebuild_latest_state.py 12 15`
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    print(f"Rebuilt latest state for {rebuild(ids)} animals")
@@ -1,21 +1,69 @@
-from flask import request, jsonify, session, render_template, redirect, url_for, flash
+from flask import request, jsonify, session, render_template, redirect, url_for, flash, Response, stream_with_context
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField
 from wtforms.validators import DataRequired, Email, Length, EqualTo
 from app import app
-from config.database import get_db_connection
-from utils.password_utils import hash_password, verify_password, validate_password_strength
-from utils.session import initialize_session, validate_session, end_session, get_current_user_id
+from config.database import get_db_connection, get_pool_stats
+from utils.password_utils import (
+    hash_password, verify_and_upgrade_password, validate_password_strength, PasswordHasherBusy
+)
+from utils.session import initialize_session, validate_session, end_session, get_current_user_id, session_store
+from utils.herd_queries import (
+    fetch_herd_page, get_herd_summary, fetch_animal_latest_state,
+    decode_cursor, parse_fields
+)
+from config.config import Config
+from utils.milk_ingest import normalize_milk_payload, ingest_milk_records
+from utils.telemetry import telemetry_buffer
+from utils.socket_handler import alert_batcher
+from utils.event_bus import event_bus
+from utils.export import EXPORT_DATASETS, EXPORT_FORMATS, parse_export_date, stream_export
+from utils.rollups import ROLLUP_SOURCES, fetch_rollup_series
+from utils.health_rules import classify_animal
+from utils.rate_limit import limiter, rate_limit
+from utils.qr_codes import qr_cache_key, get_qr_png, render_tag_sheet
+from utils.uploads import UploadError, save_upload, photo_urls
+from utils.versions import animal_version, user_version, make_etag, is_fresh, not_modified, etag_json
+from utils.kpis import dashboard_kpis
+from utils.milk_yield import assess_milk_yield
+from utils.lactation import herd_forecast
+from utils.fodder import SEASONS, DEFAULT_SEASON, herd_fodder
+from datetime import date
 import sqlite3
 
-STATUS_SEVERITY = {'Critical': 0, 'Moderate': 1, 'Healthy': 2}
+def parse_herd_listing_args(args):
+    """Parse cursor, limit, fields and filter query parameters of an animal listing.
 
+    Raises ValueError with a client-facing message for invalid values.
+    """
+    after = args.get('after')
+    after_id = decode_cursor(after) if after else None
 
-def degrade_status(current_status: str, candidate_status: str) -> str:
-    """Return the more severe of the two statuses based on STATUS_SEVERITY."""
-    current_rank = STATUS_SEVERITY.get(current_status, STATUS_SEVERITY['Healthy'])
-    candidate_rank = STATUS_SEVERITY.get(candidate_status, STATUS_SEVERITY['Healthy'])
-    return current_status if current_rank <= candidate_rank else candidate_status
+    try:
+        limit = int(args.get('limit', Config.ANIMAL_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be a number')
+    if limit < 1 or limit > Config.ANIMAL_PAGE_SIZE_MAX:
+        raise ValueError(f'limit must be between 1 and {Config.ANIMAL_PAGE_SIZE_MAX}')
+
+    fields = parse_fields(args.get('fields'))
+
+    filters = {}
+    for name in ('type', 'category'):
+        if args.get(name):
+            filters[name] = args.get(name)
+    for name in ('is_milking', 'is_pregnant'):
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        if value.lower() in ('1', 'true', 'yes'):
+            filters[name] = 1
+        elif value.lower() in ('0', 'false', 'no'):
+            filters[name] = 0
+        else:
+            raise ValueError(f'{name} must be true or false')
+
+    return after_id, limit, fields, filters
 
 class LoginForm(FlaskForm):
     email = StringField('Email')
@@ -44,6 +92,7 @@ def home():
     return render_template('home.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limit(limit=10, window=60, methods=('POST',))
 def login():
     # Always render login page on GET; allow switching accounts even if already logged in
     form = LoginForm()
@@ -65,15 +114,25 @@ def login():
                 
             user = cursor.fetchone()
             
+            if user:
+                valid, upgraded_hash = verify_and_upgrade_password(password, user['password'])
+            
             if not user:
                 flash('No account found with these credentials', 'error')
-            elif not verify_password(password, user['password']):
+            elif not valid:
                 flash('Incorrect password', 'error')
             else:
+                if upgraded_hash:
+                    # Stored hash predates the current cost; replace it transparently
+                    cursor.execute('UPDATE users SET password = ? WHERE id = ?',
+                                   (upgraded_hash, user['id']))
+                    conn.commit()
                 initialize_session(user['id'])
                 flash('Login successful!', 'success')
                 return redirect(url_for('dashboard', user_id=user['id']))
                 
+        except PasswordHasherBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
         except sqlite3.Error as e:
             flash('A database error occurred. Please try again.', 'error')
             print(f"Database error during login: {str(e)}")  # Log the actual error
@@ -83,6 +142,7 @@ def login():
     return render_template('login.html', form=form, signup_form=signup_form)
 
 @app.route('/signup', methods=['POST'])
+@rate_limit(limit=5, window=300)
 def signup():
     form = SignupForm()
     
@@ -110,6 +170,8 @@ def signup():
                 conn.commit()
                 flash('Registration successful! Please login.', 'success')
             
+        except PasswordHasherBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
         except sqlite3.Error as e:
             print(f"Database error during signup: {str(e)}")  # Add logging
             flash('Registration error occurred', 'error')
@@ -131,7 +193,39 @@ def dashboard(user_id):
     if current_user_id != user_id:
         flash('Unauthorized access', 'error')
         return redirect(url_for('login'))
-    return render_template('dashboard.html', user_id=user_id, active_page='dashboard')
+    
+    try:
+        conn = get_db_connection('animals.db')
+        kpis = dashboard_kpis(conn, current_user_id)
+    except sqlite3.Error as e:
+        print(f"Database error loading dashboard KPIs: {str(e)}")
+        kpis = None
+    finally:
+        conn.close()
+    return render_template('dashboard.html', user_id=user_id, kpis=kpis,
+                           poll_seconds=Config.DASHBOARD_POLL_SECONDS, active_page='dashboard')
+
+@app.route('/api/dashboard/kpis', methods=['GET'])
+def get_dashboard_kpis():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    try:
+        conn = get_db_connection('animals.db')
+        
+        # KPIs only move with the user's data version or the calendar day
+        today = date.today()
+        etag = make_etag('kpis', current_user_id, user_version(conn, current_user_id),
+                         today, Config.MILK_PRICE_PER_LITRE)
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        return etag_json({'success': True, 'kpis': dashboard_kpis(conn, current_user_id, today)}, etag)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
 
 @app.route('/cattle_management/<int:user_id>')
 def cattle_management(user_id):
@@ -145,41 +239,35 @@ def cattle_management(user_id):
         
     try:
         conn = get_db_connection('animals.db')
-        cursor = conn.cursor()
         
-        # Fetch all animals for the current user
-        cursor.execute('''
-            SELECT *, 
-                CASE 
-                    WHEN type IN ('Cow', 'Buffalo') AND milk_production > 0 THEN 1 
-                    ELSE 0 
-                END as is_milking,
-                CASE 
-                    WHEN category = 'Pregnant' OR pregnancy_cycle > 0 THEN 1 
-                    ELSE 0 
-                END as is_pregnant
-            FROM animal 
-            WHERE user_id = ?
-        ''', (current_user_id,))
-        animals = cursor.fetchall()
-        
-        # Calculate counts
-        total_count = len(animals)
-        healthy_count = sum(1 for a in animals if a.get('health_status', 'healthy') == 'healthy')
-        milking_count = sum(1 for a in animals if a.get('is_milking', 0) == 1)
-        alert_count = sum(1 for a in animals if a.get('health_status') == 'critical')
-        pregnant_count = sum(1 for a in animals if a.get('is_pregnant', 0) == 1)
-        calves_count = sum(1 for a in animals if a.get('age', 0) < 12)  # Less than 12 months
+        # Fetch one page of the user's animals; the counts cover the whole herd
+        try:
+            after_id, limit, _, filters = parse_herd_listing_args(request.args)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('cattle_management', user_id=user_id))
+        animals, next_cursor = fetch_herd_page(
+            conn, current_user_id, after_id=after_id, limit=limit, filters=filters
+        )
+        counts = get_herd_summary(conn, current_user_id)
+        next_page_url = None
+        if next_cursor:
+            next_page_url = url_for('cattle_management', user_id=user_id,
+                                    **{**request.args.to_dict(), 'after': next_cursor})
         
         return render_template('cattle_management.html',
             user_id=user_id,
             animals=animals,
-            total_count=total_count,
-            healthy_count=healthy_count,
-            milking_count=milking_count,
-            alert_count=alert_count,
-            pregnant_count=pregnant_count,
-            calves_count=calves_count,
+            next_page_url=next_page_url,
+            total_count=counts['total_count'],
+            healthy_count=counts['healthy_count'],
+            milking_count=counts['milking_count'],
+            alert_count=counts['alert_count'],
+            critical_count=counts['critical_count'],
+            pregnant_count=counts['pregnant_count'],
+            calves_count=counts['calves_count'],
+            cows_count=counts['cows_count'],
+            bulls_count=counts['bulls_count'],
             active_page='cattle'
         )
     except sqlite3.Error as e:
@@ -187,12 +275,16 @@ def cattle_management(user_id):
         return render_template('cattle_management.html',
             user_id=user_id,
             animals=[],
+            next_page_url=None,
             total_count=0,
             healthy_count=0,
             milking_count=0,
             alert_count=0,
+            critical_count=0,
             pregnant_count=0,
             calves_count=0,
+            cows_count=0,
+            bulls_count=0,
             active_page='cattle'
         )
     finally:
@@ -290,6 +382,12 @@ def not_found_error(error):
 def internal_error(error):
     return render_template('error.html', error=500), 500
 
+@app.errorhandler(413)
+def request_too_large(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'error': 'Request is too large'}), 413
+    return render_template('error.html', error=413), 413
+
 # Add before_request handler for session validation
 @app.before_request
 def before_request():
@@ -309,6 +407,7 @@ def before_request():
 @app.route('/add_new_cattle', methods=['GET', 'POST'])
 def add_new_cattle():
     if request.method == 'POST':
+        conn = None
         try:
             user_id = get_current_user_id()
             if not user_id:
@@ -327,16 +426,15 @@ def add_new_cattle():
             category = request.form.get('cow_category')
             use_purpose = request.form.get('use_purpose')
             
-            # Handle photo upload
+            # Handle photo upload; identical photos are stored once
             photo = request.files.get('photo')
             image_filename = None
-            if photo:
-                # Ensure filename is secure
-                filename = secure_filename(photo.filename)
-                # Generate unique filename
-                image_filename = f"{uuid.uuid4()}_{filename}"
-                # Save file
-                photo.save(os.path.join(app.config['UPLOAD_FOLDER'], 'animals', image_filename))
+            if photo and photo.filename:
+                try:
+                    image_filename = save_upload(photo)
+                except UploadError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('add_new_cattle'))
             
             conn = get_db_connection('animals.db')
             cursor = conn.cursor()
@@ -362,7 +460,8 @@ def add_new_cattle():
             flash(f'Error adding animal: {str(e)}', 'error')
             return redirect(url_for('add_new_cattle'))
         finally:
-            conn.close()
+            if conn is not None:
+                conn.close()
             
     return render_template('add_new_cattle.html')
 
@@ -375,10 +474,10 @@ def register_animal():
         return redirect(url_for('login'))
         
     try:
-        form_data = request.form
-        photo = request.files.get('photo')
         conn = get_db_connection('animals.db')
         cursor = conn.cursor()
+        form_data = request.form
+        photo = request.files.get('photo')
         
         # Handle custom name if provided
         name = form_data.get('custom_name') if form_data.get('name') == 'other' else form_data.get('name')
@@ -388,11 +487,14 @@ def register_animal():
         if photo and photo.filename:
             # Check if file is allowed
             from utils.helpers import allowed_file, save_file
-            if allowed_file(photo.filename):
-                image_filename = save_file(photo, current_user_id)
-            else:
+            if not allowed_file(photo.filename):
                 flash('Only PNG, JPG, JPEG, GIF or WEBP files are accepted', 'error')
                 return redirect(url_for('add_new_cattle'))
+            try:
+                image_filename = save_file(photo, current_user_id)
+            except UploadError as e:
+                flash(str(e), 'error')
+                return redirect(url_for('add_new_cattle'))
         
         # Convert numeric fields
         try:
@@ -453,99 +555,51 @@ def get_animal_health(animal_id):
         
     try:
         conn = get_db_connection('animals.db')
-        cursor = conn.cursor()
         
-        # Get latest health metrics and animal type
-        cursor.execute('''
-            SELECT hm.*, a.type, a.weight, a.milk_production
-            FROM health_metrics hm
-            JOIN animal a ON hm.animal_id = a.id
-            WHERE hm.animal_id = ? AND a.user_id = ?
-            ORDER BY hm.record_date DESC
-            LIMIT 1
-        ''', (animal_id, current_user_id))
+        # Answer a poll for unchanged data from the version counter alone;
+        # the milk trend windows also move with the date
+        version = animal_version(conn, current_user_id, animal_id)
+        etag = make_etag('health', animal_id, version, date.today())
+        if version is not None and is_fresh(etag):
+            return not_modified(etag)
         
-        result = cursor.fetchone()
-        
-        if result:
-            # Define normal ranges for different animal types
-            normal_ranges = {
-                'Cow': {'temp': (37.5, 39.5), 'heart': (48, 84), 'resp': (26, 50), 'milk_min': 15},
-                'Buffalo': {'temp': (37.2, 38.5), 'heart': (40, 60), 'resp': (20, 30), 'milk_min': 10},
-                'Goat': {'temp': (38.5, 40.0), 'heart': (70, 90), 'resp': (15, 30), 'milk_min': 2},
-                'Sheep': {'temp': (38.3, 39.9), 'heart': (70, 80), 'resp': (16, 34), 'milk_min': 0.5},
-                'Ox': {'temp': (37.5, 39.5), 'heart': (40, 70), 'resp': (20, 40), 'weight_min': 300},
-                'Bull': {'temp': (37.5, 39.5), 'heart': (40, 70), 'resp': (20, 40), 'weight_min': 300}
-            }
-            
-            animal_type = result['type']
-            ranges = normal_ranges.get(animal_type, normal_ranges['Cow'])
-            
-            # Calculate overall status based on animal type
-            status = 'Healthy'
-            alerts = []
+        # Latest health reading, vaccination and animal type in one lookup
+        result = fetch_animal_latest_state(conn, current_user_id, animal_id)
+        
+        if result and result['last_checkup']:
+            # Species-aware rules shared with the monitor and scheduler
+            status, alerts = classify_animal(result)
+            alerts = [alert['message'] for alert in alerts]
             
-            # Temperature check
-            if result['temperature']:
-                if result['temperature'] > ranges['temp'][1]:
-                    status = 'Critical'
-                    alerts.append('High temperature')
-                elif result['temperature'] > ranges['temp'][1] - 0.5:
-                    status = 'Moderate'
-                    alerts.append('Slightly elevated temperature')
-                    
-            # Heart rate check
-            if result['heart_rate']:
-                if result['heart_rate'] > ranges['heart'][1]:
-                    alerts.append('High heart rate')
-                    status = degrade_status(status, 'Moderate')
-                elif result['heart_rate'] < ranges['heart'][0]:
-                    alerts.append('Low heart rate')
-                    status = degrade_status(status, 'Moderate')
-                    
-            # Weight/Production check
-            if animal_type in ['Cow', 'Buffalo', 'Goat', 'Sheep']:
-                if result['milk_production'] and result['milk_production'] < ranges['milk_min']:
-                    alerts.append('Low milk production')
-                    status = degrade_status(status, 'Moderate')
-            elif animal_type in ['Ox', 'Bull']:
-                if result['weight'] and result['weight'] < ranges['weight_min']:
-                    alerts.append('Low weight')
-                    status = degrade_status(status, 'Moderate')
+            # Rolling 7/30-day yield, the same check the scheduler alerts on
+            milk_trend = assess_milk_yield(conn, [animal_id]).trend(0)
+            if milk_trend['dropping']:
+                alerts.append(f"Milk yield down {milk_trend['drop_percent']:g}% from baseline")
             
             health_data = {
-                'temperature': result['temperature'],
-                'heart_rate': result['heart_rate'],
-                'respiratory_rate': result['respiratory_rate'],
+                'temperature': result['last_temp'],
+                'heart_rate': result['last_heart_rate'],
+                'respiratory_rate': result['last_respiratory_rate'],
                 'weight': result['weight'],
                 'overall_status': status,
                 'alerts': alerts,
-                'record_date': result['record_date']
+                'milk_trend': milk_trend,
+                'record_date': result['last_checkup']
             }
             
-            # Get vaccination info
-            cursor.execute('''
-                SELECT vaccine_name, date_given, next_due_date
-                FROM vaccinations 
-                WHERE animal_id = ?
-                ORDER BY date_given DESC 
-                LIMIT 1
-            ''', (animal_id,))
-            
-            vacc = cursor.fetchone()
-            if vacc:
+            if result['vaccine_name']:
                 health_data.update({
-                    'last_vaccine': vacc['vaccine_name'],
-                    'vaccine_date': vacc['date_given'],
-                    'next_vaccine_due': vacc['next_due_date']
+                    'last_vaccine': result['vaccine_name'],
+                    'vaccine_date': result['last_vaccine_date'],
+                    'next_vaccine_due': result['next_vaccination']
                 })
             
-            return jsonify({
+            return etag_json({
                 'success': True,
                 'data': health_data
-            })
+            }, etag)
         else:
-            return jsonify({
+            return etag_json({
                 'success': True,
                 'data': {
                     'temperature': None,
@@ -555,7 +609,7 @@ def get_animal_health(animal_id):
                     'overall_status': 'Healthy',
                     'alerts': []
                 }
-            })
+            }, etag)
         
     except sqlite3.Error as e:
         return jsonify({
@@ -573,32 +627,15 @@ def get_animal_card(animal_id):
         
     try:
         conn = get_db_connection('animals.db')
-        cursor = conn.cursor()
-        
-        # Get animal details with health and vaccination info
-        cursor.execute('''
-            SELECT a.*, 
-                   hm.temperature as last_temp,
-                   hm.record_date as last_checkup,
-                   v.next_due_date as next_vaccination,
-                   v.vaccine_name,
-                    CASE 
-                        WHEN hm.temperature > 39.5 THEN 'Critical'
-                        WHEN hm.temperature > 39.0 THEN 'Moderate'
-                        ELSE 'Optimal'
-                    END as health_status
-            FROM animal a
-            LEFT JOIN health_metrics hm ON a.id = hm.animal_id
-            LEFT JOIN vaccinations v ON a.id = v.animal_id
-            WHERE a.id = ? AND a.user_id = ?
-            ORDER BY hm.record_date DESC, v.date_given DESC
-            LIMIT 1
-        ''', (animal_id, current_user_id))
         
-        animal = cursor.fetchone()
+        # Get animal details with its latest health and vaccination info
+        animal = fetch_animal_latest_state(conn, current_user_id, animal_id)
         if not animal:
             flash('Animal not found', 'error')
             return redirect(url_for('cattle_management', user_id=current_user_id))
+        
+        status, _ = classify_animal(animal)
+        animal['health_status'] = 'Optimal' if status == 'Healthy' else status
             
         return render_template('animal_card.html', animal=animal)
         
@@ -622,32 +659,61 @@ def get_animal_qr(animal_id):
         if not cursor.fetchone():
             return jsonify({'success': False, 'error': 'Animal not found'}), 404
 
-        # Generate QR code with animal details URL
+        # The QR code encodes the animal's card URL, so it only changes with the host
         base_url = request.url_root.rstrip('/')
-        qr_data = f"{base_url}/api/animals/{animal_id}/card"
-        
-        import qrcode
-        import io
-        import base64
-        
-        # Create QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        # Convert to base64
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = io.BytesIO()
-        img.save(buffered)
-        qr_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        return jsonify({'success': True, 'qr_code': qr_base64})
+        etag = qr_cache_key(base_url, animal_id)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            _, png = get_qr_png(base_url, animal_id)
+            response = Response(png, mimetype='image/png')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         conn.close()
 
+@app.route('/api/animals/qr-sheet', methods=['GET'])
+def get_herd_qr_sheet():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    try:
+        ids = request.args.get('ids')
+        wanted = {int(value) for value in ids.split(',') if value.strip()} if ids else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'ids must be a comma separated list of numbers'}), 400
+
+    try:
+        conn = get_db_connection('animals.db')
+        animals = conn.execute(
+            'SELECT id, name, type, breed FROM animal WHERE user_id = ? ORDER BY id',
+            (current_user_id,)
+        ).fetchall()
+        if wanted is not None:
+            animals = [animal for animal in animals if animal['id'] in wanted]
+        if not animals:
+            return jsonify({'success': False, 'error': 'No animals found'}), 404
+        if len(animals) > Config.QR_SHEET_MAX_ANIMALS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {Config.QR_SHEET_MAX_ANIMALS} animals per sheet'
+            }), 400
+
+        pdf = render_tag_sheet(request.url_root.rstrip('/'), animals)
+        return Response(pdf, mimetype='application/pdf', headers={
+            'Content-Disposition': 'attachment; filename=ear_tags.pdf'
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/animals/<int:animal_id>', methods=['DELETE'])
 def delete_animal(animal_id):
     current_user_id = get_current_user_id()
@@ -743,6 +809,13 @@ def get_animal(animal_id):
         conn = get_db_connection('animals.db')
         cursor = conn.cursor()
         
+        version = animal_version(conn, current_user_id, animal_id)
+        if version is None:
+            return jsonify({'success': False, 'error': 'Animal not found'}), 404
+        etag = make_etag('animal', animal_id, version)
+        if is_fresh(etag):
+            return not_modified(etag)
+        
         cursor.execute('''
             SELECT * FROM animal 
             WHERE id = ? AND user_id = ?
@@ -754,59 +827,109 @@ def get_animal(animal_id):
             
         # Convert row to dict
         animal_dict = dict(animal)
-        return jsonify({'success': True, 'data': animal_dict})
+        animal_dict.update(photo_urls(animal_dict.get('image_filename')))
+        return etag_json({'success': True, 'data': animal_dict}, etag)
         
     except sqlite3.Error as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         conn.close()
 
+@app.route('/api/forecast/milk', methods=['GET'])
+def get_milk_forecast():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    days = request.args.get('days', Config.FORECAST_DEFAULT_DAYS, type=int)
+    if not 1 <= days <= Config.FORECAST_MAX_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f'days must be between 1 and {Config.FORECAST_MAX_DAYS}'
+        }), 400
+    
+    try:
+        conn = get_db_connection('animals.db')
+        
+        # Curves only change with the herd's data; the horizon moves daily
+        today = date.today()
+        etag = make_etag('milk-forecast', current_user_id, user_version(conn, current_user_id), today, days)
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        return etag_json({
+            'success': True,
+            'forecast': herd_forecast(conn, current_user_id, days, today)
+        }, etag)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/fodder', methods=['GET'])
+def get_fodder_plan():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    season = request.args.get('season', DEFAULT_SEASON)
+    if season not in SEASONS:
+        return jsonify({
+            'success': False,
+            'error': f"season must be one of: {', '.join(SEASONS)}"
+        }), 400
+    
+    try:
+        conn = get_db_connection('animals.db')
+        
+        etag = make_etag('fodder', current_user_id, user_version(conn, current_user_id), season)
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        return etag_json({'success': True, 'fodder': herd_fodder(conn, current_user_id, season)}, etag)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/animals', methods=['GET'])
 def get_all_animals():
     current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    try:
+        after_id, limit, fields, filters = parse_herd_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
         
     try:
         conn = get_db_connection('animals.db')
-        cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT a.*, 
-                   hm.temperature as last_temp,
-                   hm.record_date as last_checkup,
-                   mp.amount as milk_production,
-                   v.next_due_date as next_vaccination
-            FROM animal a
-            LEFT JOIN health_metrics hm ON a.id = hm.animal_id
-            LEFT JOIN (
-                SELECT animal_id, amount
-                FROM milk_production
-                WHERE (animal_id, record_date) IN (
-                    SELECT animal_id, MAX(record_date)
-                    FROM milk_production
-                    GROUP BY animal_id
-                )
-            ) mp ON a.id = mp.animal_id
-            LEFT JOIN vaccinations v ON a.id = v.animal_id
-            WHERE a.user_id = ?
-            GROUP BY a.id
-        ''', (current_user_id,))
-        
-        animals = cursor.fetchall()
+        # The page depends on the user's herd version and the query parameters
+        etag = make_etag('animals', current_user_id, user_version(conn, current_user_id),
+                         request.query_string.decode())
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        animals, next_cursor = fetch_herd_page(
+            conn, current_user_id, after_id=after_id, limit=limit,
+            fields=fields, filters=filters
+        )
         animal_list = []
         
         for animal in animals:
             animal_dict = dict(animal)
-            # Add image URL if exists
-            if animal_dict.get('image_filename'):
-                animal_dict['image_url'] = f"/static/images/animals/{animal_dict['image_filename']}"
+            # Add photo and thumbnail URLs if the listing includes the photo
+            if 'image_filename' in animal_dict:
+                animal_dict.update(photo_urls(animal_dict['image_filename']))
             animal_list.append(animal_dict)
             
-        return jsonify({
+        return etag_json({
             'success': True,
-            'animals': animal_list
-        })
+            'animals': animal_list,
+            'next_cursor': next_cursor
+        }, etag)
         
     except sqlite3.Error as e:
         return jsonify({
@@ -815,3 +938,142 @@ def get_all_animals():
         }), 500
     finally:
         conn.close()
+
+def _ingest_milk_response(payload, current_user_id, default_animal_id=None):
+    """Validate and store a milk payload, returning the JSON response"""
+    if payload is None:
+        return jsonify({'success': False, 'error': 'Invalid content type'}), 400
+    
+    rows, errors = normalize_milk_payload(payload, default_animal_id)
+    if errors:
+        return jsonify({'success': False, 'error': 'Invalid milk records', 'errors': errors}), 400
+    
+    try:
+        result = ingest_milk_records(rows, user_id=current_user_id)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if result is None:
+        return jsonify({'success': False, 'error': 'Animal not found'}), 404
+    return jsonify({'success': True, 'data': result}), 201
+
+@app.route('/api/animals/<int:animal_id>/milk-production', methods=['POST'])
+def record_milk_production(animal_id):
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    payload = request.get_json(silent=True)
+    # Records posted to an animal's URL always belong to that animal
+    if isinstance(payload, dict):
+        payload = {**payload, 'animal_id': animal_id}
+    elif isinstance(payload, list):
+        payload = [{**entry, 'animal_id': animal_id} if isinstance(entry, dict) else entry
+                   for entry in payload]
+    return _ingest_milk_response(payload, current_user_id, animal_id)
+
+@app.route('/api/milk-production/batch', methods=['POST'])
+def record_milk_production_batch():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return _ingest_milk_response(request.get_json(silent=True), current_user_id)
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_history(dataset):
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'success': False, 'error': 'Unknown dataset'}), 404
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'format must be ndjson or csv'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    try:
+        animal_id = request.args.get('animal_id', type=int)
+        start = parse_export_date(request.args.get('start'), 'start')
+        end = parse_export_date(request.args.get('end'), 'end')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    filename = f"{dataset}.{fmt}"
+    mimetype = EXPORT_FORMATS[fmt]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    body = stream_export(dataset, fmt, current_user_id, animal_id=animal_id,
+                         start=start, end=end, compress=compress)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/animals/<int:animal_id>/rollups/<dataset>', methods=['GET'])
+def get_animal_rollups(animal_id, dataset):
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if dataset not in ROLLUP_SOURCES:
+        return jsonify({'success': False, 'error': 'Unknown dataset'}), 404
+    
+    try:
+        conn = get_db_connection('animals.db')
+        owned = conn.execute(
+            'SELECT 1 FROM animal WHERE id = ? AND user_id = ?', (animal_id, current_user_id)
+        ).fetchone()
+        if not owned:
+            return jsonify({'success': False, 'error': 'Animal not found'}), 404
+        
+        # Half-open [start, end) range; defaults to the last ROLLUP_DEFAULT_DAYS days
+        result = fetch_rollup_series(
+            conn, dataset, animal_id,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            resolution=request.args.get('resolution'),
+            default_days=Config.ROLLUP_DEFAULT_DAYS
+        )
+        return jsonify({'success': True, 'animal_id': animal_id, 'dataset': dataset, **result})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
+def _system_stats(key, stats):
+    """Serve an internal stats snapshot to the users in SYSTEM_STATS_USER_IDS only"""
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if current_user_id not in Config.SYSTEM_STATS_USER_IDS:
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    return jsonify({'success': True, key: stats()})
+
+@app.route('/api/system/db-pool', methods=['GET'])
+def db_pool_stats():
+    return _system_stats('pools', get_pool_stats)
+
+@app.route('/api/system/telemetry', methods=['GET'])
+def telemetry_stats():
+    return _system_stats('telemetry', telemetry_buffer.stats)
+
+@app.route('/api/system/alerts', methods=['GET'])
+def alert_fanout_stats():
+    return _system_stats('alerts', alert_batcher.stats)
+
+@app.route('/api/system/event-bus', methods=['GET'])
+def event_bus_stats():
+    return _system_stats('event_bus', event_bus.stats)
+
+@app.route('/api/system/rate-limits', methods=['GET'])
+def rate_limit_stats():
+    return _system_stats('rate_limits', limiter.stats)
+
+@app.route('/api/system/sessions', methods=['GET'])
+def session_store_stats():
+    return _system_stats('sessions', session_store.stats)
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The databases live under a relative data/ directory, so the suite runs
+# from a scratch directory before app.py applies the migrations on import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='goan_gotha_tests_'))
+
+from app import app as flask_app
+from config.database import get_pool
+from utils.session import session_store
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    return flask_app
+
+@pytest.fixture
+def user_id():
+    return 1
+
+@pytest.fixture
+def client(app, user_id):
+    """Test client logged in as ``user_id`` through a server-side session"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['sid'] = session_store.create(user_id)
+    return client
+
+@pytest.fixture
+def animal_id(user_id):
+    conn = get_pool('animals.db').checkout()
+    try:
+        cursor = conn.execute(
+            "INSERT INTO animal (user_id, name, type, breed, age, weight) VALUES (?, 'Gauri', 'Cow', 'Gir', 4, 380)",
+            (user_id,)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
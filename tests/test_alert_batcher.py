@@ -0,0 +1,36 @@
+from utils import socket_handler
+from utils.socket_handler import AlertBatcher, alert_batcher, send_alert, socketio
+
+def test_alerts_queued_in_one_tick_reach_the_herd_as_one_batch(app, client, animal_id):
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    ack = socket_client.emit('join_herd', callback=True)
+    assert ack['success'] and ack['animals'] >= 1
+    socket_client.get_received()
+
+    before = alert_batcher.stats()
+    send_alert(animal_id, {'type': 'warning', 'animal_name': 'Gauri', 'message': 'Temperature 39.8'})
+    send_alert(animal_id, {'type': 'critical', 'animal_name': 'Gauri', 'message': 'Heart rate 104'})
+    alert_batcher.flush()
+
+    batches = [message for message in socket_client.get_received() if message['name'] == 'alert_batch']
+    assert len(batches) == 1
+    assert [item['message'] for item in batches[0]['args'][0]['items']] == ['Temperature 39.8', 'Heart rate 104']
+    after = alert_batcher.stats()
+    assert after['emits_saved'] - before['emits_saved'] == 1
+    socket_client.disconnect()
+
+def test_failed_emits_are_not_counted_as_saved(monkeypatch):
+    def failing_emit(*args, **kwargs):
+        raise RuntimeError('server gone')
+    monkeypatch.setattr(socket_handler.socketio, 'emit', failing_emit)
+
+    batcher = AlertBatcher(tick=60)
+    batcher.queue('alert', 'animal_1', {'message': 'Temperature 39.8'})
+    batcher.queue('alert', 'animal_1', {'message': 'Heart rate 104'})
+    batcher.queue('emergency', None, {'message': 'Collapsed'})
+    batcher.flush()
+
+    stats = batcher.stats()
+    assert stats['emits'] == 0
+    assert stats['emits_saved'] == 0
+    assert stats['failed'] == 3
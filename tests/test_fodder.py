@@ -0,0 +1,9 @@
+from utils.fodder import fodder_arrays
+
+def test_calves_get_their_own_ration_with_milk():
+    feed = fodder_arrays(['Calf', 'calf', 'Cow'], [None, 60, None], [None, None, 0], [None, None, None])
+
+    assert list(feed['whole_milk']) == [4, 4, 0]
+    assert feed['dry_matter'][0] == feed['dry_matter'][1] == 1.5
+    assert list(feed['concentrate']) == [0.5, 0.5, 1.0]
+    assert list(feed['estimated_weight']) == [True, False, True]
@@ -0,0 +1,35 @@
+import threading
+from config.database import get_pool
+from utils.event_bus import event_bus
+from utils.monitoring import check_health_metrics
+
+def test_recorded_alerts_reach_health_alert_subscribers(animal_id):
+    # Drain readings left by earlier tests so only this one is new
+    check_health_metrics()
+    received = []
+    delivered = threading.Event()
+
+    @event_bus.subscribe('health_alert')
+    def capture(alert):
+        received.append(alert)
+        delivered.set()
+
+    try:
+        conn = get_pool('animals.db').checkout()
+        try:
+            conn.execute(
+                'INSERT INTO health_metrics (animal_id, temperature, heart_rate) VALUES (?, 41.2, 70)',
+                (animal_id,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        summary = check_health_metrics()
+        assert summary['processed'] == 1 and summary['alerts'] >= 1
+        # Subscribers run on the async dispatcher's workers
+        assert delivered.wait(5)
+        assert received[0]['animal_id'] == animal_id
+        assert received[0]['status'] == 'urgent'
+    finally:
+        event_bus.remove_handler('health_alert', capture)
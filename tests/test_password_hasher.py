@@ -0,0 +1,21 @@
+import time
+import pytest
+from utils.password_utils import PasswordHasher, PasswordHasherBusy
+
+def test_timed_out_hashes_keep_their_queue_slot():
+    hasher = PasswordHasher(workers=1, queue_size=1, timeout=0.3)
+    try:
+        # Start the worker process so the timings below only cover the calls
+        hasher._run(time.sleep, 0)
+
+        with pytest.raises(PasswordHasherBusy, match='timed out'):
+            hasher._run(time.sleep, 1.5)
+        # The slow call still runs in the worker and still holds the only slot
+        with pytest.raises(PasswordHasherBusy, match='queue is full'):
+            hasher._run(time.sleep, 0)
+        assert hasher.stats()['rejected'] == 1
+
+        time.sleep(1.5)
+        assert hasher._run(time.sleep, 0) is None
+    finally:
+        hasher.shutdown()
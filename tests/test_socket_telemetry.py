@@ -0,0 +1,53 @@
+import time
+from config.database import get_pool
+from utils.socket_handler import socketio
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.05)
+    return predicate()
+
+def _stored_readings(animal_id):
+    conn = get_pool('animals.db').checkout()
+    try:
+        return conn.execute(
+            'SELECT temperature, heart_rate FROM health_metrics WHERE animal_id = ?', (animal_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+def test_telemetry_is_stored_and_pushed_to_the_animal_room(app, client, animal_id):
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    assert socket_client.is_connected()
+    socket_client.emit('join', {'animal_id': animal_id})
+
+    ack = socket_client.emit('telemetry', {'animal_id': animal_id, 'temperature': 38.6, 'heart_rate': 64},
+                             callback=True)
+    assert ack['success'] and ack['accepted'] == 1
+
+    assert _wait_for(lambda: _stored_readings(animal_id)) == [{'temperature': 38.6, 'heart_rate': 64}]
+    updates = _wait_for(lambda: [message for message in socket_client.get_received()
+                                 if message['name'] == 'temperature_update'])
+    assert updates[0]['args'][0]['temperature'] == 38.6
+    socket_client.disconnect()
+
+def test_telemetry_rejects_non_finite_readings(app, client, animal_id):
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    ack = socket_client.emit('telemetry', [
+        {'animal_id': animal_id, 'temperature': float('nan')},
+        {'animal_id': animal_id, 'heart_rate': float('inf')},
+        {'animal_id': animal_id, 'temperature': 'inf'},
+    ], callback=True)
+    assert ack['accepted'] == 0
+    assert [error['index'] for error in ack['errors']] == [0, 1, 2]
+    socket_client.disconnect()
+
+def test_telemetry_requires_a_session(app, animal_id):
+    socket_client = socketio.test_client(app, flask_test_client=app.test_client())
+    ack = socket_client.emit('telemetry', {'animal_id': animal_id, 'temperature': 38.6}, callback=True)
+    assert ack == {'success': False, 'error': 'Unauthorized'}
+    socket_client.disconnect()
@@ -0,0 +1,31 @@
+import pytest
+from config.config import Config
+
+SYSTEM_STATS = [
+    ('/api/system/db-pool', 'pools'),
+    ('/api/system/telemetry', 'telemetry'),
+    ('/api/system/alerts', 'alerts'),
+    ('/api/system/event-bus', 'event_bus'),
+    ('/api/system/rate-limits', 'rate_limits'),
+    ('/api/system/sessions', 'sessions'),
+]
+
+@pytest.mark.parametrize('url, key', SYSTEM_STATS)
+def test_system_stats_require_a_session(app, url, key):
+    response = app.test_client().get(url)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+
+@pytest.mark.parametrize('url, key', SYSTEM_STATS)
+def test_system_stats_are_hidden_from_farmers(client, monkeypatch, url, key):
+    monkeypatch.setattr(Config, 'SYSTEM_STATS_USER_IDS', frozenset())
+    response = client.get(url)
+    assert response.status_code == 403
+    assert key not in response.get_json()
+
+@pytest.mark.parametrize('url, key', SYSTEM_STATS)
+def test_system_stats_are_served_to_listed_users(client, user_id, monkeypatch, url, key):
+    monkeypatch.setattr(Config, 'SYSTEM_STATS_USER_IDS', frozenset({user_id}))
+    response = client.get(url)
+    assert response.status_code == 200
+    assert key in response.get_json()
@@ -1,5 +1,6 @@
 import sqlite3
 import logging
+from contextlib import contextmanager
 from config.database import get_db_connection
 
 logger = logging.getLogger(__name__)
@@ -36,13 +37,18 @@ def execute_write(db_name, query, params=()):
             conn.rollback()
         raise
 
-def execute_many(db_name, query, params_list):
-    """Execute many write operations in a single transaction"""
+def execute_many(db_name, query, params_list, commit=True):
+    """Execute many write operations in a single transaction
+
+    Pass ``commit=False`` to run inside an enclosing ``transaction()``.
+    """
     try:
         conn = get_db_connection(db_name)
         cursor = conn.cursor()
         cursor.executemany(query, params_list)
-        conn.commit()
+        if commit:
+            conn.commit()
+        return cursor.rowcount
     except sqlite3.Error as e:
         logger.error(f"Database error executing batch write: {str(e)}")
         conn.rollback()
@@ -51,4 +57,16 @@ def execute_many(db_name, query, params_list):
         logger.error(f"Error executing batch write: {str(e)}")
         if 'conn' in locals():
             conn.rollback()
-        raise
\ No newline at end of file
+        raise
+
+@contextmanager
+def transaction(db_name):
+    """Group several writes on the request's connection into one transaction"""
+    conn = get_db_connection(db_name)
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error in transaction, rolling back: {str(e)}")
+        conn.rollback()
+        raise
@@ -1,17 +1,159 @@
 from functools import wraps
 from utils.socket_handler import socketio
 import logging
+import queue
+import threading
+import time
+from itertools import count
 from threading import Lock
 
 logger = logging.getLogger(__name__)
 event_handlers = {}
 lock = Lock()
 
+# Async dispatchers per event type and latency counters per handler
+dispatchers = {}
+handler_stats = {}
+
+OVERFLOW_POLICIES = ('drop', 'block')
+_STOP = object()  # tells a dispatcher worker to exit
+
 def init_event_bus(app):
     """Initialize the event bus system"""
     logger.info("Initializing event bus")
     return EventBus()
 
+def _handler_name(handler):
+    return f"{handler.__module__}.{handler.__name__}"
+
+def _run_handler(event_type, handler, data):
+    """Call one handler, recording its latency and failures"""
+    started = time.perf_counter()
+    failed = False
+    try:
+        handler(data)
+    except Exception as e:
+        failed = True
+        logger.error(f"Error in event handler for {event_type}: {str(e)}")
+    elapsed = (time.perf_counter() - started) * 1000
+    name = _handler_name(handler)
+    with lock:
+        stats = handler_stats.setdefault(name, {
+            'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0
+        })
+        stats['calls'] += 1
+        stats['errors'] += failed
+        stats['total_ms'] += elapsed
+        stats['max_ms'] = max(stats['max_ms'], elapsed)
+
+def _dispatch(event_type, data):
+    """Run every current subscriber of an event on the calling thread"""
+    with lock:
+        handlers = event_handlers.get(event_type, []).copy()
+    for handler in handlers:
+        _run_handler(event_type, handler, data)
+
+class AsyncDispatcher:
+    """Bounded queues and worker threads that run one event type's handlers.
+
+    With a ``key`` (a payload field such as ``animal_id`` or a callable),
+    events with the same key always go to the same worker and are handled
+    in emit order; without one they are spread round-robin. When the queues
+    are full, ``overflow='drop'`` discards the event and ``'block'`` waits
+    up to ``block_timeout`` seconds (forever if None) for room before
+    discarding it.
+    """
+
+    def __init__(self, event_type, maxsize=1000, workers=2, overflow='drop',
+                 key=None, block_timeout=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of: {', '.join(OVERFLOW_POLICIES)}")
+        self.event_type = event_type
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.key = key
+        self.block_timeout = block_timeout
+        # One queue per worker so a key always maps to a single consumer
+        per_worker = max(maxsize // workers, 1)
+        self._queues = [queue.Queue(per_worker) for _ in range(workers)]
+        self._round_robin = count()
+        self._stats_lock = Lock()
+        self._stats = {
+            'submitted': 0,
+            'processed': 0,
+            'dropped': 0,
+            'max_queue_depth': 0,
+        }
+        self._threads = []
+        for index, work_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run, args=(work_queue,),
+                name=f'event-bus-{event_type}-{index}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _select_queue(self, data):
+        if self.key is None:
+            return self._queues[next(self._round_robin) % len(self._queues)]
+        if callable(self.key):
+            key = self.key(data)
+        else:
+            key = data.get(self.key) if isinstance(data, dict) else None
+        return self._queues[hash(key) % len(self._queues)]
+
+    def submit(self, data):
+        """Queue an event for the workers; returns False if it was dropped"""
+        work_queue = self._select_queue(data)
+        try:
+            if self.overflow == 'block':
+                work_queue.put(data, timeout=self.block_timeout)
+            else:
+                work_queue.put_nowait(data)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+            logger.warning(f"Event queue for {self.event_type} is full, event dropped")
+            return False
+        depth = self.queue_depth()
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        return True
+
+    def queue_depth(self):
+        return sum(work_queue.qsize() for work_queue in self._queues)
+
+    def _run(self, work_queue):
+        while True:
+            data = work_queue.get()
+            if data is _STOP:
+                break
+            _dispatch(self.event_type, data)
+            with self._stats_lock:
+                self._stats['processed'] += 1
+
+    def stop(self, timeout=5):
+        """Let the workers finish what is queued, then stop them"""
+        for work_queue in self._queues:
+            work_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Return a snapshot of the dispatcher counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'queue_depth': self.queue_depth(),
+            'capacity': sum(work_queue.maxsize for work_queue in self._queues),
+            'workers': len(self._queues),
+            'overflow': self.overflow,
+            'key': self.key if isinstance(self.key, str) else None,
+        })
+        return stats
+
 class EventBus:
     @staticmethod
     def subscribe(event_type):
@@ -27,27 +169,42 @@ class EventBus:
         return decorator
 
     @staticmethod
-    def emit(event_type, data, room=None):
-        """Emit an event to all subscribers and through socket.io if applicable"""
-        try:
-            # Handle socket.io events
-            if room:
-                socketio.emit(event_type, data, room=room)
-            else:
-                socketio.emit(event_type, data)
+    def configure_async(event_type, maxsize=1000, workers=2, overflow='drop', key=None,
+                        block_timeout=None):
+        """Run an event type's subscribers on a bounded worker pool instead of the emitter"""
+        with lock:
+            previous = dispatchers.pop(event_type, None)
+        if previous:
+            previous.stop()
+        dispatcher = AsyncDispatcher(event_type, maxsize, workers, overflow, key, block_timeout)
+        with lock:
+            dispatchers[event_type] = dispatcher
+        logger.info(f"Async dispatch enabled for {event_type} ({workers} workers, {overflow} on overflow)")
+        return dispatcher
 
-            # Handle local event subscribers
-            if event_type in event_handlers:
-                with lock:
-                    handlers = event_handlers[event_type].copy()
-                for handler in handlers:
-                    try:
-                        handler(data)
-                    except Exception as e:
-                        logger.error(f"Error in event handler for {event_type}: {str(e)}")
+    @staticmethod
+    def emit(event_type, data, room=None, socket=True):
+        """Emit an event to all subscribers and, unless ``socket`` is False, through socket.io"""
+        if socket:
+            try:
+                # Handle socket.io events
+                if room:
+                    socketio.emit(event_type, data, room=room)
+                else:
+                    socketio.emit(event_type, data)
+            except Exception as e:
+                logger.error(f"Error emitting event {event_type}: {str(e)}")
+
+        try:
+            # Handle local event subscribers, queued for async event types
+            dispatcher = dispatchers.get(event_type)
+            if dispatcher:
+                dispatcher.submit(data)
+            elif event_type in event_handlers:
+                _dispatch(event_type, data)
 
         except Exception as e:
-            logger.error(f"Error emitting event {event_type}: {str(e)}")
+            logger.error(f"Error dispatching event {event_type}: {str(e)}")
 
     @staticmethod
     def remove_handler(event_type, handler):
@@ -57,4 +214,25 @@ class EventBus:
                 try:
                     event_handlers[event_type].remove(handler)
                 except ValueError:
-                    pass
\ No newline at end of file
+                    pass
+
+    @staticmethod
+    def stats():
+        """Queue and per-handler latency metrics"""
+        with lock:
+            handlers = {
+                name: {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 3) if stats['calls'] else 0.0,
+                    'max_ms': round(stats['max_ms'], 3),
+                }
+                for name, stats in handler_stats.items()
+            }
+            queues = dict(dispatchers)
+        return {
+            'queues': {event_type: dispatcher.stats() for event_type, dispatcher in queues.items()},
+            'handlers': handlers,
+        }
+
+event_bus = EventBus()
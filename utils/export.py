@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from contextlib import closing
+from datetime import datetime
+from config.config import Config
+from config.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+# Exportable history tables. Rows are ordered by animal and then in the
+# native order of each table's (animal_id, date) index, with the rowid
+# breaking ties, so SQLite streams them straight off the index without
+# materializing a sort and each page resumes from the last row's key.
+EXPORT_DATASETS = {
+    'milk-production': {
+        'table': 'milk_production',
+        'columns': ['id', 'animal_id', 'production_date', 'time_of_day',
+                    'amount', 'fat_content', 'notes', 'created_at'],
+        'date_column': 'production_date',
+        'descending': False,
+    },
+    'health-metrics': {
+        'table': 'health_metrics',
+        'columns': ['id', 'animal_id', 'record_date', 'temperature', 'heart_rate',
+                    'respiratory_rate', 'weight', 'body_condition_score', 'notes'],
+        'date_column': 'record_date',
+        'descending': True,
+    },
+}
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def parse_export_date(value, name):
+    """Validate an optional YYYY-MM-DD date filter"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+def _page_conditions(spec, dated, last_row, start, end):
+    """WHERE conditions and parameters of one page of an animal's rows.
+
+    ``dated`` selects the rows with a date or those without one, which
+    sort first ascending and last descending. After ``last_row`` the key
+    is a range on the (animal_id, date) index, so every page seeks to its
+    first row instead of rescanning the rows before it. A date filter on
+    the side the key already bounds is dropped, so SQLite cannot pick it
+    over the key as the range.
+    """
+    date_column = f"t.{spec['date_column']}"
+    if not dated:
+        if last_row is None:
+            return [f'{date_column} IS NULL'], []
+        return [f'{date_column} IS NULL', 't.id > ?'], [last_row['id']]
+
+    conditions, params = [f'{date_column} IS NOT NULL'], []
+    key = last_row[spec['date_column']] if last_row is not None else None
+    if key is not None and spec['descending']:
+        conditions.append(f'{date_column} <= ? AND ({date_column} < ? OR t.id > ?)')
+        params += [key, key, last_row['id']]
+        end = None
+    elif key is not None:
+        conditions.append(f'({date_column}, t.id) > (?, ?)')
+        params += [key, last_row['id']]
+        start = None
+    if start:
+        conditions.append(f'{date_column} >= ?')
+        params.append(start)
+    if end:
+        # Inclusive end date, also for TIMESTAMP columns
+        conditions.append(f"{date_column} < date(?, '+1 day')")
+        params.append(end)
+    return conditions, params
+
+def iter_export_rows(dataset, user_id, animal_id=None, start=None, end=None,
+                     chunk_size=None):
+    """Yield a user's history rows in keyset-paged chunks.
+
+    Rows are paged one animal at a time. Each chunk is read on a pooled
+    connection that is checked back in before the chunk is yielded, so a
+    slow download never holds a connection or an open read transaction.
+    Rows written while an export runs may or may not be included, but none
+    is repeated or skipped.
+    """
+    spec = EXPORT_DATASETS[dataset]
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    columns = ', '.join(f't.{column}' for column in spec['columns'])
+    query = f'''
+        SELECT {columns}
+        FROM {spec['table']} t
+        WHERE t.animal_id = ? AND {{conditions}}
+        ORDER BY t.{spec['date_column']}{' DESC' if spec['descending'] else ''}, t.id
+        LIMIT ?
+    '''
+
+    animal_query = 'SELECT id FROM animal WHERE user_id = ?'
+    animal_params = [user_id]
+    if animal_id is not None:
+        animal_query += ' AND id = ?'
+        animal_params.append(animal_id)
+    with closing(get_pool('animals.db').checkout()) as conn:
+        animal_ids = [row['id'] for row in
+                      conn.execute(animal_query + ' ORDER BY id', animal_params).fetchall()]
+
+    # Undated rows never match a date filter
+    if start or end:
+        phases = (True,)
+    else:
+        phases = (True, False) if spec['descending'] else (False, True)
+    pages = ((animal, dated) for animal in animal_ids for dated in phases)
+    page = next(pages, None)
+    last_row = None
+    while page is not None:
+        rows = []
+        with closing(get_pool('animals.db').checkout()) as conn:
+            while page is not None and len(rows) < chunk_size:
+                animal, dated = page
+                conditions, params = _page_conditions(spec, dated, last_row, start, end)
+                wanted = chunk_size - len(rows)
+                batch = conn.execute(
+                    query.format(conditions=' AND '.join(conditions)),
+                    [animal, *params, wanted]
+                ).fetchall()
+                rows += batch
+                if len(batch) < wanted:
+                    page = next(pages, None)
+                    last_row = None
+                else:
+                    last_row = batch[-1]
+        if rows:
+            yield rows
+
+def ndjson_chunks(row_chunks):
+    """Encode row chunks as newline-delimited JSON"""
+    for rows in row_chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+def csv_chunks(row_chunks, columns):
+    """Encode row chunks as CSV, starting with a header line"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+    for rows in row_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(dataset, fmt, user_id, animal_id=None, start=None, end=None,
+                  compress=False):
+    """Return a generator of encoded export bytes for a dataset"""
+    row_chunks = iter_export_rows(dataset, user_id, animal_id, start, end)
+    if fmt == 'csv':
+        chunks = csv_chunks(row_chunks, EXPORT_DATASETS[dataset]['columns'])
+    else:
+        chunks = ndjson_chunks(row_chunks)
+    if compress:
+        chunks = gzip_chunks(chunks)
+
+    def logged(chunks):
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming {dataset} export: {str(e)}")
+            raise
+        logger.info(f"Streamed {dataset} export for user {user_id} ({total} bytes)")
+
+    return logged(chunks)
@@ -0,0 +1,158 @@
+from config.config import Config
+from utils.health_rules import DEFAULT_SPECIES
+from utils.herd_queries import LATEST_STATE_COLUMNS
+from utils.versions import VersionedCache, user_version
+import numpy as np
+
+# Daily ration per species, after the usual Indian dairy feeding guidelines:
+# dry matter intake is a share of body weight; concentrate covers
+# maintenance, one kg per ``litres_per_kg`` of milk and the last months of
+# pregnancy; roughage makes up the rest of the dry matter. ``whole_milk`` is
+# the litres of milk fed to young stock. ``weight`` stands in for animals
+# registered without one. Species match case-insensitively; unknown species
+# use the Cow row.
+FODDER_RULES = {
+    'Cow': {'dmi_percent': 2.5, 'maintenance': 1.0, 'litres_per_kg': 2.5, 'pregnancy': 1.25,
+            'mineral_g': 50, 'water': 40, 'whole_milk': 0, 'weight': 350},
+    'Buffalo': {'dmi_percent': 2.5, 'maintenance': 1.0, 'litres_per_kg': 2.0, 'pregnancy': 1.25,
+                'mineral_g': 60, 'water': 50, 'whole_milk': 0, 'weight': 450},
+    'Calf': {'dmi_percent': 2.5, 'maintenance': 0.5, 'litres_per_kg': 0, 'pregnancy': 0,
+             'mineral_g': 25, 'water': 15, 'whole_milk': 4, 'weight': 60},
+    'Goat': {'dmi_percent': 3.5, 'maintenance': 0.2, 'litres_per_kg': 2.0, 'pregnancy': 0.2,
+             'mineral_g': 10, 'water': 5, 'whole_milk': 0, 'weight': 35},
+    'Sheep': {'dmi_percent': 3.5, 'maintenance': 0.2, 'litres_per_kg': 2.0, 'pregnancy': 0.2,
+              'mineral_g': 10, 'water': 5, 'whole_milk': 0, 'weight': 35},
+    'Ox': {'dmi_percent': 2.0, 'maintenance': 1.0, 'litres_per_kg': 0, 'pregnancy': 0,
+           'mineral_g': 40, 'water': 40, 'whole_milk': 0, 'weight': 400},
+    'Bull': {'dmi_percent': 2.0, 'maintenance': 1.5, 'litres_per_kg': 0, 'pregnancy': 0,
+             'mineral_g': 50, 'water': 40, 'whole_milk': 0, 'weight': 450},
+}
+
+# Share of roughage dry matter fed green, and the water multiplier, per season
+SEASONS = {
+    'summer': {'green_share': 0.25, 'water_factor': 1.2},
+    'winter': {'green_share': 1 / 3, 'water_factor': 1.0},
+    'monsoon': {'green_share': 0.5, 'water_factor': 0.9},
+}
+DEFAULT_SEASON = 'winter'
+
+GREEN_DM = 0.20         # dry matter share of fresh green fodder
+DRY_DM = 0.90           # dry matter share of straw and hay
+CONCENTRATE_DM = 0.90   # dry matter share of concentrate
+MIN_ROUGHAGE_SHARE = 0.4  # roughage never drops below this share of dry matter
+LATE_PREGNANCY_MONTHS = 6  # pregnancy_cycle from which the pregnancy allowance applies
+WATER_PER_LITRE = 4     # extra litres of water per litre of milk
+DAYS_PER_MONTH = 30
+
+FEEDS = ('dry_matter', 'green_fodder', 'dry_fodder', 'concentrate', 'mineral_mix', 'water', 'whole_milk')
+
+_SPECIES_INDEX = {species.lower(): i for i, species in enumerate(FODDER_RULES)}
+_DEFAULT_INDEX = _SPECIES_INDEX[DEFAULT_SPECIES.lower()]
+_RULE_KEYS = ('dmi_percent', 'maintenance', 'litres_per_kg', 'pregnancy', 'mineral_g', 'water',
+              'whole_milk', 'weight')
+_RULE_MATRIX = np.array([[rules[key] for key in _RULE_KEYS] for rules in FODDER_RULES.values()],
+                        dtype=np.float64)
+_DMI, _MAINTENANCE, _LITRES_PER_KG, _PREGNANCY, _MINERAL, _WATER, _WHOLE_MILK, _WEIGHT = range(len(_RULE_KEYS))
+
+HERD_FODDER_QUERY = f'''
+    SELECT a.id, a.name, a.type, a.weight, a.pregnancy_cycle,
+           {LATEST_STATE_COLUMNS['milk_production']} AS milk_production
+    FROM animal a
+    LEFT JOIN animal_latest_state s ON s.animal_id = a.id
+    WHERE a.user_id = ?
+    ORDER BY a.id
+'''
+
+_fodder_cache = VersionedCache(Config.FODDER_CACHE_SIZE)
+
+def _as_float(value):
+    """Numeric value of a column, NaN when it is missing or not a number.
+
+    update_animal stores form fields as typed, so weight and
+    pregnancy_cycle may hold text such as ''.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _float_array(values, n):
+    return np.fromiter((_as_float(value) for value in values), dtype=np.float64, count=n)
+
+def fodder_arrays(types, weight, milk_production, pregnancy_cycle, season=DEFAULT_SEASON):
+    """Daily feed of a whole herd in one pass.
+
+    Takes parallel sequences, one entry per animal and None (or any
+    non-numeric value) where a value is missing, and returns a dict of arrays in kg/day (water in litres)
+    keyed by FEEDS, plus ``estimated_weight`` for animals scored at their
+    species' default weight.
+    """
+    n = len(types)
+    species = np.fromiter(
+        (_SPECIES_INDEX.get(str(t).strip().lower(), _DEFAULT_INDEX) for t in types),
+        dtype=np.intp, count=n
+    )
+    rules = _RULE_MATRIX[species]
+    season_rules = SEASONS[season]
+    weight = _float_array(weight, n)
+    milk = np.nan_to_num(_float_array(milk_production, n), nan=0.0)
+    months = np.nan_to_num(_float_array(pregnancy_cycle, n), nan=0.0)
+
+    estimated = ~(weight > 0)
+    weight = np.where(estimated, rules[:, _WEIGHT], weight)
+    milk = np.clip(milk, 0, None)
+
+    dry_matter = weight * rules[:, _DMI] / 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        milk_allowance = np.where(rules[:, _LITRES_PER_KG] > 0, milk / rules[:, _LITRES_PER_KG], 0.0)
+    concentrate = (rules[:, _MAINTENANCE] + milk_allowance
+                   + np.where(months >= LATE_PREGNANCY_MONTHS, rules[:, _PREGNANCY], 0.0))
+    # High yielders may need more dry matter than body weight alone gives
+    dry_matter = np.maximum(dry_matter, concentrate * CONCENTRATE_DM / (1 - MIN_ROUGHAGE_SHARE))
+    roughage = dry_matter - concentrate * CONCENTRATE_DM
+
+    return {
+        'dry_matter': dry_matter,
+        'green_fodder': roughage * season_rules['green_share'] / GREEN_DM,
+        'dry_fodder': roughage * (1 - season_rules['green_share']) / DRY_DM,
+        'concentrate': concentrate,
+        'mineral_mix': rules[:, _MINERAL] / 1000,
+        'water': (rules[:, _WATER] + WATER_PER_LITRE * milk) * season_rules['water_factor'],
+        'whole_milk': rules[:, _WHOLE_MILK].copy(),
+        'estimated_weight': estimated,
+    }
+
+def _compute_herd_fodder(conn, user_id, season):
+    rows = conn.execute(HERD_FODDER_QUERY, (user_id,)).fetchall()
+    feed = fodder_arrays(
+        [row['type'] for row in rows],
+        [row['weight'] for row in rows],
+        [row['milk_production'] for row in rows],
+        [row['pregnancy_cycle'] for row in rows],
+        season
+    )
+    daily = {name: round(float(feed[name].sum()), 2) for name in FEEDS}
+    return {
+        'season': season,
+        'animal_count': len(rows),
+        'daily': daily,
+        'monthly': {name: round(value * DAYS_PER_MONTH, 1) for name, value in daily.items()},
+        'animals': [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'type': row['type'],
+                'estimated_weight': bool(feed['estimated_weight'][i]),
+                **{name: round(float(feed[name][i]), 2) for name in FEEDS},
+            }
+            for i, row in enumerate(rows)
+        ],
+    }
+
+def herd_fodder(conn, user_id, season=DEFAULT_SEASON):
+    """Per-animal and farm daily/monthly feed of a user's herd.
+
+    Cached per user and season until the herd's data version moves.
+    """
+    return _fodder_cache.get((user_id, season), user_version(conn, user_id),
+                             lambda: _compute_herd_fodder(conn, user_id, season))
@@ -0,0 +1,208 @@
+import logging
+import numpy as np
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+HEALTHY, MODERATE, CRITICAL = 0, 1, 2
+STATUS_LABELS = ('Healthy', 'Moderate', 'Critical')
+
+DAIRY_SPECIES = ('Cow', 'Buffalo', 'Goat', 'Sheep')
+DRAUGHT_SPECIES = ('Ox', 'Bull')
+
+# Normal ranges per species. Unknown species are scored with the Cow row.
+# milk_min applies to dairy species and weight_min to draught animals.
+SPECIES_RULES = {
+    'Cow': {'temp': (37.5, 39.5), 'heart': (48, 84), 'resp': (26, 50), 'milk_min': 15, 'weight_min': 0},
+    'Buffalo': {'temp': (37.2, 38.5), 'heart': (40, 60), 'resp': (20, 30), 'milk_min': 10, 'weight_min': 0},
+    'Goat': {'temp': (38.5, 40.0), 'heart': (70, 90), 'resp': (15, 30), 'milk_min': 2, 'weight_min': 0},
+    'Sheep': {'temp': (38.3, 39.9), 'heart': (70, 80), 'resp': (16, 34), 'milk_min': 0.5, 'weight_min': 0},
+    'Ox': {'temp': (37.5, 39.5), 'heart': (40, 70), 'resp': (20, 40), 'milk_min': 0, 'weight_min': 300},
+    'Bull': {'temp': (37.5, 39.5), 'heart': (40, 70), 'resp': (20, 40), 'milk_min': 0, 'weight_min': 300},
+}
+TEMP_MARGIN = 0.5  # band below the upper temperature limit that counts as elevated
+DEFAULT_SPECIES = 'Cow'
+
+_SPECIES = list(SPECIES_RULES)
+_SPECIES_INDEX = {species: i for i, species in enumerate(_SPECIES)}
+
+# Rule table as columns of one float matrix, one row per species, so a
+# whole herd's thresholds are a single fancy-indexing gather.
+_T_LOW, _T_HIGH, _H_LOW, _H_HIGH, _R_LOW, _R_HIGH, _MILK_MIN, _WEIGHT_MIN, _DAIRY, _DRAUGHT = range(10)
+_RULE_MATRIX = np.array([
+    [
+        rules['temp'][0], rules['temp'][1],
+        rules['heart'][0], rules['heart'][1],
+        rules['resp'][0], rules['resp'][1],
+        rules['milk_min'], rules['weight_min'],
+        species in DAIRY_SPECIES, species in DRAUGHT_SPECIES,
+    ]
+    for species, rules in SPECIES_RULES.items()
+], dtype=np.float64)
+
+# (alert type, severity, message) of every rule, in evaluation order
+RULES = (
+    ('temperature', CRITICAL, 'High temperature'),
+    ('temperature', MODERATE, 'Slightly elevated temperature'),
+    ('temperature', MODERATE, 'Low temperature'),
+    ('heart_rate', CRITICAL, 'Critical heart rate'),
+    ('heart_rate', MODERATE, 'High heart rate'),
+    ('heart_rate', MODERATE, 'Low heart rate'),
+    ('respiratory_rate', MODERATE, 'Abnormal respiratory rate'),
+    ('milk_production', MODERATE, 'Low milk production'),
+    ('weight', MODERATE, 'Low weight'),
+)
+
+ALERT_UNITS = {
+    'temperature': 'deg C',
+    'heart_rate': 'bpm',
+    'respiratory_rate': 'breaths/min',
+    'milk_production': 'L/day',
+    'weight': 'kg',
+}
+
+class HerdHealth:
+    """Result of classify_arrays: a status per animal plus the rule findings.
+
+    Alert dicts are only built on demand for the animals a caller asks
+    about, so classifying a large, mostly healthy herd stays array-only.
+    """
+
+    def __init__(self, status, findings, values):
+        self.status = status        # int8 HEALTHY/MODERATE/CRITICAL per animal
+        self._findings = findings   # bool, one row per entry of RULES
+        self._values = values       # reading checked by each rule
+
+    def __len__(self):
+        return len(self.status)
+
+    def flagged(self):
+        """Indexes of animals with at least one finding"""
+        return np.flatnonzero(self.status).tolist()
+
+    def labels(self):
+        """Status label per animal"""
+        return [STATUS_LABELS[code] for code in self.status.tolist()]
+
+    def counts(self):
+        """Number of animals per status label"""
+        totals = np.bincount(self.status, minlength=len(STATUS_LABELS))
+        return {label: int(totals[code]) for code, label in enumerate(STATUS_LABELS)}
+
+    def alerts(self, index):
+        """``{'type', 'severity', 'message', 'value'}`` dicts for one animal"""
+        return [
+            {
+                'type': alert_type,
+                'severity': STATUS_LABELS[severity].lower(),
+                'message': message,
+                'value': float(self._values[rule][index]),
+            }
+            for rule, (alert_type, severity, message) in enumerate(RULES)
+            if self._findings[rule, index]
+        ]
+
+def _as_array(values, n):
+    """Float array with NaN for missing readings"""
+    if values is None:
+        return np.full(n, np.nan)
+    # NumPy converts None to NaN when casting to float
+    return np.asarray(values, dtype=np.float64)
+
+def classify_arrays(types, temperature, heart_rate, respiratory_rate,
+                    milk_production=None, weight=None):
+    """Score a herd's latest readings against the species rule table in one pass.
+
+    Takes parallel sequences, one entry per animal and None for a missing
+    reading, and returns a HerdHealth.
+    """
+    n = len(types)
+    species = np.fromiter(
+        (_SPECIES_INDEX.get(t, _SPECIES_INDEX[DEFAULT_SPECIES]) for t in types),
+        dtype=np.intp, count=n
+    )
+    rules = _RULE_MATRIX[species]
+    temp = _as_array(temperature, n)
+    heart = _as_array(heart_rate, n)
+    resp = _as_array(respiratory_rate, n)
+    milk = _as_array(milk_production, n)
+    mass = _as_array(weight, n)
+
+    # Comparisons with NaN are False, so missing readings never alert. Zero
+    # readings count as missing like the per-animal checks always did.
+    with np.errstate(invalid='ignore'):
+        temp_seen = temp > 0
+        heart_seen = heart > 0
+        high_temp = temp_seen & (temp > rules[:, _T_HIGH])
+        findings = np.stack((
+            high_temp,
+            temp_seen & ~high_temp & (temp > rules[:, _T_HIGH] - TEMP_MARGIN),
+            temp_seen & (temp < rules[:, _T_LOW]),
+            heart_seen & (heart >= Config.HEART_RATE_CRITICAL),
+            heart_seen & (heart < Config.HEART_RATE_CRITICAL) & (heart > rules[:, _H_HIGH]),
+            heart_seen & (heart < rules[:, _H_LOW]),
+            (resp > 0) & ((resp < rules[:, _R_LOW]) | (resp > rules[:, _R_HIGH])),
+            (rules[:, _DAIRY] > 0) & (milk > 0) & (milk < rules[:, _MILK_MIN]),
+            (rules[:, _DRAUGHT] > 0) & (mass > 0) & (mass < rules[:, _WEIGHT_MIN]),
+        ))
+    values = (temp, temp, temp, heart, heart, heart, resp, milk, mass)
+
+    # Severity of each rule times its finding, worst one per animal
+    severities = np.array([severity for _, severity, _ in RULES], dtype=np.int8)
+    status = (findings * severities[:, None]).max(axis=0).astype(np.int8) if n else np.zeros(0, np.int8)
+    return HerdHealth(status, findings, values)
+
+def format_alert(alert):
+    """Human readable alert text including the offending value"""
+    return f"{alert['message']} ({alert['value']:g} {ALERT_UNITS[alert['type']]})"
+
+def classify_herd(rows):
+    """Classify latest-state rows (type, last_temp, last_heart_rate,
+    last_respiratory_rate, milk_production, weight) as a HerdHealth"""
+    return classify_arrays(
+        [row.get('type') for row in rows],
+        [row.get('last_temp') for row in rows],
+        [row.get('last_heart_rate') for row in rows],
+        [row.get('last_respiratory_rate') for row in rows],
+        [row.get('milk_production') for row in rows],
+        [row.get('weight') for row in rows],
+    )
+
+def _species_sql(type_column, values):
+    """CASE expression picking a per-species threshold, Cow's for unknown species"""
+    whens = ' '.join(f"WHEN '{species}' THEN {value!r}" for species, value in values.items())
+    return f"(CASE {type_column} {whens} ELSE {values[DEFAULT_SPECIES]!r} END)"
+
+def health_status_sql(type_column, temp_column, heart_column, resp_column, milk_column, weight_column):
+    """SQL expression scoring one row HEALTHY/MODERATE/CRITICAL like classify_arrays.
+
+    Built from the same rule table so herd aggregates in SQL agree with the
+    per-animal API. NULL and zero readings never alert, as in classify_arrays.
+    """
+    def threshold(key, index=None):
+        return _species_sql(type_column, {
+            species: rules[key] if index is None else rules[key][index]
+            for species, rules in SPECIES_RULES.items()
+        })
+
+    temp_high = threshold('temp', 1)
+    critical = (
+        f"({temp_column} > 0 AND {temp_column} > {temp_high})"
+        f" OR ({heart_column} > 0 AND {heart_column} >= {Config.HEART_RATE_CRITICAL})"
+    )
+    # Unknown species take the Cow row, dairy flag included
+    dairy = _species_sql(type_column, {species: int(species in DAIRY_SPECIES) for species in SPECIES_RULES})
+    draught = _species_sql(type_column, {species: int(species in DRAUGHT_SPECIES) for species in SPECIES_RULES})
+    moderate = ' OR '.join((
+        f"({temp_column} > 0 AND ({temp_column} > {temp_high} - {TEMP_MARGIN} OR {temp_column} < {threshold('temp', 0)}))",
+        f"({heart_column} > 0 AND ({heart_column} > {threshold('heart', 1)} OR {heart_column} < {threshold('heart', 0)}))",
+        f"({resp_column} > 0 AND ({resp_column} < {threshold('resp', 0)} OR {resp_column} > {threshold('resp', 1)}))",
+        f"({dairy} = 1 AND {milk_column} > 0 AND {milk_column} < {threshold('milk_min')})",
+        f"({draught} = 1 AND {weight_column} > 0 AND {weight_column} < {threshold('weight_min')})",
+    ))
+    return f"(CASE WHEN {critical} THEN {CRITICAL} WHEN {moderate} THEN {MODERATE} ELSE {HEALTHY} END)"
+
+def classify_animal(row):
+    """Return (status label, alerts) for a single latest-state row"""
+    health = classify_herd([row])
+    return STATUS_LABELS[health.status[0]], health.alerts(0)
@@ -1,16 +1,13 @@
-import os
-from werkzeug.utils import secure_filename
 from config.config import Config
+from utils.uploads import save_upload
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 def save_file(file, user_id):
+    """Store an allowed upload content-addressed; raises UploadError if it is rejected"""
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"{user_id}_{file.filename}")
-        file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(file_path)
-        return filename
+        return save_upload(file)
     return None
 
 def validate_animal_data(data):
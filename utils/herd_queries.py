@@ -0,0 +1,310 @@
+from config.config import Config
+from utils.health_rules import HEALTHY, MODERATE, CRITICAL, health_status_sql
+from utils.versions import VersionedCache, user_version
+import base64
+import binascii
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Assignments that recompute one animal's cached columns in
+# animal_latest_state from the history tables. {animal_id} is the SQL
+# expression naming the animal (OLD.animal_id inside a trigger,
+# animal_latest_state.animal_id for a bulk rebuild). Each one is a LIMIT 1
+# seek on the (animal_id, date) indexes from migration 2.
+HEALTH_STATE_REFRESH = '''
+    (last_health_id, last_temp, last_heart_rate, last_respiratory_rate, last_checkup) = (
+        SELECT id, temperature, heart_rate, respiratory_rate, record_date
+        FROM health_metrics
+        WHERE animal_id = {animal_id}
+        ORDER BY record_date DESC
+        LIMIT 1
+    )
+'''
+
+VACCINATION_STATE_REFRESH = '''
+    (last_vaccination_id, last_vaccine, last_vaccine_date, next_vaccination) = (
+        SELECT id, vaccine_name, date_given, next_due_date
+        FROM vaccinations
+        WHERE animal_id = {animal_id}
+        ORDER BY date_given DESC
+        LIMIT 1
+    )
+'''
+
+MILK_STATE_REFRESH = '''
+    last_milk_date = (
+        SELECT MAX(production_date) FROM milk_production WHERE animal_id = {animal_id}
+    ),
+    last_milk_amount = (
+        SELECT SUM(amount)
+        FROM milk_production
+        WHERE animal_id = {animal_id}
+          AND production_date = (
+              SELECT MAX(production_date) FROM milk_production WHERE animal_id = {animal_id}
+          )
+    )
+'''
+
+# Columns an animal listing can project, mapped to their SQL expressions
+# over animal a LEFT JOIN animal_latest_state s. The latest-state values
+# are a primary-key lookup per animal, independent of history length.
+LATEST_STATE_COLUMNS = {
+    'id': 'a.id',
+    'user_id': 'a.user_id',
+    'name': 'a.name',
+    'type': 'a.type',
+    'breed': 'a.breed',
+    'age': 'a.age',
+    'weight': 'a.weight',
+    'pregnancy_cycle': 'a.pregnancy_cycle',
+    'has_horns': 'a.has_horns',
+    'category': 'a.category',
+    'use_purpose': 'a.use_purpose',
+    'photo': 'a.photo',
+    'image_filename': 'a.image_filename',
+    'created_at': 'a.created_at',
+    'last_temp': 's.last_temp',
+    'last_heart_rate': 's.last_heart_rate',
+    'last_respiratory_rate': 's.last_respiratory_rate',
+    'last_checkup': 's.last_checkup',
+    'milk_production': 'COALESCE(s.last_milk_amount, a.milk_production)',
+    'last_milk_date': 's.last_milk_date',
+    'vaccine_name': 's.last_vaccine',
+    'last_vaccine_date': 's.last_vaccine_date',
+    'next_vaccination': 's.next_vaccination',
+    'is_milking': "(CASE WHEN a.type IN ('Cow', 'Buffalo') AND a.milk_production > 0 THEN 1 ELSE 0 END)",
+    'is_pregnant': "(CASE WHEN a.category = 'Pregnant' OR a.pregnancy_cycle > 0 THEN 1 ELSE 0 END)",
+}
+
+# Filters that can be pushed into the WHERE clause of a listing
+HERD_FILTERS = ('type', 'category', 'is_milking', 'is_pregnant')
+
+def _latest_state_query(fields=None):
+    """SELECT over a user's animals and their latest state, projecting ``fields``"""
+    fields = fields or list(LATEST_STATE_COLUMNS)
+    columns = ',\n           '.join(f'{LATEST_STATE_COLUMNS[field]} AS {field}' for field in fields)
+    return f'''
+    SELECT {columns}
+    FROM animal a
+    LEFT JOIN animal_latest_state s ON s.animal_id = a.id
+    WHERE a.user_id = ?
+'''
+
+LATEST_STATE_QUERY = _latest_state_query()
+
+def encode_cursor(animal_id):
+    """Opaque pagination cursor for the last animal id of a page"""
+    return base64.urlsafe_b64encode(f'id:{animal_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return the animal id encoded in a cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        prefix, animal_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':', 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if prefix != 'id' or not animal_id.isdigit():
+        raise ValueError('Invalid cursor')
+    return int(animal_id)
+
+def parse_fields(fields_param):
+    """Validate a comma separated ``fields=`` projection; None means all columns"""
+    if not fields_param:
+        return None
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in LATEST_STATE_COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    # The id is always returned so that the page can be continued
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def fetch_herd_latest_state(conn, user_id):
+    """Return every animal of a user with its latest health, vaccination and milk values"""
+    cursor = conn.cursor()
+    cursor.execute(LATEST_STATE_QUERY + ' ORDER BY a.id', (user_id,))
+    return cursor.fetchall()
+
+# Columns the health classifier reads, for every animal with a reading
+HEALTH_SCAN_FIELDS = ['id', 'user_id', 'name', 'type', 'weight', 'milk_production',
+                      'last_temp', 'last_heart_rate', 'last_respiratory_rate', 'last_checkup']
+
+def _latest_readings_cursor(conn, since=None):
+    columns = ', '.join(f'{LATEST_STATE_COLUMNS[field]} AS {field}' for field in HEALTH_SCAN_FIELDS)
+    query = f'''
+        SELECT {columns}
+        FROM animal a
+        JOIN animal_latest_state s ON s.animal_id = a.id
+        WHERE s.last_checkup IS NOT NULL
+    '''
+    params = ()
+    if since is not None:
+        query += ' AND s.last_checkup >= ?'
+        params = (since,)
+    cursor = conn.cursor()
+    cursor.execute(query + ' ORDER BY a.id', params)
+    return cursor
+
+def fetch_latest_readings(conn, since=None):
+    """Return the latest readings of all animals across users.
+
+    Only animals with a health record are returned; ``since`` limits them to
+    those whose latest reading is at or after that timestamp.
+    """
+    return _latest_readings_cursor(conn, since).fetchall()
+
+def fetch_latest_reading_columns(conn, since=None):
+    """Like fetch_latest_readings, but as one list per HEALTH_SCAN_FIELDS column.
+
+    Skips building a dict per row, which dominates when the readings of a
+    whole herd are handed straight to the vectorized health classifier.
+    """
+    cursor = _latest_readings_cursor(conn, since)
+    cursor.row_factory = None
+    rows = cursor.fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(HEALTH_SCAN_FIELDS)
+    return dict(zip(HEALTH_SCAN_FIELDS, columns))
+
+def fetch_herd_page(conn, user_id, after_id=None, limit=50, fields=None, filters=None):
+    """Return one keyset page of a user's animals and the cursor of the next page.
+
+    Pages are ordered by animal id and continue after ``after_id``, so each
+    page is a seek on idx_animal_user rather than an OFFSET scan. ``filters``
+    maps names from HERD_FILTERS to the value to match.
+    """
+    conditions = []
+    params = [user_id]
+    if after_id is not None:
+        conditions.append('a.id > ?')
+        params.append(after_id)
+    for name, value in (filters or {}).items():
+        if name not in HERD_FILTERS:
+            raise ValueError(f'Unknown filter: {name}')
+        if value is None:
+            continue
+        conditions.append(f'{LATEST_STATE_COLUMNS[name]} = ?')
+        params.append(value)
+
+    query = _latest_state_query(fields)
+    for condition in conditions:
+        query += f' AND {condition}'
+    query += ' ORDER BY a.id LIMIT ?'
+    # One extra row tells whether another page follows
+    params.append(limit + 1)
+
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['id'])
+    return rows, next_cursor
+
+# Health status of each animal's latest readings, scored in SQL
+HEALTH_STATUS_SQL = health_status_sql(
+    'a.type', 's.last_temp', 's.last_heart_rate', 's.last_respiratory_rate',
+    LATEST_STATE_COLUMNS['milk_production'], 'a.weight'
+)
+
+HERD_SUMMARY_QUERY = f'''
+    SELECT COUNT(*) AS total_count,
+           COALESCE(SUM(health_status = {HEALTHY}), 0) AS healthy_count,
+           COALESCE(SUM(health_status = {MODERATE}), 0) AS moderate_count,
+           COALESCE(SUM(health_status = {CRITICAL}), 0) AS critical_count,
+           COALESCE(SUM(health_status > {HEALTHY}), 0) AS alert_count,
+           COALESCE(SUM(is_milking), 0) AS milking_count,
+           COALESCE(SUM(is_pregnant), 0) AS pregnant_count,
+           COALESCE(SUM(age < 12), 0) AS calves_count,
+           COALESCE(SUM(type = 'Cow'), 0) AS cows_count,
+           COALESCE(SUM(type = 'Bull'), 0) AS bulls_count
+    FROM (
+        SELECT a.type, a.age,
+               {LATEST_STATE_COLUMNS['is_milking']} AS is_milking,
+               {LATEST_STATE_COLUMNS['is_pregnant']} AS is_pregnant,
+               {HEALTH_STATUS_SQL} AS health_status
+        FROM animal a
+        LEFT JOIN animal_latest_state s ON s.animal_id = a.id
+        WHERE a.user_id = ?
+    )
+'''
+
+def fetch_herd_summary(conn, user_id):
+    """Return the herd-wide group and health status counts of a user in a single aggregate"""
+    cursor = conn.cursor()
+    cursor.execute(HERD_SUMMARY_QUERY, (user_id,))
+    return cursor.fetchone()
+
+def fetch_animal_latest_state(conn, user_id, animal_id):
+    """Return one animal of a user with its latest state, or None"""
+    cursor = conn.cursor()
+    cursor.execute(LATEST_STATE_QUERY + ' AND a.id = ?', (user_id, animal_id))
+    return cursor.fetchone()
+
+def rebuild_latest_state(conn, animal_ids=None, commit=True):
+    """Recompute animal_latest_state from the history tables to repair drift.
+
+    Rebuilds every animal when ``animal_ids`` is None. Returns the number of
+    state rows refreshed. Pass ``commit=False`` to run inside the caller's
+    transaction.
+    """
+    params = ()
+    animal_filter = ''
+    if animal_ids is not None:
+        animal_ids = list(animal_ids)
+        if not animal_ids:
+            return 0
+        placeholders = ', '.join('?' for _ in animal_ids)
+        animal_filter = f' WHERE animal_id IN ({placeholders})'
+        params = tuple(animal_ids)
+
+    try:
+        if animal_ids is None:
+            conn.execute('DELETE FROM animal_latest_state WHERE animal_id NOT IN (SELECT id FROM animal)')
+            conn.execute('INSERT OR IGNORE INTO animal_latest_state (animal_id) SELECT id FROM animal')
+        else:
+            conn.execute(
+                'INSERT OR IGNORE INTO animal_latest_state (animal_id) '
+                f'SELECT id FROM animal WHERE id IN ({placeholders})',
+                params
+            )
+
+        current = 'animal_latest_state.animal_id'
+        conn.execute(
+            'UPDATE animal_latest_state SET '
+            + HEALTH_STATE_REFRESH.format(animal_id=current) + animal_filter,
+            params
+        )
+        conn.execute(
+            'UPDATE animal_latest_state SET '
+            + VACCINATION_STATE_REFRESH.format(animal_id=current) + animal_filter,
+            params
+        )
+        cursor = conn.execute(
+            'UPDATE animal_latest_state SET '
+            + MILK_STATE_REFRESH.format(animal_id=current) + animal_filter,
+            params
+        )
+        if commit:
+            conn.commit()
+        logger.info(f"Rebuilt latest state for {cursor.rowcount} animals")
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Error rebuilding latest state: {str(e)}")
+        if commit:
+            conn.rollback()
+        raise
+
+_summary_cache = VersionedCache(Config.HERD_SUMMARY_CACHE_SIZE)
+
+def get_herd_summary(conn, user_id):
+    """Herd summary of a user, recomputed only after the user's data version moves.
+
+    Every write to a user's animals or their history bumps the user's
+    version (animals.db v7 triggers), so a cached summary stays valid until
+    then and a page header costs one primary-key lookup.
+    """
+    return _summary_cache.get(user_id, user_version(conn, user_id),
+                              lambda: dict(fetch_herd_summary(conn, user_id)))
@@ -0,0 +1,36 @@
+from config.config import Config
+from datetime import date
+from utils.herd_queries import get_herd_summary
+
+# Dashboard KPIs are assembled from running aggregates only: the cached herd
+# summary and the trigger-maintained user_milk_daily totals (animals.db v8).
+# Nothing here scans milk_production or health_metrics.
+
+def fetch_milk_totals(conn, user_id, today):
+    """Return (litres today, litres this month so far) from user_milk_daily"""
+    month_start = today.replace(day=1).isoformat()
+    row = conn.execute('''
+        SELECT COALESCE(SUM(CASE WHEN day = ? THEN litres END), 0) AS today_litres,
+               COALESCE(SUM(litres), 0) AS month_litres
+        FROM user_milk_daily
+        WHERE user_id = ? AND day >= ? AND day <= ?
+    ''', (today.isoformat(), user_id, month_start, today.isoformat())).fetchone()
+    return row['today_litres'], row['month_litres']
+
+def dashboard_kpis(conn, user_id, today=None):
+    """Livestock count, herd health, daily milk and monthly milk revenue of a user"""
+    today = today or date.today()
+    summary = get_herd_summary(conn, user_id)
+    today_litres, month_litres = fetch_milk_totals(conn, user_id, today)
+    total = summary['total_count']
+    return {
+        'date': today.isoformat(),
+        'total_animals': total,
+        'healthy_animals': summary['healthy_count'],
+        'alert_animals': summary['alert_count'],
+        'health_percent': round(100 * summary['healthy_count'] / total, 1) if total else None,
+        'milk_today_litres': round(today_litres, 2),
+        'milk_month_litres': round(month_litres, 2),
+        'revenue_today': round(today_litres * Config.MILK_PRICE_PER_LITRE, 2),
+        'revenue_month': round(month_litres * Config.MILK_PRICE_PER_LITRE, 2),
+    }
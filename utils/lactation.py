@@ -0,0 +1,240 @@
+from config.config import Config
+from datetime import date, timedelta
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lactation curves follow Wood's model, y(t) = a * t^b * e^(-c*t) with t the
+# days in milk. Taking logs makes it linear in (ln a, b, c):
+#     ln y = ln a + b * ln t - c * t
+# so every animal's fit is a 3x3 least-squares problem. The normal equations
+# of a whole batch are accumulated with np.bincount and solved together.
+#
+# There is no calving date in the schema, so a lactation is taken to start
+# at the first milk record after a gap of LACTATION_GAP_DAYS or more.
+
+# Animals whose fit is missing or older than their milk data version
+STALE_FITS_QUERY = '''
+    SELECT a.id AS animal_id, COALESCE(v.version, 0) AS version
+    FROM animal a
+    LEFT JOIN animal_milk_versions v ON v.animal_id = a.id
+    LEFT JOIN lactation_fits f ON f.animal_id = a.id
+    WHERE {where} AND (f.animal_id IS NULL OR f.version != COALESCE(v.version, 0))
+'''
+
+DAILY_HISTORY_QUERY = '''
+    SELECT animal_id, production_date, SUM(amount) AS litres,
+           COUNT(DISTINCT time_of_day) AS sessions
+    FROM milk_production
+    WHERE animal_id IN ({placeholders}) AND production_date >= ?
+    GROUP BY animal_id, production_date
+    ORDER BY animal_id, production_date
+'''
+
+SAVE_FIT_QUERY = '''
+    INSERT OR REPLACE INTO lactation_fits
+    (animal_id, version, lactation_start, last_date, points, a, b, c, recent_avg, fitted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+
+FITS_QUERY = '''
+    SELECT f.animal_id, a.name, f.lactation_start, f.last_date, f.points,
+           f.a, f.b, f.c, f.recent_avg
+    FROM lactation_fits f
+    JOIN animal a ON a.id = f.animal_id
+    WHERE a.user_id = ?
+    ORDER BY f.animal_id
+'''
+
+RECENT_DAYS = 7  # days averaged for the flat forecast of animals without a curve
+
+def fit_wood_arrays(index, day, litres, sessions, n):
+    """Fit Wood's curve to the current lactation of ``n`` animals at once.
+
+    ``index`` (animal 0..n-1), ``day`` (date ordinal), ``litres`` and
+    ``sessions`` are parallel arrays of daily totals sorted by animal and
+    day. Returns a dict of per-animal arrays: lactation_start, last_date
+    (ordinals, 0 without records), points, a, b, c (NaN where no usable
+    curve was fitted) and recent_avg.
+    """
+    index = np.asarray(index, dtype=np.intp)
+    day = np.asarray(day, dtype=np.int64)
+    litres = np.asarray(litres, dtype=np.float64)
+    sessions = np.asarray(sessions, dtype=np.int64)
+    result = {
+        'lactation_start': np.zeros(n, np.int64), 'last_date': np.zeros(n, np.int64),
+        'points': np.zeros(n, np.int64), 'recent_avg': np.full(n, np.nan),
+        'a': np.full(n, np.nan), 'b': np.full(n, np.nan), 'c': np.full(n, np.nan),
+    }
+    if not len(index):
+        return result
+
+    positions = np.arange(len(index))
+    first = np.r_[True, index[1:] != index[:-1]]
+    starts = np.flatnonzero(first)
+    ends = np.r_[starts[1:], len(index)] - 1
+    animals = index[starts]
+
+    # A day milked fewer times than the animal's usual is still being
+    # recorded if it is the latest one; leave it out until it is complete
+    usual_sessions = np.maximum.reduceat(sessions, starts)[np.cumsum(first) - 1]
+    last = np.zeros(len(index), bool)
+    last[ends] = True
+    complete = ~(last & (sessions < usual_sessions))
+
+    # Each row's lactation starts at the latest gap at or before it; the
+    # current lactation is the one holding the animal's last row
+    gap = np.r_[True, np.diff(day) >= Config.LACTATION_GAP_DAYS] | first
+    lactation_row = np.maximum.accumulate(np.where(gap, positions, 0))
+    current_row = np.zeros(n, np.intp)
+    current_row[animals] = lactation_row[ends]
+    keep = (lactation_row == current_row[index]) & complete & (litres > 0)
+
+    result['lactation_start'][animals] = day[current_row[animals]]
+    result['last_date'][animals] = day[ends]
+
+    index, day, litres = index[keep], day[keep], litres[keep]
+    points = np.bincount(index, minlength=n)
+    result['points'] = points
+
+    # Mean of the last RECENT_DAYS recorded days, for the flat fallback
+    last_kept = np.zeros(n, np.int64)
+    np.maximum.at(last_kept, index, day)
+    recent = day > last_kept[index] - RECENT_DAYS
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['recent_avg'] = (np.bincount(index[recent], litres[recent], minlength=n)
+                                / np.bincount(index[recent], minlength=n))
+
+    # Normal equations X'X p = X'y per animal, with X = [1, ln t, -t]
+    t = (day - result['lactation_start'][index] + 1).astype(np.float64)
+    columns = (np.ones_like(t), np.log(t), -t)
+    y = np.log(litres)
+    xtx = np.empty((n, 3, 3))
+    xty = np.empty((n, 3))
+    for i in range(3):
+        xty[:, i] = np.bincount(index, columns[i] * y, minlength=n)
+        for j in range(i, 3):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(index, columns[i] * columns[j], minlength=n)
+    # pinv keeps animals with degenerate histories from failing the batch
+    params = (np.linalg.pinv(xtx) @ xty[:, :, None])[:, :, 0]
+
+    # A curve that never declines cannot be extrapolated
+    fitted = (points >= Config.LACTATION_MIN_POINTS) & np.isfinite(params).all(axis=1) & (params[:, 2] > 0)
+    result['a'][fitted] = np.exp(params[fitted, 0])
+    result['b'][fitted] = params[fitted, 1]
+    result['c'][fitted] = params[fitted, 2]
+    return result
+
+def forecast_arrays(fits, today, days):
+    """Projected daily litres of each animal for ``days`` days after ``today``.
+
+    Animals with a fitted curve follow it, others stay at their recent
+    average. An animal is forecast dry past LACTATION_LENGTH_DAYS in milk
+    or when its records stopped LACTATION_GAP_DAYS ago. Returns an
+    (animals, days) matrix.
+    """
+    today = today.toordinal()
+    start = np.asarray(fits['lactation_start'], dtype=np.float64)
+    a, b, c = (np.asarray(fits[key], dtype=np.float64) for key in ('a', 'b', 'c'))
+    recent = np.asarray(fits['recent_avg'], dtype=np.float64)
+    t = (today - start + 1)[:, None] + np.arange(1, days + 1)[None, :]
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        wood = a[:, None] * t ** b[:, None] * np.exp(-c[:, None] * t)
+    litres = np.where(np.isnan(a)[:, None], recent[:, None], wood)
+    milking = today - np.asarray(fits['last_date']) < Config.LACTATION_GAP_DAYS
+    litres[(t > Config.LACTATION_LENGTH_DAYS) | ~milking[:, None]] = 0.0
+    return np.nan_to_num(litres, nan=0.0, posinf=0.0)
+
+def _ordinal(value):
+    return date.fromisoformat(value).toordinal() if value else 0
+
+def _iso(ordinal):
+    return date.fromordinal(int(ordinal)).isoformat() if ordinal else None
+
+def _none_if_nan(value):
+    return None if np.isnan(value) else float(value)
+
+def _fit_chunk(conn, stale, since):
+    """Fit and store the curves of up to 500 (animal_id, version) pairs"""
+    animal_ids = sorted(animal_id for animal_id, _ in stale)
+    row_of = {animal_id: i for i, animal_id in enumerate(animal_ids)}
+    rows = conn.execute(
+        DAILY_HISTORY_QUERY.format(placeholders=', '.join('?' for _ in animal_ids)),
+        (*animal_ids, since)
+    ).fetchall()
+    fits = fit_wood_arrays(
+        [row_of[row['animal_id']] for row in rows],
+        [_ordinal(row['production_date']) for row in rows],
+        [row['litres'] for row in rows],
+        [row['sessions'] for row in rows],
+        len(animal_ids)
+    )
+    versions = dict(stale)
+    conn.executemany(SAVE_FIT_QUERY, [
+        (animal_id, versions[animal_id],
+         _iso(fits['lactation_start'][i]), _iso(fits['last_date'][i]), int(fits['points'][i]),
+         _none_if_nan(fits['a'][i]), _none_if_nan(fits['b'][i]), _none_if_nan(fits['c'][i]),
+         _none_if_nan(fits['recent_avg'][i]))
+        for i, animal_id in enumerate(animal_ids)
+    ])
+
+def refresh_fits(conn, user_id=None, today=None):
+    """Refit the animals whose milk data changed since their last fit.
+
+    Covers one user's herd, or every herd when ``user_id`` is None.
+    Returns the number of animals refit.
+    """
+    today = today or date.today()
+    where, params = ('a.user_id = ?', (user_id,)) if user_id is not None else ('1 = 1', ())
+    stale = [(row['animal_id'], row['version'])
+             for row in conn.execute(STALE_FITS_QUERY.format(where=where), params).fetchall()]
+    if not stale:
+        return 0
+    since = (today - timedelta(days=Config.LACTATION_HISTORY_DAYS)).isoformat()
+    try:
+        for start in range(0, len(stale), 500):
+            _fit_chunk(conn, stale[start:start + 500], since)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Refit lactation curves of {len(stale)} animals")
+    return len(stale)
+
+def herd_forecast(conn, user_id, days=None, today=None):
+    """Daily farm forecast and per-animal totals of a user's milk for the next ``days`` days"""
+    days = days or Config.FORECAST_DEFAULT_DAYS
+    today = today or date.today()
+    refresh_fits(conn, user_id, today)
+    rows = [row for row in conn.execute(FITS_QUERY, (user_id,)).fetchall() if row['points']]
+    fits = {
+        'lactation_start': [_ordinal(row['lactation_start']) for row in rows],
+        'last_date': [_ordinal(row['last_date']) for row in rows],
+        **{key: [row[key] for row in rows] for key in ('a', 'b', 'c', 'recent_avg')},
+    }
+    litres = forecast_arrays(fits, today, days) if rows else np.zeros((0, days))
+    farm = litres.sum(axis=0)
+    totals = litres.sum(axis=1)
+
+    return {
+        'start_date': (today + timedelta(days=1)).isoformat(),
+        'days': days,
+        'farm_total_litres': round(float(farm.sum()), 1),
+        'farm_daily': [
+            {'date': (today + timedelta(days=offset + 1)).isoformat(), 'litres': round(float(value), 1)}
+            for offset, value in enumerate(farm)
+        ],
+        'animals': [
+            {
+                'animal_id': row['animal_id'],
+                'name': row['name'],
+                'model': 'wood' if row['a'] is not None else 'recent_average',
+                'days_in_milk': today.toordinal() - fits['lactation_start'][i] + 1,
+                'total_litres': round(float(totals[i]), 1),
+                'daily_avg': round(float(totals[i]) / days, 2),
+            }
+            for i, row in enumerate(rows)
+        ],
+    }
@@ -1,15 +1,103 @@
-from utils.db_utils import execute_write
 import logging
-import os
+import sqlite3
 from config.database import get_db_connection
+from utils.herd_queries import (
+    HEALTH_STATE_REFRESH, VACCINATION_STATE_REFRESH, MILK_STATE_REFRESH, rebuild_latest_state
+)
 
 logger = logging.getLogger(__name__)
 
-def run_migrations():
-    """Run all database migrations"""
-    try:
-        # Initialize users database
-        execute_write('users.db', '''
+def _refresh_state(template, animal_id):
+    """SQL statement recomputing one group of animal_latest_state columns"""
+    return (
+        'UPDATE animal_latest_state SET ' + template.format(animal_id=animal_id)
+        + f' WHERE animal_id = {animal_id};'
+    )
+
+def _ensure_state(animal_id):
+    """SQL statement creating an empty animal_latest_state row if missing"""
+    return f'INSERT OR IGNORE INTO animal_latest_state (animal_id) VALUES ({animal_id});'
+
+def _add_column(table, column, definition):
+    """Migration step adding a column unless an older schema already has it"""
+    def add(conn):
+        existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()}
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return add
+
+def _bump_versions(animal_id):
+    """SQL statements incrementing the data versions of an animal and its owner"""
+    return f'''
+                INSERT INTO animal_versions (animal_id, version)
+                SELECT id, 1 FROM animal WHERE id = {animal_id}
+                ON CONFLICT(animal_id) DO UPDATE SET version = version + 1;
+                INSERT INTO user_versions (user_id, version)
+                SELECT user_id, 1 FROM animal WHERE id = {animal_id}
+                ON CONFLICT(user_id) DO UPDATE SET version = version + 1;'''
+
+def _version_triggers(table, animal_id_column):
+    """Triggers bumping the data versions on every write to a table"""
+    return [
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+            AFTER {event} ON {table}
+            BEGIN{_bump_versions(f'{row}.{animal_id_column}')}
+            END
+            '''
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'))
+        # A deleted animal's own version row goes with it
+        if not (table == 'animal' and event == 'DELETE')
+    ]
+
+def _add_daily_milk(row):
+    """SQL folding a milk_production row into its owner's daily total"""
+    return f'''
+                INSERT INTO user_milk_daily (user_id, day, litres, record_count)
+                SELECT user_id, {row}.production_date, {row}.amount, 1 FROM animal WHERE id = {row}.animal_id
+                ON CONFLICT(user_id, day) DO UPDATE SET
+                    litres = litres + excluded.litres,
+                    record_count = record_count + 1;'''
+
+def _remove_daily_milk(row):
+    """SQL taking a milk_production row back out of its owner's daily total"""
+    return f'''
+                UPDATE user_milk_daily SET
+                    litres = litres - {row}.amount,
+                    record_count = record_count - 1
+                WHERE day = {row}.production_date
+                  AND user_id = (SELECT user_id FROM animal WHERE id = {row}.animal_id);'''
+
+def _bump_milk_version(animal_id):
+    """SQL incrementing the milk data version of an animal"""
+    return f'''
+                INSERT INTO animal_milk_versions (animal_id, version) VALUES ({animal_id}, 1)
+                ON CONFLICT(animal_id) DO UPDATE SET version = version + 1;'''
+
+def _rollup_table(name, bucket_type, metrics):
+    """CREATE TABLE statement for a per-animal rollup with count/sum/min/max per metric"""
+    metric_columns = ''.join(
+        f'{m}_count INTEGER NOT NULL DEFAULT 0, {m}_sum REAL, {m}_min REAL, {m}_max REAL, '
+        for m in metrics
+    )
+    return f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            animal_id INTEGER NOT NULL,
+            bucket {bucket_type} NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            {metric_columns}
+            PRIMARY KEY (animal_id, bucket)
+        ) WITHOUT ROWID
+    '''
+
+# Ordered schema migrations per database file. Each step is
+# (version, description, statements); a statement is either a SQL string
+# or a callable taking the connection. Steps are applied once, in order,
+# and recorded in the schema_version table of that database.
+MIGRATIONS = {
+    'users.db': [
+        (1, 'Create users table', [
+            '''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
@@ -18,10 +106,28 @@ def run_migrations():
                 password TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
-        
-        # Initialize animals database tables
-        execute_write('animals.db', '''
+            ''',
+        ]),
+        (2, 'Add server-side sessions table', [
+            '''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_activity REAL NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            ) WITHOUT ROWID
+            ''',
+            # Serves the bulk idle-session sweep
+            '''
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_activity
+            ON sessions (last_activity)
+            ''',
+        ]),
+    ],
+    'animals.db': [
+        (1, 'Create animal history tables', [
+            '''
             CREATE TABLE IF NOT EXISTS animal (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
@@ -39,9 +145,8 @@ def run_migrations():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
-        ''')
-
-        execute_write('animals.db', '''
+            ''',
+            '''
             CREATE TABLE IF NOT EXISTS health_metrics (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 animal_id INTEGER NOT NULL,
@@ -54,9 +159,8 @@ def run_migrations():
                 notes TEXT,
                 FOREIGN KEY (animal_id) REFERENCES animal (id)
             )
-        ''')
-
-        execute_write('animals.db', '''
+            ''',
+            '''
             CREATE TABLE IF NOT EXISTS vaccinations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 animal_id INTEGER NOT NULL,
@@ -67,9 +171,8 @@ def run_migrations():
                 notes TEXT,
                 FOREIGN KEY (animal_id) REFERENCES animal (id)
             )
-        ''')
-
-        execute_write('animals.db', '''
+            ''',
+            '''
             CREATE TABLE IF NOT EXISTS milk_production (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 animal_id INTEGER NOT NULL,
@@ -81,10 +184,411 @@ def run_migrations():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (animal_id) REFERENCES animal (id)
             )
-        ''')
-        
+            ''',
+        ]),
+        # CREATE INDEX only builds the new b-trees, so this is safe on a
+        # large existing animals.db; the tables themselves are not rewritten.
+        (2, 'Add hot-path indexes', [
+            'CREATE INDEX IF NOT EXISTS idx_animal_user ON animal (user_id)',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_health_metrics_animal_date
+            ON health_metrics (animal_id, record_date DESC)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_milk_production_animal_date
+            ON milk_production (animal_id, production_date)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_vaccinations_animal_due
+            ON vaccinations (animal_id, next_due_date)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_vaccinations_animal_given
+            ON vaccinations (animal_id, date_given DESC)
+            ''',
+            # Sampled statistics so the planner picks the new indexes
+            # without a full ANALYZE pass over every row
+            'PRAGMA analysis_limit=1000',
+            'ANALYZE',
+        ]),
+        # Denormalized latest-value cache kept current by triggers. Inserts
+        # (the common case) update the row in place; updates and deletes of
+        # the latest history row fall back to an indexed recompute.
+        (3, 'Add trigger-maintained animal_latest_state', [
+            '''
+            CREATE TABLE IF NOT EXISTS animal_latest_state (
+                animal_id INTEGER PRIMARY KEY,
+                last_health_id INTEGER,
+                last_temp REAL,
+                last_heart_rate INTEGER,
+                last_respiratory_rate INTEGER,
+                last_checkup TIMESTAMP,
+                last_vaccination_id INTEGER,
+                last_vaccine TEXT,
+                last_vaccine_date DATE,
+                next_vaccination DATE,
+                last_milk_date DATE,
+                last_milk_amount REAL,
+                FOREIGN KEY (animal_id) REFERENCES animal (id)
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_animal_insert_state
+            AFTER INSERT ON animal
+            BEGIN
+                INSERT OR IGNORE INTO animal_latest_state (animal_id) VALUES (NEW.id);
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_animal_delete_state
+            AFTER DELETE ON animal
+            BEGIN
+                DELETE FROM animal_latest_state WHERE animal_id = OLD.id;
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_health_metrics_insert_state
+            AFTER INSERT ON health_metrics
+            BEGIN
+                {_ensure_state('NEW.animal_id')}
+                UPDATE animal_latest_state SET
+                    last_health_id = NEW.id,
+                    last_temp = NEW.temperature,
+                    last_heart_rate = NEW.heart_rate,
+                    last_respiratory_rate = NEW.respiratory_rate,
+                    last_checkup = NEW.record_date
+                WHERE animal_id = NEW.animal_id
+                  AND (last_checkup IS NULL OR NEW.record_date >= last_checkup);
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_health_metrics_update_state
+            AFTER UPDATE ON health_metrics
+            BEGIN
+                {_refresh_state(HEALTH_STATE_REFRESH, 'OLD.animal_id')}
+                {_ensure_state('NEW.animal_id')}
+                {_refresh_state(HEALTH_STATE_REFRESH, 'NEW.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_health_metrics_delete_state
+            AFTER DELETE ON health_metrics
+            WHEN OLD.id = (SELECT last_health_id FROM animal_latest_state WHERE animal_id = OLD.animal_id)
+            BEGIN
+                {_refresh_state(HEALTH_STATE_REFRESH, 'OLD.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_vaccinations_insert_state
+            AFTER INSERT ON vaccinations
+            BEGIN
+                {_ensure_state('NEW.animal_id')}
+                UPDATE animal_latest_state SET
+                    last_vaccination_id = NEW.id,
+                    last_vaccine = NEW.vaccine_name,
+                    last_vaccine_date = NEW.date_given,
+                    next_vaccination = NEW.next_due_date
+                WHERE animal_id = NEW.animal_id
+                  AND (last_vaccine_date IS NULL OR NEW.date_given >= last_vaccine_date);
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_vaccinations_update_state
+            AFTER UPDATE ON vaccinations
+            BEGIN
+                {_refresh_state(VACCINATION_STATE_REFRESH, 'OLD.animal_id')}
+                {_ensure_state('NEW.animal_id')}
+                {_refresh_state(VACCINATION_STATE_REFRESH, 'NEW.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_vaccinations_delete_state
+            AFTER DELETE ON vaccinations
+            WHEN OLD.id = (SELECT last_vaccination_id FROM animal_latest_state WHERE animal_id = OLD.animal_id)
+            BEGIN
+                {_refresh_state(VACCINATION_STATE_REFRESH, 'OLD.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_insert_state
+            AFTER INSERT ON milk_production
+            BEGIN
+                {_ensure_state('NEW.animal_id')}
+                UPDATE animal_latest_state SET
+                    last_milk_amount = CASE
+                        WHEN last_milk_date = NEW.production_date THEN last_milk_amount + NEW.amount
+                        ELSE NEW.amount
+                    END,
+                    last_milk_date = NEW.production_date
+                WHERE animal_id = NEW.animal_id
+                  AND (last_milk_date IS NULL OR NEW.production_date >= last_milk_date);
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_update_state
+            AFTER UPDATE ON milk_production
+            BEGIN
+                {_refresh_state(MILK_STATE_REFRESH, 'OLD.animal_id')}
+                {_ensure_state('NEW.animal_id')}
+                {_refresh_state(MILK_STATE_REFRESH, 'NEW.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_delete_state
+            AFTER DELETE ON milk_production
+            WHEN OLD.production_date = (SELECT last_milk_date FROM animal_latest_state WHERE animal_id = OLD.animal_id)
+            BEGIN
+                {_refresh_state(MILK_STATE_REFRESH, 'OLD.animal_id')}
+            END
+            ''',
+            lambda conn: rebuild_latest_state(conn, commit=False),
+        ]),
+        # Rollups start empty; the scheduler's compaction job fills them from
+        # the raw tables, advancing its job_watermarks row as it goes.
+        (4, 'Add health and milk rollup tables', [
+            '''
+            CREATE TABLE IF NOT EXISTS job_watermarks (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            _rollup_table('health_metrics_hourly', 'TIMESTAMP',
+                          ('temperature', 'heart_rate', 'respiratory_rate')),
+            _rollup_table('health_metrics_daily', 'DATE',
+                          ('temperature', 'heart_rate', 'respiratory_rate')),
+            _rollup_table('milk_production_daily', 'DATE', ('amount',)),
+            _rollup_table('milk_production_monthly', 'DATE', ('amount',)),
+        ]),
+        (5, 'Add health_alerts table', [
+            '''
+            CREATE TABLE IF NOT EXISTS health_alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animal_id INTEGER NOT NULL,
+                health_metric_id INTEGER,
+                alert_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT,
+                value REAL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (animal_id) REFERENCES animal (id)
+            )
+            ''',
+            # Serves the per-(animal, alert type) dedupe lookup of the monitor
+            '''
+            CREATE INDEX IF NOT EXISTS idx_health_alerts_animal_type
+            ON health_alerts (animal_id, alert_type, timestamp DESC)
+            ''',
+        ]),
+        # Registration has always written image_filename; photo is the column
+        # the first schema declared, so existing photos are carried over
+        (6, 'Add image_filename to animal', [
+            _add_column('animal', 'image_filename', 'TEXT'),
+            'UPDATE animal SET image_filename = photo WHERE image_filename IS NULL AND photo IS NOT NULL',
+        ]),
+        # Change counters behind the ETags of the animal APIs. Every write to
+        # an animal or its history bumps the animal's and its owner's version;
+        # a missing row means version 0.
+        (7, 'Add animal and user data versions', [
+            '''
+            CREATE TABLE IF NOT EXISTS animal_versions (
+                animal_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS user_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            *_version_triggers('animal', 'id'),
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_animal_delete_version
+            AFTER DELETE ON animal
+            BEGIN
+                DELETE FROM animal_versions WHERE animal_id = OLD.id;
+                INSERT INTO user_versions (user_id, version) VALUES (OLD.user_id, 1)
+                ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+            END
+            ''',
+            *_version_triggers('health_metrics', 'animal_id'),
+            *_version_triggers('vaccinations', 'animal_id'),
+            *_version_triggers('milk_production', 'animal_id'),
+        ]),
+        # Running per-user daily milk totals behind the dashboard KPIs.
+        # Triggers keep them exact on every write, so the dashboard reads a
+        # handful of primary-key rows instead of scanning milk_production.
+        (8, 'Add trigger-maintained user_milk_daily', [
+            '''
+            CREATE TABLE IF NOT EXISTS user_milk_daily (
+                user_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                litres REAL NOT NULL DEFAULT 0,
+                record_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            ) WITHOUT ROWID
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_insert_daily
+            AFTER INSERT ON milk_production
+            BEGIN{_add_daily_milk('NEW')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_update_daily
+            AFTER UPDATE OF animal_id, production_date, amount ON milk_production
+            BEGIN{_remove_daily_milk('OLD')}{_add_daily_milk('NEW')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_delete_daily
+            AFTER DELETE ON milk_production
+            BEGIN{_remove_daily_milk('OLD')}
+            END
+            ''',
+            '''
+            INSERT OR REPLACE INTO user_milk_daily (user_id, day, litres, record_count)
+            SELECT a.user_id, m.production_date, SUM(m.amount), COUNT(*)
+            FROM milk_production m
+            JOIN animal a ON a.id = m.animal_id
+            GROUP BY a.user_id, m.production_date
+            ''',
+        ]),
+        # Fitted lactation curves of utils.lactation, tagged with the animal
+        # data version they were fitted at so only changed animals are refit
+        (9, 'Add lactation_fits', [
+            '''
+            CREATE TABLE IF NOT EXISTS lactation_fits (
+                animal_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL,
+                lactation_start DATE,
+                last_date DATE,
+                points INTEGER NOT NULL DEFAULT 0,
+                a REAL,
+                b REAL,
+                c REAL,
+                recent_avg REAL,
+                fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_animal_delete_lactation
+            AFTER DELETE ON animal
+            BEGIN
+                DELETE FROM lactation_fits WHERE animal_id = OLD.id;
+            END
+            ''',
+        ]),
+        # Without a watermark row the health monitor starts from id 0 and
+        # alerts on every historical reading; start it at the newest one
+        (10, 'Seed the health monitor watermark', [
+            '''
+            INSERT OR IGNORE INTO job_watermarks (name, last_id)
+            SELECT 'monitor:health_metrics', COALESCE(MAX(id), 0) FROM health_metrics
+            ''',
+        ]),
+        # Lactation fits only depend on milk records; the animal version also
+        # moves with health readings and edits, so they get a counter of
+        # their own. Existing fits are dropped and refit against it.
+        (11, 'Add milk data versions for lactation fits', [
+            '''
+            CREATE TABLE IF NOT EXISTS animal_milk_versions (
+                animal_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_insert_milk_version
+            AFTER INSERT ON milk_production
+            BEGIN{_bump_milk_version('NEW.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_update_milk_version
+            AFTER UPDATE ON milk_production
+            BEGIN{_bump_milk_version('OLD.animal_id')}{_bump_milk_version('NEW.animal_id')}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_milk_production_delete_milk_version
+            AFTER DELETE ON milk_production
+            BEGIN{_bump_milk_version('OLD.animal_id')}
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS trg_animal_delete_milk_version
+            AFTER DELETE ON animal
+            BEGIN
+                DELETE FROM animal_milk_versions WHERE animal_id = OLD.id;
+            END
+            ''',
+            'DELETE FROM lactation_fits',
+        ]),
+    ],
+}
+
+def _ensure_version_table(conn):
+    """Create the schema_version bookkeeping table if it is missing"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn):
+    """Return the highest migration version applied to a database"""
+    row = conn.execute('SELECT MAX(version) AS version FROM schema_version').fetchone()
+    return row['version'] or 0
+
+def migrate_database(db_name, migrations=None):
+    """Apply pending migrations to one database; returns the versions applied"""
+    migrations = MIGRATIONS[db_name] if migrations is None else migrations
+    conn = get_db_connection(db_name)
+    _ensure_version_table(conn)
+    current = get_schema_version(conn)
+    applied = []
+
+    for version, description, statements in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+        try:
+            # Take the write lock before re-reading the version, so a worker
+            # migrating at the same time cannot apply this version twice
+            conn.execute('BEGIN IMMEDIATE')
+            current = get_schema_version(conn)
+            if version <= current:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Migration {db_name} v{version} ({description}) failed: {str(e)}")
+            raise
+        logger.info(f"Applied migration {db_name} v{version}: {description}")
+        applied.append(version)
+
+    return applied
+
+def run_migrations(db_names=None):
+    """Run all database migrations"""
+    try:
+        for db_name in db_names or MIGRATIONS:
+            migrate_database(db_name)
         logger.info("Database migrations completed successfully")
-        
+
     except Exception as e:
         logger.error(f"Error running migrations: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,165 @@
+import logging
+import math
+from datetime import datetime
+from config.config import Config
+from utils.db_utils import execute_query, execute_many, transaction
+
+logger = logging.getLogger(__name__)
+
+MILK_SESSIONS = ('morning', 'evening')
+
+INSERT_MILK_QUERY = '''
+    INSERT INTO milk_production (
+        animal_id, production_date, amount, time_of_day, fat_content, notes
+    ) VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# animal_latest_state.last_milk_amount is maintained incrementally by the
+# milk_production insert trigger, so copying it is a primary-key lookup
+# rather than a re-sum of the day's history.
+SYNC_DAILY_TOTAL_QUERY = '''
+    UPDATE animal
+    SET milk_production = COALESCE(
+        (SELECT last_milk_amount FROM animal_latest_state WHERE animal_id = animal.id),
+        milk_production
+    )
+    WHERE id = ?
+'''
+
+def _expand_entry(entry, default_animal_id):
+    """Yield session records from one entry.
+
+    An entry is either a single session (``time_of_day`` + ``amount``) or a
+    whole day with ``morning`` and/or ``evening`` amounts.
+    """
+    animal_id = entry.get('animal_id', default_animal_id)
+    sessions = [session for session in MILK_SESSIONS if entry.get(session) is not None]
+    if sessions:
+        for session in sessions:
+            yield {
+                'animal_id': animal_id,
+                'production_date': entry.get('production_date'),
+                'time_of_day': session,
+                'amount': entry.get(session),
+                'fat_content': entry.get(f'{session}_fat', entry.get('fat_content')),
+                'notes': entry.get('notes'),
+            }
+    else:
+        yield {
+            'animal_id': animal_id,
+            'production_date': entry.get('production_date'),
+            'time_of_day': entry.get('time_of_day'),
+            'amount': entry.get('amount'),
+            'fat_content': entry.get('fat_content'),
+            'notes': entry.get('notes'),
+        }
+
+def _validate_record(record):
+    """Return a normalized parameter tuple for one session record or raise ValueError"""
+    try:
+        animal_id = int(record['animal_id'])
+    except (TypeError, ValueError):
+        raise ValueError('animal_id is required')
+
+    try:
+        production_date = datetime.strptime(
+            str(record['production_date']), '%Y-%m-%d'
+        ).strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError('production_date must be a date in YYYY-MM-DD format')
+
+    if record['time_of_day'] not in MILK_SESSIONS:
+        raise ValueError('time_of_day must be morning or evening')
+
+    try:
+        amount = float(record['amount'])
+    except (TypeError, ValueError):
+        raise ValueError('amount must be numeric')
+    # NaN compares false against both bounds below
+    if not math.isfinite(amount):
+        raise ValueError('amount must be numeric')
+    if amount < 0 or amount > 100:  # Max 100 liters per session
+        raise ValueError('amount must be between 0 and 100 liters')
+
+    fat_content = record.get('fat_content')
+    if fat_content is not None and fat_content != '':
+        try:
+            fat_content = float(fat_content)
+        except (TypeError, ValueError):
+            raise ValueError('fat_content must be numeric')
+        if not math.isfinite(fat_content):
+            raise ValueError('fat_content must be numeric')
+        if fat_content < 0 or fat_content > 15:
+            raise ValueError('fat_content must be between 0 and 15 percent')
+    else:
+        fat_content = None
+
+    return (animal_id, production_date, amount, record['time_of_day'],
+            fat_content, record.get('notes') or None)
+
+def normalize_milk_payload(payload, default_animal_id=None):
+    """Validate a milk ingestion payload.
+
+    Accepts a single entry, a list of entries or ``{"records": [...]}``.
+    Returns ``(rows, errors)`` where rows are insert parameter tuples and
+    errors is a list of ``{'index', 'error'}`` dicts.
+    """
+    if isinstance(payload, dict) and 'records' in payload:
+        payload = payload['records']
+    entries = payload if isinstance(payload, list) else [payload]
+
+    rows = []
+    errors = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({'index': index, 'error': 'Each record must be an object'})
+            continue
+        for record in _expand_entry(entry, default_animal_id):
+            try:
+                row = _validate_record(record)
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            key = row[:2] + (row[3],)
+            if key in seen:
+                errors.append({'index': index, 'error': 'Duplicate animal, date and session in batch'})
+                continue
+            seen.add(key)
+            rows.append(row)
+
+    if len(rows) > Config.MILK_BATCH_MAX:
+        errors.append({'index': None, 'error': f'At most {Config.MILK_BATCH_MAX} records per request'})
+    return rows, errors
+
+def ingest_milk_records(rows, user_id=None):
+    """Insert validated milk rows in one transaction and refresh daily totals.
+
+    When ``user_id`` is given every animal must belong to that user;
+    returns None if any does not. Otherwise returns a summary dict.
+    """
+    animal_ids = sorted({row[0] for row in rows})
+    if not animal_ids:
+        return {'inserted': 0, 'animals': 0}
+
+    if user_id is not None:
+        owned = 0
+        # Chunked to stay below SQLite's bound-parameter limit
+        for start in range(0, len(animal_ids), 500):
+            chunk = animal_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            owned += len(execute_query(
+                'animals.db',
+                f'SELECT id FROM animal WHERE user_id = ? AND id IN ({placeholders})',
+                (user_id, *chunk)
+            ))
+        if owned != len(animal_ids):
+            return None
+
+    with transaction('animals.db'):
+        execute_many('animals.db', INSERT_MILK_QUERY, rows, commit=False)
+        execute_many('animals.db', SYNC_DAILY_TOTAL_QUERY,
+                     [(animal_id,) for animal_id in animal_ids], commit=False)
+
+    logger.info(f"Ingested {len(rows)} milk records for {len(animal_ids)} animals")
+    return {'inserted': len(rows), 'animals': len(animal_ids)}
@@ -0,0 +1,228 @@
+from config.config import Config
+from datetime import date, datetime, timedelta
+from utils.db_utils import get_db_connection
+from utils.socket_handler import send_alert
+from utils.watermarks import get_watermark, set_watermark
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MILK_WATERMARK = 'monitor:milk_production'
+MILK_DROP_ALERT = 'milk_drop'
+
+# Daily yield and milking sessions per (animal, day) over a date window
+DAILY_MILK_QUERY = '''
+    SELECT animal_id, production_date, SUM(amount) AS litres,
+           COUNT(DISTINCT time_of_day) AS sessions
+    FROM milk_production
+    WHERE animal_id IN ({placeholders}) AND production_date BETWEEN ? AND ?
+    GROUP BY animal_id, production_date
+'''
+
+INSERT_ALERT_QUERY = '''
+    INSERT INTO health_alerts (animal_id, alert_type, status, message, value, timestamp)
+    VALUES (?, ?, 'warning', ?, ?, ?)
+'''
+
+class MilkTrends:
+    """Recent and baseline milk yield of a set of animals, as parallel arrays.
+
+    ``recent`` is the mean daily yield over the last MILK_RECENT_DAYS days,
+    ``baseline`` the mean over the MILK_BASELINE_DAYS days before them, and
+    ``drop`` how far recent fell below baseline in percent. Animals without
+    enough recorded days have NaN means and are never flagged.
+    """
+
+    def __init__(self, animal_ids, recent, baseline, drop, flagged):
+        self.animal_ids = animal_ids
+        self.recent = recent
+        self.baseline = baseline
+        self.drop = drop
+        self._flagged = flagged
+
+    def flagged(self):
+        """Indices of animals whose yield dropped beyond the warning percentage"""
+        return np.flatnonzero(self._flagged)
+
+    def trend(self, index):
+        """JSON-ready trend of one animal"""
+        def value(array):
+            return None if np.isnan(array[index]) else round(float(array[index]), 2)
+        return {
+            'recent_avg': value(self.recent),
+            'baseline_avg': value(self.baseline),
+            'drop_percent': value(self.drop),
+            'dropping': bool(self._flagged[index]),
+        }
+
+def milk_drop_arrays(litres, sessions, recent_days=None, warning_percent=None,
+                     min_recent_days=None, min_baseline_days=None):
+    """Compare each animal's recent mean daily yield with its baseline in one pass.
+
+    ``litres`` and ``sessions`` are (animals, days) matrices ending on the
+    evaluation day, NaN/0 where nothing was recorded. Days without records
+    are left out of the means rather than counted as zero. The last day only
+    counts once both milkings are in, so a morning-only total does not look
+    like a drop. Returns (recent mean, baseline mean, drop %, flagged).
+    """
+    recent_days = recent_days or Config.MILK_RECENT_DAYS
+    warning_percent = Config.MILK_PRODUCTION_WARNING if warning_percent is None else warning_percent
+    min_recent_days = min_recent_days or Config.MILK_RECENT_MIN_DAYS
+    min_baseline_days = min_baseline_days or Config.MILK_BASELINE_MIN_DAYS
+
+    litres = np.array(litres, dtype=np.float64)
+    if litres.shape[1]:
+        litres[np.asarray(sessions)[:, -1] < 2, -1] = np.nan
+    recent = litres[:, -recent_days:]
+    baseline = litres[:, :-recent_days]
+    recent_count = np.count_nonzero(~np.isnan(recent), axis=1)
+    baseline_count = np.count_nonzero(~np.isnan(baseline), axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        recent_mean = np.nansum(recent, axis=1) / recent_count
+        baseline_mean = np.nansum(baseline, axis=1) / baseline_count
+        drop = 100.0 * (1.0 - recent_mean / baseline_mean)
+        drop[~(baseline_mean > 0)] = np.nan
+        flagged = (
+            (recent_count >= min_recent_days)
+            & (baseline_count >= min_baseline_days)
+            & (drop >= warning_percent)
+        )
+    return recent_mean, baseline_mean, drop, flagged
+
+def fetch_daily_milk(conn, animal_ids, end_date, days):
+    """(litres, sessions) matrices of ``animal_ids`` over the ``days`` days ending on ``end_date``"""
+    litres = np.full((len(animal_ids), days), np.nan)
+    sessions = np.zeros((len(animal_ids), days), dtype=np.int8)
+    row_of = {animal_id: i for i, animal_id in enumerate(animal_ids)}
+    start_date = end_date - timedelta(days=days - 1)
+
+    # Chunked to stay below SQLite's bound-parameter limit
+    for start in range(0, len(animal_ids), 500):
+        chunk = animal_ids[start:start + 500]
+        rows = conn.execute(
+            DAILY_MILK_QUERY.format(placeholders=', '.join('?' for _ in chunk)),
+            (*chunk, start_date.isoformat(), end_date.isoformat())
+        ).fetchall()
+        if not rows:
+            continue
+        index = np.fromiter((row_of[row['animal_id']] for row in rows), dtype=np.intp, count=len(rows))
+        column = np.fromiter(
+            ((date.fromisoformat(row['production_date']) - start_date).days for row in rows),
+            dtype=np.intp, count=len(rows)
+        )
+        litres[index, column] = [row['litres'] for row in rows]
+        sessions[index, column] = [row['sessions'] for row in rows]
+    return litres, sessions
+
+def assess_milk_yield(conn, animal_ids, end_date=None):
+    """MilkTrends of ``animal_ids`` as of ``end_date`` (today by default)"""
+    animal_ids = list(animal_ids)
+    end_date = end_date or date.today()
+    days = Config.MILK_RECENT_DAYS + Config.MILK_BASELINE_DAYS
+    litres, sessions = fetch_daily_milk(conn, animal_ids, end_date, days)
+    return MilkTrends(animal_ids, *milk_drop_arrays(litres, sessions))
+
+def _alerted_since(conn, animal_ids, since):
+    """Animals that already got a milk drop alert since a timestamp"""
+    alerted = set()
+    for start in range(0, len(animal_ids), 500):
+        chunk = animal_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows = conn.execute(f'''
+            SELECT DISTINCT animal_id FROM health_alerts
+            WHERE animal_id IN ({placeholders}) AND alert_type = ? AND timestamp >= ?
+        ''', (*chunk, MILK_DROP_ALERT, since)).fetchall()
+        alerted.update(row['animal_id'] for row in rows)
+    return alerted
+
+def _process_batch(conn, batch_size, end_date):
+    """Re-assess the animals with milk records past the watermark.
+
+    Reads and advances the watermark and records the alerts in one write
+    transaction, like the health monitor. Returns (records processed,
+    animals assessed, alerts to send), or None once caught up.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        watermark = get_watermark(conn, MILK_WATERMARK)
+        head = conn.execute('SELECT MAX(id) AS id FROM milk_production').fetchone()['id'] or 0
+        if head <= watermark:
+            conn.rollback()
+            return None
+        upper = min(watermark + batch_size, head)
+        new = conn.execute('''
+            SELECT m.animal_id, a.name, COUNT(*) AS records
+            FROM milk_production m
+            JOIN animal a ON a.id = m.animal_id
+            WHERE m.id > ? AND m.id <= ?
+            GROUP BY m.animal_id
+        ''', (watermark, upper)).fetchall()
+
+        alerts = []
+        if new:
+            trends = assess_milk_yield(conn, [row['animal_id'] for row in new], end_date)
+            now = datetime.utcnow()
+            timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+            flagged = trends.flagged()
+            alerted = _alerted_since(
+                conn, [trends.animal_ids[i] for i in flagged],
+                (now - timedelta(hours=Config.MILK_DROP_ALERT_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+            )
+            for index in flagged:
+                animal_id = trends.animal_ids[index]
+                if animal_id in alerted:
+                    continue
+                trend = trends.trend(index)
+                alerts.append({
+                    'animal_id': animal_id,
+                    'animal_name': new[index]['name'],
+                    'type': MILK_DROP_ALERT,
+                    'status': 'warning',
+                    'message': f"Milk yield down {trend['drop_percent']:g}% "
+                               f"({trend['recent_avg']:g} L/day vs {trend['baseline_avg']:g} L/day baseline)",
+                    'value': trend['drop_percent'],
+                })
+            conn.executemany(INSERT_ALERT_QUERY, [
+                (alert['animal_id'], alert['type'], alert['message'], alert['value'], timestamp)
+                for alert in alerts
+            ])
+        set_watermark(conn, MILK_WATERMARK, upper)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return sum(row['records'] for row in new), len(new), alerts
+
+def check_milk_yield(batch_size=None, end_date=None):
+    """Flag milk yield drops of animals with new milk records.
+
+    Only animals with records above the persisted watermark are assessed,
+    so a run after a morning or evening milking costs time proportional to
+    the animals milked, not to the herd or its history.
+    """
+    batch_size = batch_size or Config.MONITOR_BATCH_SIZE
+    summary = {'processed': 0, 'assessed': 0, 'alerts': 0}
+    conn = get_db_connection('animals.db')
+    try:
+        while True:
+            result = _process_batch(conn, batch_size, end_date)
+            if result is None:
+                break
+            processed, assessed, alerts = result
+            summary['processed'] += processed
+            summary['assessed'] += assessed
+            summary['alerts'] += len(alerts)
+
+            # Alerts are only sent once they are recorded
+            for alert in alerts:
+                send_alert(alert['animal_id'], {
+                    key: value for key, value in alert.items() if key != 'animal_id'
+                })
+
+        if summary['processed']:
+            logger.info(f"Milk yield monitor processed {summary}")
+    finally:
+        conn.close()
+    return summary
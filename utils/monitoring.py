@@ -2,8 +2,10 @@ from utils.db_utils import get_db_connection
 from utils.event_bus import event_bus
 from utils.socket_handler import send_alert, broadcast_emergency
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from config.config import Config
+from utils.health_rules import classify_herd, format_alert
+from utils.watermarks import get_watermark, set_watermark
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -17,113 +19,159 @@ def get_safe_db():
     finally:
         conn.close()
 
-def check_health_metrics():
-    """Monitor animal health metrics and emit alerts if needed"""
+MONITOR_WATERMARK = 'monitor:health_metrics'
+
+# Alert status per classifier severity and its rank for deduplication
+ALERT_STATUS = {'critical': 'urgent', 'moderate': 'warning'}
+STATUS_RANK = {'warning': 1, 'urgent': 2}
+
+NEW_READINGS_QUERY = """
+    SELECT hm.id, hm.animal_id, a.name, a.type, a.weight,
+           COALESCE(s.last_milk_amount, a.milk_production) AS milk_production,
+           hm.temperature AS last_temp,
+           hm.heart_rate AS last_heart_rate,
+           hm.respiratory_rate AS last_respiratory_rate
+    FROM health_metrics hm
+    JOIN animal a ON a.id = hm.animal_id
+    LEFT JOIN animal_latest_state s ON s.animal_id = a.id
+    WHERE hm.id > ? AND hm.id <= ?
+    ORDER BY hm.id
+"""
+
+INSERT_ALERT_QUERY = """
+    INSERT INTO health_alerts
+    (animal_id, health_metric_id, alert_type, status, message, value, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _recent_alerts(conn, animal_ids, since):
+    """Highest alert rank per (animal, alert type) recorded since a timestamp"""
+    recent = {}
+    animal_ids = sorted(animal_ids)
+    # Chunked to stay below SQLite's bound-parameter limit
+    for start in range(0, len(animal_ids), 500):
+        chunk = animal_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows = conn.execute(f"""
+            SELECT animal_id, alert_type,
+                   MAX(CASE status WHEN 'urgent' THEN 2 ELSE 1 END) AS rank
+            FROM health_alerts
+            WHERE animal_id IN ({placeholders}) AND timestamp >= ?
+            GROUP BY animal_id, alert_type
+        """, (*chunk, since)).fetchall()
+        for row in rows:
+            recent[(row['animal_id'], row['alert_type'])] = row['rank']
+    return recent
+
+def _process_batch(conn, batch_size, dedupe_window):
+    """Alert on one batch of readings past the watermark.
+
+    Runs in a single write transaction: the watermark is read and advanced
+    and all new alerts are inserted atomically, so overlapping runs never
+    see the same rows. Returns (rows processed, alerts to send, suppressed),
+    or None once the watermark has caught up.
+    """
+    conn.execute('BEGIN IMMEDIATE')
     try:
-        with get_safe_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT hm.animal_id, a.name, hm.temperature, hm.heart_rate, 
-                       hm.activity_level, hm.last_checkup, hm.respiratory_rate
-                FROM health_metrics hm
-                JOIN animals a ON hm.animal_id = a.id 
-                WHERE datetime(hm.last_updated) >= datetime('now', '-1 hour')
-            """)
-            recent_metrics = cursor.fetchall()
-        
-        for metric in recent_metrics:
-            alerts = []
-            
-            # Check temperature
-            if metric['temperature'] > Config.TEMPERATURE_HIGH:
-                alerts.append({
-                    'type': 'temperature',
-                    'status': 'urgent',
-                    'message': f'High temperature: {metric["temperature"]} deg C',
-                    'value': metric['temperature']
-                })
-            elif metric['temperature'] < Config.TEMPERATURE_LOW:
-                alerts.append({
-                    'type': 'temperature',
-                    'status': 'warning',
-                    'message': f'Low temperature: {metric["temperature"]} deg C',
-                    'value': metric['temperature']
-                })
-            
-            # Check heart rate
-            if metric['heart_rate'] > Config.HEART_RATE_CRITICAL:
-                alerts.append({
-                    'type': 'heart_rate',
-                    'status': 'urgent',
-                    'message': f'High heart rate: {metric["heart_rate"]} BPM',
-                    'value': metric['heart_rate']
-                })
-            elif metric['heart_rate'] > Config.HEART_RATE_WARNING:
-                alerts.append({
-                    'type': 'heart_rate',
-                    'status': 'warning',
-                    'message': f'Elevated heart rate: {metric["heart_rate"]} BPM',
-                    'value': metric['heart_rate']
-                })
-            
-            # Check activity level
-            if metric['activity_level'] < Config.ACTIVITY_LOW:
+        watermark = get_watermark(conn, MONITOR_WATERMARK)
+        head = conn.execute('SELECT MAX(id) AS id FROM health_metrics').fetchone()['id'] or 0
+        if head <= watermark:
+            conn.rollback()
+            return None
+        upper = min(watermark + batch_size, head)
+        readings = conn.execute(NEW_READINGS_QUERY, (watermark, upper)).fetchall()
+
+        health = classify_herd(readings)
+        flagged = health.flagged()
+        now = datetime.utcnow()
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+        recent = _recent_alerts(
+            conn, {readings[i]['animal_id'] for i in flagged},
+            (now - dedupe_window).strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+        # A repeat (animal, type) alert inside the window is suppressed
+        # unless it escalates from warning to urgent
+        alerts = []
+        suppressed = 0
+        for index in flagged:
+            reading = readings[index]
+            for finding in health.alerts(index):
+                status = ALERT_STATUS[finding['severity']]
+                key = (reading['animal_id'], finding['type'])
+                if recent.get(key, 0) >= STATUS_RANK[status]:
+                    suppressed += 1
+                    continue
+                recent[key] = STATUS_RANK[status]
                 alerts.append({
-                    'type': 'activity',
-                    'status': 'warning',
-                    'message': f'Low activity level: {metric["activity_level"]}%',
-                    'value': metric['activity_level']
+                    'animal_id': reading['animal_id'],
+                    'animal_name': reading['name'],
+                    'health_metric_id': reading['id'],
+                    'type': finding['type'],
+                    'status': status,
+                    'message': format_alert(finding),
+                    'value': finding['value'],
                 })
 
-            # Send alerts
-            if alerts:
-                # Send individual alerts
-                for alert in alerts:
-                    if alert['status'] == 'urgent':
-                        broadcast_emergency({
-                            'animal_id': metric['animal_id'],
-                            'animal_name': metric['name'],
-                            **alert
-                        })
-                    else:
-                        send_alert(metric['animal_id'], {
-                            'animal_name': metric['name'],
-                            **alert
-                        })
-                
-                # Record alerts in database
-                with get_safe_db() as conn:
-                    cursor = conn.cursor()
-                    for alert in alerts:
-                        cursor.execute("""
-                            INSERT INTO health_alerts 
-                            (animal_id, alert_type, status, message, value, timestamp)
-                            VALUES (?, ?, ?, ?, ?, datetime('now'))
-                        """, (
-                            metric['animal_id'],
-                            alert['type'],
-                            alert['status'],
-                            alert['message'],
-                            alert['value']
-                        ))
-                    conn.commit()
-
-            # Check last checkup
-            if metric['last_checkup']:
-                last_checkup = datetime.strptime(metric['last_checkup'], '%Y-%m-%d')
-                days_since = (datetime.now() - last_checkup).days
-                
-                if days_since > Config.CHECKUP_REMINDER_DAYS:
-                    send_alert(metric['animal_id'], {
-                        'type': 'checkup',
-                        'status': 'reminder',
-                        'animal_name': metric['name'],
-                        'message': f'Afternoon check reminder: last inspection was {days_since} days ago',
-                        'last_checkup': metric['last_checkup']
+        conn.executemany(INSERT_ALERT_QUERY, [
+            (alert['animal_id'], alert['health_metric_id'], alert['type'], alert['status'],
+             alert['message'], alert['value'], timestamp)
+            for alert in alerts
+        ])
+        set_watermark(conn, MONITOR_WATERMARK, upper)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(readings), alerts, suppressed
+
+def check_health_metrics(batch_size=None, dedupe_minutes=None):
+    """Monitor new health metrics and emit alerts if needed.
+
+    Only readings with ids above the persisted watermark are examined, so
+    each run costs time proportional to the data added since the last one.
+    """
+    batch_size = batch_size or Config.MONITOR_BATCH_SIZE
+    dedupe_window = timedelta(minutes=dedupe_minutes or Config.ALERT_DEDUPE_MINUTES)
+    summary = {'processed': 0, 'alerts': 0, 'suppressed': 0}
+    try:
+        while True:
+            with get_safe_db() as conn:
+                result = _process_batch(conn, batch_size, dedupe_window)
+            if result is None:
+                break
+            processed, alerts, suppressed = result
+            summary['processed'] += processed
+            summary['alerts'] += len(alerts)
+            summary['suppressed'] += suppressed
+
+            # Alerts are only sent once they are recorded. Clients get them
+            # through the alert batcher, so the bus event stays server-side
+            for alert in alerts:
+                event_bus.emit('health_alert', alert, socket=False)
+                payload = {key: value for key, value in alert.items() if key != 'health_metric_id'}
+                if alert['status'] == 'urgent':
+                    broadcast_emergency(payload)
+                else:
+                    send_alert(alert['animal_id'], {
+                        key: value for key, value in payload.items() if key != 'animal_id'
                     })
 
+        if summary['processed']:
+            logger.info(f"Health monitor processed {summary}")
+
     except Exception as e:
         logger.error(f"Error monitoring health metrics: {str(e)}")
+    return summary
+
+# Alert logging runs off the emitting thread, in order per animal
+event_bus.configure_async(
+    'health_alert',
+    maxsize=Config.EVENT_BUS_QUEUE_SIZE,
+    workers=Config.EVENT_BUS_WORKERS,
+    overflow=Config.EVENT_BUS_OVERFLOW,
+    key='animal_id'
+)
 
 @event_bus.subscribe('health_alert')
 def log_health_alert(data):
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from config.config import Config
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Ear-tag sheet layout: A4 portrait at SHEET_DPI, SHEET_COLUMNS x SHEET_ROWS tags per page
+SHEET_DPI = 150
+SHEET_SIZE = (1240, 1754)
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+SHEET_MARGIN = 40
+
+_memory_cache = OrderedDict()  # cache key: PNG bytes
+_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+def qr_payload(base_url, animal_id):
+    """URL encoded in an animal's QR code"""
+    return f"{base_url}/api/animals/{animal_id}/card"
+
+def qr_cache_key(base_url, animal_id):
+    """Stable key, also used as the ETag, of one animal's QR image"""
+    return hashlib.sha1(f"{base_url}|{animal_id}".encode()).hexdigest()
+
+def render_qr_png(payload):
+    """Render a QR code as PNG bytes"""
+    import qrcode
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffered = io.BytesIO()
+    img.save(buffered)
+    return buffered.getvalue()
+
+def _disk_path(key):
+    return os.path.join(Config.QR_CACHE_DIR, f"{key}.png")
+
+def _remember(key, png):
+    with _cache_lock:
+        _memory_cache[key] = png
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > Config.QR_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def _store(key, png):
+    """Keep a rendered PNG in memory and on disk"""
+    _remember(key, png)
+    try:
+        os.makedirs(Config.QR_CACHE_DIR, exist_ok=True)
+        path = _disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(png)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write QR cache file for {key}: {str(e)}")
+
+def cached_qr_png(key):
+    """PNG bytes from the memory or disk cache, or None"""
+    with _cache_lock:
+        png = _memory_cache.get(key)
+        if png is not None:
+            _memory_cache.move_to_end(key)
+            return png
+    try:
+        with open(_disk_path(key), 'rb') as f:
+            png = f.read()
+    except OSError:
+        return None
+    _remember(key, png)
+    return png
+
+def get_qr_png(base_url, animal_id):
+    """Return (cache key, PNG bytes) of an animal's QR code, rendering it only once"""
+    key = qr_cache_key(base_url, animal_id)
+    png = cached_qr_png(key)
+    if png is None:
+        png = render_qr_png(qr_payload(base_url, animal_id))
+        _store(key, png)
+    return key, png
+
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default()
+
+def render_sheet_page(tags):
+    """Lay out one page of ear tags; returns (page image, {key: PNG} of QR codes rendered here).
+
+    ``tags`` is a list of (cache key, label lines, payload, cached PNG or None).
+    Runs in the sheet process pool, so it only takes and returns picklable values.
+    """
+    from PIL import Image, ImageDraw
+    page = Image.new('1', SHEET_SIZE, 1)
+    draw = ImageDraw.Draw(page)
+    title_font, text_font = _font(28), _font(22)
+    cell_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // SHEET_COLUMNS
+    cell_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // SHEET_ROWS
+    qr_size = min(cell_width, cell_height) - 120
+    rendered = {}
+
+    for index, (key, lines, payload, png) in enumerate(tags):
+        if png is None:
+            png = render_qr_png(payload)
+            rendered[key] = png
+        left = SHEET_MARGIN + (index % SHEET_COLUMNS) * cell_width
+        top = SHEET_MARGIN + (index // SHEET_COLUMNS) * cell_height
+        draw.rectangle((left + 5, top + 5, left + cell_width - 5, top + cell_height - 5), outline=0, width=2)
+        qr = Image.open(io.BytesIO(png)).convert('1').resize((qr_size, qr_size), Image.NEAREST)
+        page.paste(qr, (left + (cell_width - qr_size) // 2, top + 15))
+        y = top + 25 + qr_size
+        for line_index, line in enumerate(lines):
+            font = title_font if line_index == 0 else text_font
+            width = draw.textlength(line, font=font)
+            draw.text((left + (cell_width - width) / 2, y), line, fill=0, font=font)
+            y += 32 if line_index == 0 else 26
+    return page, rendered
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.QR_SHEET_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+def shutdown_sheet_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+def render_tag_sheet(base_url, animals, workers=None):
+    """Render printable ear tags for ``animals`` (dicts with id, name, type, breed) as a PDF.
+
+    Pages are laid out in parallel on a process pool. QR codes already in
+    the cache are reused and the ones rendered for the sheet are cached.
+    """
+    workers = Config.QR_SHEET_WORKERS if workers is None else workers
+    tags = []
+    for animal in animals:
+        key = qr_cache_key(base_url, animal['id'])
+        lines = [
+            str(animal['name'])[:24],
+            f"Tag #{animal['id']}",
+            f"{animal['type']} - {animal['breed']}"[:30],
+        ]
+        tags.append((key, lines, qr_payload(base_url, animal['id']), cached_qr_png(key)))
+
+    per_page = SHEET_COLUMNS * SHEET_ROWS
+    chunks = [tags[i:i + per_page] for i in range(0, len(tags), per_page)]
+    if workers and len(chunks) > 1:
+        results = list(_executor().map(render_sheet_page, chunks))
+    else:
+        results = [render_sheet_page(chunk) for chunk in chunks]
+
+    pages = []
+    for page, rendered in results:
+        pages.append(page)
+        for key, png in rendered.items():
+            _store(key, png)
+
+    buffered = io.BytesIO()
+    pages[0].save(buffered, 'PDF', save_all=True, append_images=pages[1:], resolution=SHEET_DPI)
+    return buffered.getvalue()
@@ -1,54 +1,253 @@
 from functools import wraps
 from flask import request, jsonify
-from datetime import datetime, timedelta
+from config.config import Config
+import logging
+import os
+import sqlite3
 import threading
 import time
 
+logger = logging.getLogger(__name__)
+
+SQLITE_STORAGE_PREFIX = 'sqlite:///'
+
+def _window_state(index, current, previous, window_index):
+    """Roll a (window index, current count, previous count) entry forward to ``window_index``"""
+    if index == window_index:
+        return current, previous
+    if index == window_index - 1:
+        return 0, current
+    return 0, 0
+
+def _estimate(current, previous, now, window):
+    """Sliding-window estimate: the previous window's count weighted by its remaining overlap"""
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+class MemoryBackend:
+    """Per-process sliding-window counters in lock-striped shards.
+
+    Each key holds three numbers (window index, current and previous window
+    counts) no matter how many requests it makes, and only the shard a key
+    hashes to is locked while it is checked.
+    """
+
+    def __init__(self, shards=16, cleanup_interval=60):
+        self._shards = [({}, threading.Lock()) for _ in range(max(shards, 1))]
+        self.cleanup_interval = cleanup_interval
+        self._cleanup_thread = threading.Thread(target=self._cleanup_expired, daemon=True)
+        self._cleanup_thread.start()
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def hit(self, key, limit, window, now):
+        """Count a request for ``key`` unless it is over ``limit``; returns (allowed, estimate)"""
+        window_index = int(now // window)
+        counters, lock = self._shard(key)
+        with lock:
+            entry = counters.get(key)
+            if entry is None:
+                current, previous = 0, 0
+            else:
+                current, previous = _window_state(entry[1], entry[2], entry[3], window_index)
+            estimate = _estimate(current, previous, now, window)
+            if estimate >= limit:
+                return False, estimate
+            counters[key] = [window, window_index, current + 1, previous]
+            return True, estimate + 1
+
+    def __len__(self):
+        return sum(len(counters) for counters, _ in self._shards)
+
+    def _cleanup_expired(self):
+        while True:
+            time.sleep(self.cleanup_interval)
+            self.cleanup()
+
+    def cleanup(self, now=None):
+        """Drop keys whose previous window no longer overlaps the current one"""
+        now = now or time.time()
+        removed = 0
+        for counters, lock in self._shards:
+            with lock:
+                expired = [key for key, (window, index, _, _) in counters.items()
+                           if (index + 2) * window <= now]
+                for key in expired:
+                    del counters[key]
+            removed += len(expired)
+        return removed
+
+class SQLiteBackend:
+    """Sliding-window counters in a SQLite table shared by every worker process.
+
+    A check is one short BEGIN IMMEDIATE transaction on a WAL database, so
+    gunicorn/uwsgi workers on the same host enforce one limit between them.
+    """
+
+    def __init__(self, url='sqlite:///data/rate_limit.db', prune_every=1000):
+        self.db_path = url[len(SQLITE_STORAGE_PREFIX):] if url.startswith(SQLITE_STORAGE_PREFIX) else url
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._hits = 0
+        self._ensure_table()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_table(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_index INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def hit(self, key, limit, window, now):
+        """Count a request for ``key`` unless it is over ``limit``; returns (allowed, estimate)"""
+        window_index = int(now // window)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT window_index, current, previous FROM rate_limits WHERE key = ?', (key,)
+            ).fetchone()
+            current, previous = _window_state(*row, window_index) if row else (0, 0)
+            estimate = _estimate(current, previous, now, window)
+            allowed = estimate < limit
+            if allowed:
+                conn.execute('''
+                    INSERT INTO rate_limits (key, window_index, current, previous, expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        window_index = excluded.window_index,
+                        current = excluded.current,
+                        previous = excluded.previous,
+                        expires_at = excluded.expires_at
+                ''', (key, window_index, current + 1, previous, (window_index + 2) * window))
+                estimate += 1
+            self._hits += 1
+            if self._hits % self.prune_every == 0:
+                conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, estimate
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+    def cleanup(self, now=None):
+        """Delete keys whose previous window no longer overlaps the current one"""
+        cursor = self._connection().execute(
+            'DELETE FROM rate_limits WHERE expires_at <= ?', (now or time.time(),)
+        )
+        return cursor.rowcount
+
+def create_backend(storage=None, shards=16):
+    """Counter backend for ``storage``: ``sqlite:///path`` shares counters between
+    worker processes, None keeps them in this process"""
+    if not storage:
+        return MemoryBackend(shards=shards)
+    if storage.startswith(SQLITE_STORAGE_PREFIX):
+        return SQLiteBackend(storage)
+    raise ValueError(f"Unsupported rate limit storage: {storage}")
+
 class RateLimiter:
-    def __init__(self, max_requests=5, window_seconds=60):
+    """Sliding-window-counter rate limiter.
+
+    Approximates a true sliding window from two fixed-window counts per key,
+    so memory and time per check stay constant however busy a client is.
+    """
+
+    def __init__(self, max_requests=5, window_seconds=60, backend=None):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests = {}  # IP: list of timestamps
-        self._cleanup_thread = threading.Thread(target=self._cleanup_old_requests, daemon=True)
-        self._cleanup_thread.start()
-    
-    def is_rate_limited(self, ip):
-        now = datetime.now()
-        if ip not in self.requests:
-            self.requests[ip] = []
-        
-        # Remove old requests
-        self.requests[ip] = [ts for ts in self.requests[ip] 
-                           if now - ts < timedelta(seconds=self.window_seconds)]
-        
-        # Check if too many requests
-        if len(self.requests[ip]) >= self.max_requests:
-            return True
-        
-        # Add new request
-        self.requests[ip].append(now)
-        return False
-    
-    def _cleanup_old_requests(self):
-        while True:
-            now = datetime.now()
-            for ip in list(self.requests.keys()):
-                self.requests[ip] = [ts for ts in self.requests[ip] 
-                                   if now - ts < timedelta(seconds=self.window_seconds)]
-                if not self.requests[ip]:
-                    del self.requests[ip]
-            time.sleep(60)  # Cleanup every minute
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._stats_lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0, 'errors': 0}
+
+    def hit(self, key, limit=None, window=None):
+        """Record a request for ``key``; returns (allowed, remaining, retry_after seconds)"""
+        limit = limit or self.max_requests
+        window = window or self.window_seconds
+        now = time.time()
+        try:
+            allowed, estimate = self.backend.hit(key, limit, window, now)
+        except sqlite3.Error as e:
+            # Fail open: a locked or unavailable store should not take the site down
+            logger.error(f"Rate limit check failed for {key}: {str(e)}")
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            return True, limit, 0
+        with self._stats_lock:
+            self._stats['allowed' if allowed else 'limited'] += 1
+        retry_after = 0 if allowed else int(window - now % window) + 1
+        return allowed, max(int(limit - estimate), 0), retry_after
+
+    def is_rate_limited(self, ip, limit=None, window=None):
+        allowed, _, _ = self.hit(ip, limit, window)
+        return not allowed
+
+    def stats(self):
+        """Allowed/limited counts and the number of tracked keys"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'backend': type(self.backend).__name__,
+            'keys': len(self.backend),
+            'default_limit': self.max_requests,
+            'default_window': self.window_seconds,
+        })
+        return stats
 
 # Create a global rate limiter instance
-limiter = RateLimiter()
-
-def rate_limit(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        ip = request.remote_addr
-        if limiter.is_rate_limited(ip):
-            return jsonify({
-                'error': 'Too many requests. Please try again later.'
-            }), 429
-        return f(*args, **kwargs)
-    return decorated_function
+limiter = RateLimiter(
+    Config.RATE_LIMIT_DEFAULT,
+    Config.RATE_LIMIT_WINDOW,
+    create_backend(Config.RATE_LIMIT_STORAGE, Config.RATE_LIMIT_SHARDS)
+)
+
+def rate_limit(f=None, *, limit=None, window=None, scope=None, key=None, methods=None):
+    """Limit a view per client IP, as ``@rate_limit`` or ``@rate_limit(limit=10, window=60)``.
+
+    ``scope`` names the counter (the view name by default, so every route
+    has its own budget), ``key`` is an optional callable returning the
+    client identity, and ``methods`` limits only those HTTP methods.
+    """
+    def decorator(view):
+        counter = scope or view.__name__
+
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if methods and request.method not in methods:
+                return view(*args, **kwargs)
+            client = key() if key else request.remote_addr
+            allowed, remaining, retry_after = limiter.hit(f"{counter}:{client}", limit, window)
+            if not allowed:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Too many requests. Please try again later.'
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return view(*args, **kwargs)
+        return decorated_function
+
+    if f is not None:
+        return decorator(f)
+    return decorator
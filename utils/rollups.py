@@ -0,0 +1,280 @@
+import logging
+from datetime import datetime, timedelta
+from utils.watermarks import get_watermark, set_watermark, reset_watermark
+
+logger = logging.getLogger(__name__)
+
+# Rollup granularities, finest first. Each maps to the SQLite expression
+# that truncates a timestamp column to its bucket key and the Python
+# format producing the same key.
+BUCKETS = {
+    'hour': ("strftime('%Y-%m-%d %H:00:00', {column})", '%Y-%m-%d %H:00:00'),
+    'day': ("date({column})", '%Y-%m-%d'),
+    'month': ("strftime('%Y-%m-01', {column})", '%Y-%m-01'),
+}
+
+# Raw history tables and the rollup tables maintained from them. Every
+# rollup table has (animal_id, bucket) as its key, a row_count and
+# <metric>_count/_sum/_min/_max columns per metric, so averages stay exact
+# when partial buckets are merged.
+ROLLUP_SOURCES = {
+    'health-metrics': {
+        'table': 'health_metrics',
+        'time_column': 'record_date',
+        'time_format': '%Y-%m-%d %H:%M:%S',
+        'metrics': ('temperature', 'heart_rate', 'respiratory_rate'),
+        'rollups': {'hour': 'health_metrics_hourly', 'day': 'health_metrics_daily'},
+    },
+    'milk-production': {
+        'table': 'milk_production',
+        'time_column': 'production_date',
+        'time_format': '%Y-%m-%d',
+        'metrics': ('amount',),
+        'rollups': {'day': 'milk_production_daily', 'month': 'milk_production_monthly'},
+    },
+}
+
+def watermark_name(source):
+    """job_watermarks key of a source's compaction job"""
+    return f"rollup:{ROLLUP_SOURCES[source]['table']}"
+
+def _aggregate_columns(metrics):
+    """SELECT list aggregating raw metric columns into rollup columns"""
+    return ', '.join(
+        f'COUNT({m}), SUM({m}), MIN({m}), MAX({m})' for m in metrics
+    )
+
+def _rollup_columns(metrics):
+    return ', '.join(
+        f'{m}_count, {m}_sum, {m}_min, {m}_max' for m in metrics
+    )
+
+def _merge_assignments(metrics):
+    """ON CONFLICT assignments folding a new partial bucket into an existing one"""
+    assignments = ['row_count = row_count + excluded.row_count']
+    for m in metrics:
+        assignments += [
+            f'{m}_count = {m}_count + excluded.{m}_count',
+            f'{m}_sum = COALESCE({m}_sum, 0) + COALESCE(excluded.{m}_sum, 0)',
+            # Scalar MIN/MAX return NULL if either side is NULL
+            f'{m}_min = MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min))',
+            f'{m}_max = MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))',
+        ]
+    return ', '.join(assignments)
+
+def _compaction_query(spec, granularity, rollup_table):
+    """INSERT ... SELECT folding raw rows with lower < id <= upper into a rollup"""
+    bucket = BUCKETS[granularity][0].format(column=spec['time_column'])
+    metrics = spec['metrics']
+    return f'''
+        INSERT INTO {rollup_table} (animal_id, bucket, row_count, {_rollup_columns(metrics)})
+        SELECT animal_id, {bucket}, COUNT(*), {_aggregate_columns(metrics)}
+        FROM {spec['table']}
+        WHERE id > ? AND id <= ? AND {spec['time_column']} IS NOT NULL
+        GROUP BY animal_id, {bucket}
+        ON CONFLICT (animal_id, bucket) DO UPDATE SET {_merge_assignments(metrics)}
+    '''
+
+def compact_source(conn, source, batch_size=50000):
+    """Fold raw rows newer than the source's watermark into its rollups.
+
+    Works through the new rows ``batch_size`` ids at a time; every batch
+    updates all rollups and advances the watermark in one transaction, so
+    a crash never counts a row twice. Returns the number of raw rows folded.
+    """
+    spec = ROLLUP_SOURCES[source]
+    name = watermark_name(source)
+    processed = 0
+
+    head = conn.execute(f"SELECT MAX(id) AS id FROM {spec['table']}").fetchone()['id'] or 0
+    watermark = get_watermark(conn, name)
+    while watermark < head:
+        upper = min(watermark + batch_size, head)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for granularity, rollup_table in spec['rollups'].items():
+                conn.execute(_compaction_query(spec, granularity, rollup_table), (watermark, upper))
+            processed += conn.execute(
+                f"SELECT COUNT(*) AS n FROM {spec['table']} WHERE id > ? AND id <= ?",
+                (watermark, upper)
+            ).fetchone()['n']
+            set_watermark(conn, name, upper)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        watermark = upper
+
+    return processed
+
+def compact_rollups(conn, batch_size=50000):
+    """Run the incremental compaction for every rollup source"""
+    processed = {}
+    for source in ROLLUP_SOURCES:
+        processed[source] = compact_source(conn, source, batch_size)
+    logger.info(f"Rollup compaction folded {processed}")
+    return processed
+
+def rebuild_rollups(conn, source=None):
+    """Recompute rollups from scratch, e.g. after raw rows were edited or deleted.
+
+    The incremental job only sees newly inserted ids, so updates and deletes
+    of already compacted rows need a rebuild to be reflected.
+    """
+    for name in ([source] if source else ROLLUP_SOURCES):
+        spec = ROLLUP_SOURCES[name]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for rollup_table in spec['rollups'].values():
+                conn.execute(f'DELETE FROM {rollup_table}')
+            reset_watermark(conn, watermark_name(name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        compact_source(conn, name)
+
+def _parse_bound(value, name):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date or timestamp')
+
+def _truncate(moment, granularity):
+    """Start of the bucket containing ``moment``"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def choose_rollup(source, start, end, resolution=None):
+    """Pick the coarsest rollup whose buckets tile [start, end) exactly.
+
+    ``resolution`` caps the bucket width. If no rollup lines up with the
+    range, the finest one is used and the bounds are widened to whole buckets.
+    Returns ``(granularity, start, end)``.
+    """
+    granularities = [g for g in BUCKETS if g in ROLLUP_SOURCES[source]['rollups']]
+    if resolution is not None:
+        if resolution not in BUCKETS:
+            raise ValueError(f"resolution must be one of: {', '.join(BUCKETS)}")
+        order = list(BUCKETS)
+        granularities = [g for g in granularities if order.index(g) <= order.index(resolution)]
+        if not granularities:
+            raise ValueError(f'{source} has no rollup at {resolution} resolution or finer')
+
+    for granularity in reversed(granularities):
+        if _truncate(start, granularity) == start and _truncate(end, granularity) == end:
+            return granularity, start, end
+
+    granularity = granularities[0]
+    widened_end = _truncate(end, granularity)
+    if widened_end < end:
+        widened_end = _next_bucket(widened_end, granularity)
+    return granularity, _truncate(start, granularity), widened_end
+
+def _next_bucket(moment, granularity):
+    if granularity == 'hour':
+        return moment + timedelta(hours=1)
+    if granularity == 'day':
+        return moment + timedelta(days=1)
+    return (moment.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _empty_bucket(metrics):
+    bucket = {'row_count': 0}
+    for m in metrics:
+        bucket[m] = {'count': 0, 'sum': None, 'min': None, 'max': None}
+    return bucket
+
+def _merge_row(bucket, row, metrics):
+    bucket['row_count'] += row['row_count']
+    for m in metrics:
+        stats = bucket[m]
+        count = row[f'{m}_count']
+        if not count:
+            continue
+        stats['count'] += count
+        stats['sum'] = (stats['sum'] or 0) + row[f'{m}_sum']
+        stats['min'] = row[f'{m}_min'] if stats['min'] is None else min(stats['min'], row[f'{m}_min'])
+        stats['max'] = row[f'{m}_max'] if stats['max'] is None else max(stats['max'], row[f'{m}_max'])
+
+def fetch_rollup_series(conn, source, animal_id, start=None, end=None, resolution=None,
+                        default_days=30):
+    """Return min/max/avg/count per bucket for one animal over [start, end).
+
+    ``end`` defaults to the end of today and ``start`` to ``default_days``
+    before it. Reads the coarsest suitable rollup table and folds in raw rows
+    that the compaction job has not reached yet, so results are current
+    either way.
+    """
+    spec = ROLLUP_SOURCES[source]
+    if end:
+        end = _parse_bound(end, 'end')
+    else:
+        end = _truncate(datetime.now(), 'day') + timedelta(days=1)
+    if start:
+        start = _parse_bound(start, 'start')
+    else:
+        start = end - timedelta(days=default_days)
+    if end <= start:
+        raise ValueError('end must be after start')
+
+    granularity, start, end = choose_rollup(source, start, end, resolution)
+    bucket_expr, bucket_format = BUCKETS[granularity]
+    rollup_table = spec['rollups'][granularity]
+    metrics = spec['metrics']
+    bucket_sql = bucket_expr.format(column=spec['time_column'])
+
+    # The watermark, rollup rows and raw tail are read in one transaction so
+    # they share a snapshot; a compaction committing in between would
+    # otherwise count the rows it just folded in twice
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute('BEGIN')
+    try:
+        watermark = get_watermark(conn, watermark_name(source))
+
+        rollup_rows = conn.execute(f'''
+            SELECT bucket, row_count, {_rollup_columns(metrics)}
+            FROM {rollup_table}
+            WHERE animal_id = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        ''', (animal_id, start.strftime(bucket_format), end.strftime(bucket_format))).fetchall()
+
+        tail_rows = conn.execute(f'''
+            SELECT {bucket_sql} AS bucket, COUNT(*) AS row_count,
+                   {', '.join(f'COUNT({m}) AS {m}_count, SUM({m}) AS {m}_sum, MIN({m}) AS {m}_min, MAX({m}) AS {m}_max' for m in metrics)}
+            FROM {spec['table']}
+            WHERE animal_id = ? AND id > ?
+              AND {spec['time_column']} >= ? AND {spec['time_column']} < ?
+            GROUP BY bucket
+        ''', (animal_id, watermark,
+              start.strftime(spec['time_format']), end.strftime(spec['time_format']))).fetchall()
+    finally:
+        if own_transaction:
+            conn.commit()
+
+    buckets = {}
+    for row in list(rollup_rows) + list(tail_rows):
+        bucket = buckets.setdefault(row['bucket'], _empty_bucket(metrics))
+        _merge_row(bucket, row, metrics)
+
+    series = []
+    for key in sorted(buckets):
+        bucket = buckets[key]
+        point = {'bucket': key, 'count': bucket['row_count']}
+        for m in metrics:
+            stats = bucket[m]
+            stats['avg'] = round(stats['sum'] / stats['count'], 3) if stats['count'] else None
+            point[m] = stats
+        series.append(point)
+
+    return {
+        'resolution': granularity,
+        'start': start.strftime(spec['time_format']),
+        'end': end.strftime(spec['time_format']),
+        'series': series,
+    }
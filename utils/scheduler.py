@@ -6,6 +6,15 @@ import logging
 from utils.socket_handler import send_alert, emit_vaccination_reminder
 from contextlib import contextmanager
 from utils.db_utils import get_db_connection
+from config.database import close_db_connection
+from utils.rollups import compact_rollups
+from utils.herd_queries import fetch_latest_reading_columns
+from utils.health_rules import classify_arrays, format_alert
+from utils.milk_yield import check_milk_yield
+from utils.monitoring import check_health_metrics
+from utils.lactation import refresh_fits
+from config.config import Config
+from utils.session import session_store
 
 logger = logging.getLogger(__name__)
 scheduler = None
@@ -25,15 +34,26 @@ def init_scheduler(app):
     if scheduler is None:
         scheduler = BackgroundScheduler()
         
-        # Add health monitoring job - runs every 5 minutes
+        # Add health monitoring job - runs every HEALTH_CHECK_MINUTES
         scheduler.add_job(
             func=check_animal_health,
-            trigger=CronTrigger(minute='*/5'),
+            trigger=CronTrigger(minute=f'*/{Config.HEALTH_CHECK_MINUTES}'),
             id='health_monitor',
             name='Monitor animal health metrics',
             replace_existing=True
         )
         
+        # Add incremental monitor job - alerts on readings past the watermark
+        scheduler.add_job(
+            func=check_health_metrics,
+            trigger=IntervalTrigger(minutes=Config.HEALTH_MONITOR_MINUTES),
+            id='health_metrics_monitor',
+            name='Alert on new health metrics',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
         # Add vaccination check job - runs daily at 9 AM
         scheduler.add_job(
             func=check_vaccinations,
@@ -43,6 +63,50 @@ def init_scheduler(app):
             replace_existing=True
         )
         
+        # Add rollup compaction job - folds new raw rows into the rollup tables
+        scheduler.add_job(
+            func=compact_history_rollups,
+            trigger=IntervalTrigger(minutes=Config.ROLLUP_COMPACTION_MINUTES),
+            id='rollup_compaction',
+            name='Compact health and milk rollups',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Add milk yield job - re-assesses animals with new milk records
+        scheduler.add_job(
+            func=check_milk_drops,
+            trigger=IntervalTrigger(minutes=Config.MILK_DROP_CHECK_MINUTES),
+            id='milk_yield_monitor',
+            name='Detect milk yield drops',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Add lactation refit job - nightly, so forecasts rarely refit on request
+        scheduler.add_job(
+            func=refresh_lactation_fits,
+            trigger=CronTrigger(hour=2, minute=0),
+            id='lactation_refit',
+            name='Refit changed lactation curves',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Add session expiry job - deletes idle server-side sessions in bulk
+        scheduler.add_job(
+            func=expire_idle_sessions,
+            trigger=IntervalTrigger(minutes=Config.SESSION_EXPIRY_MINUTES),
+            id='session_expiry',
+            name='Expire idle sessions',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
         scheduler.start()
         logger.info("Scheduler started successfully")
     
@@ -52,55 +116,22 @@ def check_animal_health():
     """Check health metrics for all animals"""
     try:
         with get_safe_db() as conn:
-            cursor = conn.cursor()
-            
-            # Get all animals with their latest health metrics
-            cursor.execute("""
-                SELECT a.id, a.name, hm.temperature, hm.heart_rate, hm.respiratory_rate
-                FROM animals a
-                LEFT JOIN health_metrics hm ON a.id = hm.animal_id
-                WHERE hm.record_date = (
-                    SELECT MAX(record_date)
-                    FROM health_metrics
-                    WHERE animal_id = a.id
-                )
-            """)
+            # Latest readings of every animal as columns, scored in one pass
+            herd = fetch_latest_reading_columns(conn)
             
-            animals = cursor.fetchall()
-            
-            for animal in animals:
-                if not animal['temperature']:
-                    continue
-                    
-                # Check temperature
-                if animal['temperature'] > 39.5:
-                    send_alert(animal['id'], {
-                        'type': 'critical',
-                        'animal_name': animal['name'],
-                        'message': f'High temperature ({animal["temperature"]} deg C) - immediate veterinary check required'
-                    })
-                elif animal['temperature'] > 39.0:
-                    send_alert(animal['id'], {
-                        'type': 'warning',
-                        'animal_name': animal['name'],
-                        'message': f'Elevated temperature ({animal["temperature"]} deg C) - keep monitoring'
-                    })
-                
-                # Check heart rate if available
-                if animal['heart_rate'] and (animal['heart_rate'] < 60 or animal['heart_rate'] > 100):
-                    send_alert(animal['id'], {
-                        'type': 'warning',
-                        'animal_name': animal['name'],
-                        'message': f'Abnormal heart rate ({animal["heart_rate"]} bpm) - schedule a check'
-                    })
-                
-                # Check respiratory rate if available
-                if animal['respiratory_rate'] and (animal['respiratory_rate'] < 12 or animal['respiratory_rate'] > 36):
-                    send_alert(animal['id'], {
-                        'type': 'warning',
-                        'animal_name': animal['name'],
-                        'message': f'Abnormal respiratory rate ({animal["respiratory_rate"]} breaths/min) - schedule a check'
-                    })
+        health = classify_arrays(
+            herd['type'], herd['last_temp'], herd['last_heart_rate'],
+            herd['last_respiratory_rate'], herd['milk_production'], herd['weight']
+        )
+        for index in health.flagged():
+            for alert in health.alerts(index):
+                send_alert(herd['id'][index], {
+                    'type': 'critical' if alert['severity'] == 'critical' else 'warning',
+                    'animal_name': herd['name'][index],
+                    'message': f"{format_alert(alert)} - "
+                               + ('immediate veterinary check required' if alert['severity'] == 'critical'
+                                  else 'keep monitoring')
+                })
 
     except Exception as e:
         logger.error(f"Error checking animal health: {str(e)}")
@@ -138,6 +169,43 @@ def check_vaccinations():
     except Exception as e:
         logger.error(f"Error checking vaccinations: {str(e)}")
 
+def compact_history_rollups():
+    """Fold raw health and milk rows newer than the watermarks into the rollups"""
+    try:
+        with get_safe_db() as conn:
+            compact_rollups(conn, Config.ROLLUP_BATCH_SIZE)
+
+    except Exception as e:
+        logger.error(f"Error compacting rollups: {str(e)}")
+
+def check_milk_drops():
+    """Compare new milk records against each animal's rolling baseline"""
+    try:
+        check_milk_yield(Config.MONITOR_BATCH_SIZE)
+
+    except Exception as e:
+        logger.error(f"Error checking milk yield: {str(e)}")
+
+def refresh_lactation_fits():
+    """Refit the lactation curves of every animal with new milk data"""
+    try:
+        with get_safe_db() as conn:
+            refresh_fits(conn)
+
+    except Exception as e:
+        logger.error(f"Error refitting lactation curves: {str(e)}")
+
+def expire_idle_sessions():
+    """Flush pending session activity and delete sessions idle past the timeout"""
+    try:
+        session_store.flush()
+        session_store.expire_idle()
+
+    except Exception as e:
+        logger.error(f"Error expiring sessions: {str(e)}")
+    finally:
+        close_db_connection()
+
 def shutdown_scheduler():
     """Shutdown the scheduler"""
     if scheduler:
@@ -1,37 +1,245 @@
-from flask import session
-from datetime import datetime, timedelta
+from flask import session, g
+from collections import OrderedDict
+from config.config import Config
+from config.database import get_db_connection
+import logging
+import secrets
+import sqlite3
+import threading
+import time
 
-SESSION_TIMEOUT = 3600  # 1 hour in seconds
+logger = logging.getLogger(__name__)
+
+SESSION_TIMEOUT = Config.SESSION_TIMEOUT  # idle seconds before a session expires
+
+class SessionStore:
+    """Server-side sessions: an in-process LRU in front of the users.db sessions table.
+
+    The cookie only carries a random session id. Lookups are served from
+    the LRU and re-read from the table after ``cache_ttl`` seconds so a
+    logout in another worker is noticed. Activity is recorded in memory
+    and written back in one batch at most every ``touch_interval`` seconds,
+    so a busy session costs one UPDATE per interval instead of one per
+    request.
+    """
+
+    def __init__(self, timeout=3600, touch_interval=60, cache_size=10000, cache_ttl=30,
+                 expiry_interval=900):
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.expiry_interval = expiry_interval
+        self._cache = OrderedDict()  # sid: {user_id, last_activity, flushed_activity, loaded_at}
+        self._pending = {}           # sid: last_activity waiting to be written
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._last_expiry = time.time()
+        self._stats = {'hits': 0, 'misses': 0, 'created': 0, 'ended': 0, 'expired': 0, 'flushes': 0}
+
+    def _remember(self, sid, record):
+        """Put a record in the LRU, evicting the least recently used ones"""
+        self._cache[sid] = record
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def create(self, user_id, now=None):
+        """Start a session for ``user_id`` and return its id"""
+        now = now or time.time()
+        sid = secrets.token_urlsafe(32)
+        conn = get_db_connection('users.db')
+        conn.execute(
+            'INSERT INTO sessions (id, user_id, created_at, last_activity) VALUES (?, ?, ?, ?)',
+            (sid, user_id, now, now)
+        )
+        conn.commit()
+        with self._lock:
+            self._remember(sid, {
+                'user_id': user_id, 'last_activity': now,
+                'flushed_activity': now, 'loaded_at': now,
+            })
+            self._stats['created'] += 1
+        return sid
+
+    def _load(self, sid, now):
+        row = get_db_connection('users.db').execute(
+            'SELECT user_id, last_activity FROM sessions WHERE id = ?', (sid,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'user_id': row['user_id'], 'last_activity': row['last_activity'],
+            'flushed_activity': row['last_activity'], 'loaded_at': now,
+        }
+
+    def get(self, sid, now=None):
+        """User id of a live session, or None if it is unknown or idle too long"""
+        now = now or time.time()
+        with self._lock:
+            record = self._cache.get(sid)
+            if record and now - record['loaded_at'] < self.cache_ttl:
+                self._cache.move_to_end(sid)
+                self._stats['hits'] += 1
+            else:
+                record = None
+                self._stats['misses'] += 1
+        if record is None:
+            record = self._load(sid, now)
+            with self._lock:
+                if record is None:
+                    self._cache.pop(sid, None)
+                    self._pending.pop(sid, None)
+                    return None
+                # Activity seen here but not flushed yet is newer than the row
+                cached = self._cache.get(sid)
+                if cached:
+                    record['last_activity'] = max(record['last_activity'], cached['last_activity'])
+                self._remember(sid, record)
+
+        if now - record['last_activity'] > self.timeout:
+            self.end(sid)
+            with self._lock:
+                self._stats['expired'] += 1
+            return None
+        return record['user_id']
+
+    def touch(self, sid, now=None):
+        """Record activity on a session; the write is deferred and batched"""
+        now = now or time.time()
+        with self._lock:
+            record = self._cache.get(sid)
+            if record is None:
+                return
+            record['last_activity'] = now
+            if now - record['flushed_activity'] >= self.touch_interval:
+                self._pending[sid] = now
+                record['flushed_activity'] = now
+            flush_due = self._pending and now - self._last_flush >= self.touch_interval
+        if flush_due:
+            self.flush(now)
+
+    def flush(self, now=None):
+        """Write pending activity times in one transaction; returns rows written"""
+        now = now or time.time()
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._last_flush = now
+            expiry_due = now - self._last_expiry >= self.expiry_interval
+            if expiry_due:
+                self._last_expiry = now
+        if pending:
+            conn = get_db_connection('users.db')
+            try:
+                conn.executemany(
+                    'UPDATE sessions SET last_activity = MAX(last_activity, ?) WHERE id = ?',
+                    [(activity, sid) for sid, activity in pending]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Error flushing session activity: {str(e)}")
+                with self._lock:
+                    for sid, activity in pending:
+                        self._pending.setdefault(sid, activity)
+                return 0
+            with self._lock:
+                self._stats['flushes'] += 1
+        if expiry_due:
+            self.expire_idle(now)
+        return len(pending)
+
+    def end(self, sid):
+        """Remove a session everywhere"""
+        with self._lock:
+            self._cache.pop(sid, None)
+            self._pending.pop(sid, None)
+            self._stats['ended'] += 1
+        conn = get_db_connection('users.db')
+        conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+        conn.commit()
+
+    def expire_idle(self, now=None):
+        """Delete every session idle longer than the timeout; returns the number removed"""
+        now = now or time.time()
+        cutoff = now - self.timeout
+        with self._lock:
+            # Sessions active here but not flushed yet must survive the sweep
+            live = [(record['last_activity'], sid) for sid, record in self._cache.items()
+                    if record['last_activity'] >= cutoff and record['flushed_activity'] < cutoff]
+            for sid in [sid for sid, record in self._cache.items() if record['last_activity'] < cutoff]:
+                self._cache.pop(sid)
+                self._pending.pop(sid, None)
+        conn = get_db_connection('users.db')
+        try:
+            if live:
+                conn.executemany(
+                    'UPDATE sessions SET last_activity = MAX(last_activity, ?) WHERE id = ?', live
+                )
+            removed = conn.execute('DELETE FROM sessions WHERE last_activity < ?', (cutoff,)).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Error expiring idle sessions: {str(e)}")
+            return 0
+        with self._lock:
+            self._stats['expired'] += removed
+        if removed:
+            logger.info(f"Expired {removed} idle sessions")
+        return removed
+
+    def stats(self):
+        """Cache and flush counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'cached': len(self._cache), 'pending': len(self._pending)})
+        return stats
+
+session_store = SessionStore(
+    timeout=Config.SESSION_TIMEOUT,
+    touch_interval=Config.SESSION_TOUCH_INTERVAL,
+    cache_size=Config.SESSION_CACHE_SIZE,
+    cache_ttl=Config.SESSION_CACHE_TTL,
+    expiry_interval=Config.SESSION_EXPIRY_MINUTES * 60,
+)
 
 def initialize_session(user_id):
     """Initialize a secure session with timeout"""
+    previous = session.get('sid')
+    if previous:
+        session_store.end(previous)
     session.clear()  # Clear any existing session data
     session.permanent = True
-    session['user_id'] = user_id
-    session['login_time'] = datetime.utcnow().timestamp()
-    session['last_activity'] = datetime.utcnow().timestamp()
-    session['csrf_token_expiry'] = (datetime.utcnow() + timedelta(hours=24)).timestamp()
+    session['sid'] = session_store.create(user_id)
+    g.session_user_id = user_id
+
+def _load_session_user():
+    sid = session.get('sid')
+    if not sid:
+        return None
+    now = time.time()
+    user_id = session_store.get(sid, now)
+    if user_id is None:
+        session.clear()
+        return None
+    session_store.touch(sid, now)
+    return user_id
 
 def validate_session():
     """Validate session and handle timeouts"""
-    if 'user_id' not in session:
-        return False
-
-    current_time = datetime.utcnow().timestamp()
-    
-    # Check for session timeout
-    if current_time - session.get('last_activity', 0) > SESSION_TIMEOUT:
-        session.clear()
-        return False
-    
-    # Update last activity
-    session['last_activity'] = current_time
-    return True
+    return get_current_user_id() is not None
 
 def end_session():
     """Securely end the session"""
+    sid = session.get('sid')
+    if sid:
+        session_store.end(sid)
     session.clear()
+    g.session_user_id = None
 
 def get_current_user_id():
-    """Get the current user ID from session"""
-    return session.get('user_id') if validate_session() else None
\ No newline at end of file
+    """Get the current user ID, validating the session once per request"""
+    if 'session_user_id' not in g:
+        g.session_user_id = _load_session_user()
+    return g.session_user_id
@@ -1,16 +1,151 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import logging
+import threading
+import time
 from datetime import datetime
-import eventlet
-from utils.db_utils import get_db_connection
+from config.config import Config
+from utils.db_utils import get_db_connection, execute_query
+from utils.telemetry import telemetry_buffer, normalize_reading
+from utils.socket_queue import socketio_queue_options
+from utils.session import get_current_user_id
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 socketio = SocketIO()
 
+OWNED_ANIMALS_TTL = 60  # seconds
+_owned_animals = {}  # user_id: (expires_at, set of animal ids)
+
+class AlertBatcher:
+    """Coalesces outbound alert emits per room over a short tick.
+
+    Alerts queued for the same event and room within one tick go out as a
+    single ``<event>_batch`` payload; a lone alert keeps its usual event and
+    shape. Events in ``coalesce_events`` only send their latest payload per
+    room. Identical alerts repeated within ``repeat_seconds`` are dropped.
+    """
+
+    def __init__(self, tick=0.5, repeat_seconds=600, coalesce_events=('health_update',)):
+        self.tick = tick
+        self.repeat_seconds = repeat_seconds
+        self.coalesce_events = set(coalesce_events)
+        self._pending = {}  # (event, room): [payload, ...]
+        self._recent = {}   # dedupe key: monotonic time last queued
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {
+            'queued': 0,
+            'suppressed': 0,
+            'emits': 0,
+            'batches': 0,
+            'emits_saved': 0,
+            'failed': 0,
+            'flushes': 0,
+        }
+
+    def start(self):
+        """Start the flusher thread if it is not running yet"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='alert-batcher', daemon=True)
+            self._thread.start()
+
+    def queue(self, event, room, payload, dedupe=True):
+        """Queue one payload for ``room`` (None broadcasts); returns False if suppressed"""
+        now = time.monotonic()
+        key = (event, room, repr(sorted((k, v) for k, v in payload.items() if k != 'timestamp')))
+        with self._lock:
+            if dedupe:
+                last = self._recent.get(key)
+                if last is not None and now - last < self.repeat_seconds:
+                    self._stats['suppressed'] += 1
+                    return False
+                self._recent[key] = now
+            self._stats['queued'] += 1
+            self._pending.setdefault((event, room), []).append(payload)
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        self._wakeup.set()
+        return True
+
+    def stats(self):
+        """Return a snapshot of the batcher counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(items) for items in self._pending.values())
+        stats['tick'] = self.tick
+        return stats
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let the rest of this tick's alerts arrive before flushing
+            time.sleep(self.tick)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Emit everything queued so far, one emit per event and room"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            cutoff = time.monotonic() - self.repeat_seconds
+            self._recent = {key: at for key, at in self._recent.items() if at >= cutoff}
+        if not pending:
+            return
+
+        emits = 0
+        batches = 0
+        sent = 0
+        failed = 0
+        for (event, room), items in pending.items():
+            queued = len(items)
+            if event in self.coalesce_events:
+                items = items[-1:]
+            try:
+                if len(items) == 1:
+                    socketio.emit(event, items[0], to=room)
+                else:
+                    socketio.emit(f'{event}_batch', {
+                        'count': len(items),
+                        'items': items,
+                        'timestamp': datetime.now().isoformat()
+                    }, to=room)
+            except Exception as e:
+                failed += queued
+                logger.error(f"Error emitting {event} batch to {room or 'all clients'}: {str(e)}")
+                continue
+            emits += 1
+            if len(items) > 1:
+                batches += 1
+            sent += queued
+
+        # Only alerts that went out count towards the emits saved
+        with self._lock:
+            self._stats['emits'] += emits
+            self._stats['batches'] += batches
+            self._stats['emits_saved'] += sent - emits
+            self._stats['failed'] += failed
+            self._stats['flushes'] += 1
+        logger.info(f"Sent {sent} alerts as {emits} emits to {len(pending)} rooms")
+
+alert_batcher = AlertBatcher(
+    tick=Config.ALERT_BATCH_TICK,
+    repeat_seconds=Config.ALERT_REPEAT_SECONDS
+)
+
 def init_socketio(app):
     """Initialize SocketIO with the Flask application"""
-    socketio.init_app(app, async_mode='eventlet', cors_allowed_origins="*")
+    socketio.init_app(
+        app, async_mode=Config.SOCKETIO_ASYNC_MODE, cors_allowed_origins="*",
+        # Share rooms and broadcasts with the other workers, if configured
+        **socketio_queue_options(
+            Config.SOCKETIO_MESSAGE_QUEUE,
+            poll_interval=Config.SOCKETIO_QUEUE_POLL_INTERVAL,
+            retention=Config.SOCKETIO_QUEUE_RETENTION
+        )
+    )
     
     @socketio.on('connect')
     def handle_connect():
@@ -26,12 +161,22 @@ def init_socketio(app):
         if animal_id:
             join_animal_room(animal_id)
     
+    @socketio.on('join_herd')
+    def on_join_herd():
+        return join_herd_rooms()
+    
     @socketio.on('leave')
     def on_leave(data):
         animal_id = data.get('animal_id')
         if animal_id:
             leave_animal_room(animal_id)
     
+    @socketio.on('telemetry')
+    def on_telemetry(data):
+        return ingest_telemetry(data)
+    
+    telemetry_buffer.on_flush = emit_telemetry_updates
+    
     return socketio
 
 @contextmanager
@@ -43,22 +188,103 @@ def get_safe_db():
     finally:
         conn.close()
 
+def _owned_animal_ids(user_id, refresh=False):
+    """Animal ids of a user, cached briefly so telemetry does not query per reading"""
+    now = time.monotonic()
+    cached = _owned_animals.get(user_id)
+    if cached and cached[0] > now and not refresh:
+        return cached[1]
+    rows = execute_query('animals.db', 'SELECT id FROM animal WHERE user_id = ?', (user_id,))
+    owned = {row['id'] for row in rows}
+    _owned_animals[user_id] = (now + OWNED_ANIMALS_TTL, owned)
+    return owned
+
+def ingest_telemetry(data):
+    """Queue collar/bolus readings for write-behind storage and ack the client"""
+    user_id = get_current_user_id()
+    if not user_id:
+        return {'success': False, 'error': 'Unauthorized'}
+    
+    readings = data if isinstance(data, list) else [data]
+    owned = _owned_animal_ids(user_id)
+    refreshed = False
+    accepted = 0
+    dropped = 0
+    errors = []
+    for index, item in enumerate(readings):
+        try:
+            reading = normalize_reading(item)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        if reading['animal_id'] not in owned and not refreshed:
+            # The animal may have been added since the herd was cached
+            owned = _owned_animal_ids(user_id, refresh=True)
+            refreshed = True
+        if reading['animal_id'] not in owned:
+            errors.append({'index': index, 'error': 'Animal not found'})
+            continue
+        if telemetry_buffer.submit(reading):
+            accepted += 1
+        else:
+            dropped += 1
+    
+    backpressure = telemetry_buffer.is_backpressured()
+    if backpressure or dropped:
+        # Ask the sender to slow down until the writer catches up
+        emit('telemetry_backpressure', {
+            'queue_depth': telemetry_buffer.queue_depth(),
+            'dropped': dropped,
+            'retry_after': Config.TELEMETRY_FLUSH_INTERVAL
+        })
+    
+    return {
+        'success': True,
+        'accepted': accepted,
+        'dropped': dropped,
+        'errors': errors,
+        'backpressure': backpressure
+    }
+
+def emit_telemetry_updates(readings):
+    """Push the newest stored reading per animal to its room"""
+    latest = {}
+    for reading in readings:
+        latest[reading['animal_id']] = reading
+    try:
+        for animal_id, reading in latest.items():
+            room = f"animal_{animal_id}"
+            if reading['temperature'] is not None:
+                socketio.emit('temperature_update', {
+                    'animal_id': animal_id,
+                    'temperature': reading['temperature'],
+                    'heart_rate': reading['heart_rate'],
+                    'record_date': reading['record_date']
+                }, to=room)
+            if reading['steps'] is not None:
+                socketio.emit('activity_update', {
+                    'animal_id': animal_id,
+                    'steps': reading['steps'],
+                    'record_date': reading['record_date']
+                }, to=room)
+        logger.debug(f"Telemetry updates sent for {len(latest)} animals")
+    except Exception as e:
+        logger.error(f"Error sending telemetry updates: {str(e)}")
+
 def send_alert(animal_id, alert_data):
-    """Send an alert to specific animal's room."""
+    """Queue an alert for a specific animal's room."""
     try:
         room = f"animal_{animal_id}"
         alert_data['timestamp'] = datetime.now().isoformat()
-        socketio.emit('alert', alert_data, to=room)
-        logger.info(f"Alert sent to room {room}")
+        alert_batcher.queue('alert', room, alert_data)
     except Exception as e:
         logger.error(f"Error sending alert: {str(e)}")
 
 def broadcast_emergency(alert_data):
-    """Broadcast emergency alert to all connected clients."""
+    """Queue an emergency alert for all connected clients."""
     try:
         alert_data['timestamp'] = datetime.now().isoformat()
-        socketio.emit('emergency', alert_data, namespace='/')
-        logger.info("Emergency broadcast sent")
+        alert_batcher.queue('emergency', None, alert_data)
     except Exception as e:
         logger.error(f"Error broadcasting emergency: {str(e)}")
 
@@ -71,6 +297,21 @@ def join_animal_room(animal_id):
     except Exception as e:
         logger.error(f"Error joining room: {str(e)}")
 
+def join_herd_rooms():
+    """Join the rooms of every animal of the current user, e.g. for the dashboard"""
+    user_id = get_current_user_id()
+    if not user_id:
+        return {'success': False, 'error': 'Unauthorized'}
+    try:
+        owned = _owned_animal_ids(user_id)
+        for animal_id in owned:
+            join_room(f"animal_{animal_id}")
+        logger.info(f"Client joined the rooms of {len(owned)} animals")
+        return {'success': True, 'animals': len(owned)}
+    except Exception as e:
+        logger.error(f"Error joining herd rooms: {str(e)}")
+        return {'success': False, 'error': 'Could not join herd rooms'}
+
 def leave_animal_room(animal_id):
     """Leave a specific animal's notification room."""
     try:
@@ -84,8 +325,8 @@ def emit_health_update(animal_id, health_data):
     """Emit health update for a specific animal."""
     try:
         room = f"animal_{animal_id}"
-        socketio.emit('health_update', health_data, to=room)
-        logger.info(f"Health update sent to room {room}")
+        # Only the newest update per room and tick is sent
+        alert_batcher.queue('health_update', room, health_data, dedupe=False)
     except Exception as e:
         logger.error(f"Error sending health update: {str(e)}")
 
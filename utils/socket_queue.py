@@ -0,0 +1,108 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import socketio
+
+logger = logging.getLogger(__name__)
+
+SQLITE_QUEUE_PREFIX = 'sqlite:///'
+
+class SQLiteQueueManager(socketio.PubSubManager):
+    """Socket.IO client manager that shares rooms and broadcasts through SQLite.
+
+    Every worker process appends its emits, room changes and disconnects to
+    a WAL-mode queue table and tails the same table for messages from other
+    workers, so an alert emitted by one worker (or by the scheduler running
+    in it) reaches clients connected to any of them. It is a drop-in local
+    stand-in for the Redis/Kombu managers of python-socketio.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///data/socketio_queue.db', channel='socketio',
+                 write_only=False, logger=None, poll_interval=0.05, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.db_path = url[len(SQLITE_QUEUE_PREFIX):] if url.startswith(SQLITE_QUEUE_PREFIX) else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._published = 0
+        self._ensure_table()
+
+    def _connection(self):
+        """One connection per thread, since the listener runs on its own"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_table(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS socketio_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _publish(self, data):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT INTO socketio_queue (channel, payload, created_at) VALUES (?, ?, ?)',
+            (self.channel, pickle.dumps(data), now)
+        )
+        self._published += 1
+        # Listeners only read recent rows, so old ones are pruned as we go
+        if self._published % 1000 == 0:
+            conn.execute('DELETE FROM socketio_queue WHERE created_at < ?', (now - self.retention,))
+        conn.commit()
+
+    def _sleep(self):
+        if self.server is not None:
+            self.server.sleep(self.poll_interval)
+        else:
+            time.sleep(self.poll_interval)
+
+    def _listen(self):
+        conn = self._connection()
+        # Start at the current end of the queue instead of replaying history
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_queue').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_queue WHERE id > ? AND channel = ? ORDER BY id LIMIT 500',
+                (last_id, self.channel)
+            ).fetchall()
+            # End the read transaction so the WAL can be checkpointed
+            conn.commit()
+            if not rows:
+                self._sleep()
+                continue
+            for message_id, payload in rows:
+                last_id = message_id
+                yield payload
+
+def socketio_queue_options(url, poll_interval=0.05, retention=60):
+    """SocketIO keyword arguments selecting the cross-process backend for ``url``.
+
+    ``sqlite:///path`` uses SQLiteQueueManager; any other URL (redis://,
+    amqp://, ...) is handed to Flask-SocketIO as its message_queue; no URL
+    keeps the single-process in-memory manager.
+    """
+    if not url:
+        return {}
+    if url.startswith(SQLITE_QUEUE_PREFIX):
+        return {'client_manager': SQLiteQueueManager(url, poll_interval=poll_interval,
+                                                     retention=retention)}
+    return {'message_queue': url}
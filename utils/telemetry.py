@@ -0,0 +1,208 @@
+import logging
+import math
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config.config import Config
+from config.database import close_db_connection
+from utils.db_utils import execute_many
+
+logger = logging.getLogger(__name__)
+
+INSERT_READING_QUERY = '''
+    INSERT INTO health_metrics (
+        animal_id, temperature, heart_rate, respiratory_rate, record_date, notes
+    ) VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def normalize_reading(data):
+    """Validate one sensor reading and return it as a dict; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('Reading must be an object')
+    try:
+        animal_id = int(data['animal_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('animal_id is required')
+
+    reading = {'animal_id': animal_id}
+    for field, cast in (('temperature', float), ('heart_rate', int),
+                        ('respiratory_rate', int), ('steps', int)):
+        value = data.get(field)
+        if value is None:
+            reading[field] = None
+            continue
+        try:
+            reading[field] = cast(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f'{field} must be numeric')
+        # NaN compares false against every alert threshold
+        if not math.isfinite(reading[field]):
+            raise ValueError(f'{field} must be numeric')
+
+    if all(reading[field] is None for field in ('temperature', 'heart_rate', 'respiratory_rate', 'steps')):
+        raise ValueError('Reading has no measurements')
+
+    recorded_at = data.get('recorded_at')
+    if recorded_at:
+        try:
+            recorded_at = datetime.fromisoformat(str(recorded_at))
+        except ValueError:
+            raise ValueError('recorded_at must be an ISO timestamp')
+    else:
+        recorded_at = datetime.utcnow()
+    reading['record_date'] = recorded_at.strftime('%Y-%m-%d %H:%M:%S')
+    reading['source'] = str(data.get('source') or 'sensor')[:50]
+    return reading
+
+class TelemetryBuffer:
+    """Bounded write-behind queue that group-commits sensor readings.
+
+    Readings are accepted without touching the database. A single flusher
+    thread writes them to health_metrics in one transaction per batch, when
+    ``batch_size`` readings are waiting or ``flush_interval`` seconds have
+    passed. When the queue is full new readings are dropped and counted.
+    """
+
+    def __init__(self, maxsize=50000, batch_size=500, flush_interval=1.0,
+                 high_watermark=0.8, max_retries=3):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.high_watermark = int(maxsize * high_watermark)
+        self.max_retries = max_retries
+        self.on_flush = None  # called with the readings of each committed batch
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'received': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'flushes': 0,
+            'max_queue_depth': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def start(self):
+        """Start the flusher thread if it is not running yet"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='telemetry-flusher', daemon=True)
+            self._thread.start()
+        logger.info("Telemetry flusher started")
+
+    def stop(self, timeout=5):
+        """Stop the flusher after writing whatever is still queued"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, reading):
+        """Queue a normalized reading; returns False if it had to be dropped"""
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['received'] += 1
+            depth = self._queue.qsize()
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        # Started by the first reading, so only processes receiving telemetry run a flusher
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        return True
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def is_backpressured(self):
+        """True once the queue is above its high-water mark"""
+        return self._queue.qsize() >= self.high_watermark
+
+    def stats(self):
+        """Return a snapshot of the buffer counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_capacity'] = self.maxsize
+        stats['backpressure'] = self.is_backpressured()
+        return stats
+
+    def _collect(self):
+        """Wait for up to one batch of readings or until the flush interval ends"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drain readings that are already waiting without further blocking
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch):
+        """Write one batch of readings in a single transaction"""
+        rows = [
+            (r['animal_id'], r['temperature'], r['heart_rate'], r['respiratory_rate'],
+             r['record_date'], f"telemetry:{r['source']}")
+            for r in batch
+            if r['temperature'] is not None or r['heart_rate'] is not None
+            or r['respiratory_rate'] is not None
+        ]
+        started = time.perf_counter()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if rows:
+                    execute_many('animals.db', INSERT_READING_QUERY, rows)
+                break
+            except sqlite3.Error as e:
+                logger.warning(f"Telemetry flush attempt {attempt} failed: {str(e)}")
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self._stats['failed'] += len(batch)
+                    logger.error(f"Dropping {len(batch)} telemetry readings after {attempt} attempts")
+                    return
+                time.sleep(0.1 * attempt)
+            finally:
+                close_db_connection()
+
+        with self._lock:
+            self._stats['written'] += len(rows)
+            self._stats['flushes'] += 1
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+        if self.on_flush:
+            try:
+                self.on_flush(batch)
+            except Exception as e:
+                logger.error(f"Error in telemetry flush callback: {str(e)}")
+
+telemetry_buffer = TelemetryBuffer(
+    maxsize=Config.TELEMETRY_QUEUE_SIZE,
+    batch_size=Config.TELEMETRY_BATCH_SIZE,
+    flush_interval=Config.TELEMETRY_FLUSH_INTERVAL,
+    high_watermark=Config.TELEMETRY_HIGH_WATERMARK
+)
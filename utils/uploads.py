@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from config.config import Config
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pillow format names of the accepted photo types and the extension stored for each
+IMAGE_FORMATS = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif', 'WEBP': 'webp'}
+THUMBNAIL_DIR = 'thumbs'
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = set()  # stored photos whose variants are being generated
+
+class UploadError(ValueError):
+    """Raised for uploads that are too large or not a supported image"""
+
+def upload_size(file):
+    """Size of an uploaded file, found by seeking instead of reading it"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def _stream_to_temp(file, max_bytes, directory):
+    """Copy an upload to a temp file in ``directory`` chunk by chunk, hashing as it goes"""
+    digest = hashlib.sha256()
+    written = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(Config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadError(f"Photo must not exceed {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+def _image_extension(path):
+    """Extension for the image format of a file, judged by its content"""
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(path) as img:
+            image_format = img.format
+            img.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        image_format = None
+    if image_format not in IMAGE_FORMATS:
+        raise UploadError('Only PNG, JPG, JPEG, GIF or WEBP files are accepted')
+    return IMAGE_FORMATS[image_format]
+
+def save_upload(file, max_bytes=None):
+    """Store an uploaded photo under its content hash and queue its thumbnails.
+
+    The upload is streamed to disk and abandoned as soon as it passes
+    ``max_bytes``. Identical photos share one file, so a re-upload costs
+    no extra space and no extra thumbnailing. Returns the stored filename.
+    """
+    max_bytes = max_bytes or Config.UPLOAD_MAX_PHOTO_BYTES
+    folder = Config.UPLOAD_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    temp_path, content_hash = _stream_to_temp(file, max_bytes, folder)
+    try:
+        filename = f"{content_hash}.{_image_extension(temp_path)}"
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+            logger.info(f"Photo {filename} already stored, upload deduplicated")
+        else:
+            os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    queue_variants(filename)
+    return filename
+
+def variant_filename(filename, variant):
+    """File name of a generated WebP variant of a stored photo"""
+    return f"{filename.rsplit('.', 1)[0]}_{variant}.webp"
+
+def variant_path(filename, variant):
+    return os.path.join(Config.UPLOAD_FOLDER, THUMBNAIL_DIR, variant_filename(filename, variant))
+
+def generate_variants(folder, filename, sizes, quality):
+    """Write WebP variants no wider or taller than each of ``sizes``; returns their names.
+
+    Runs in the thumbnail process pool.
+    """
+    from PIL import Image, ImageOps
+    target_dir = os.path.join(folder, THUMBNAIL_DIR)
+    os.makedirs(target_dir, exist_ok=True)
+    written = []
+    with Image.open(os.path.join(folder, filename)) as img:
+        # Phone photos are stored sideways with an EXIF rotation flag
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for variant, size in sizes.items():
+            name = variant_filename(filename, variant)
+            path = os.path.join(target_dir, name)
+            if os.path.exists(path):
+                continue
+            resized = img.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(temp_path, 'WEBP', quality=quality, method=4)
+            os.replace(temp_path, path)
+            written.append(name)
+    return written
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+def _variants_done(filename, future):
+    with _pool_lock:
+        _pending.discard(filename)
+    try:
+        written = future.result()
+        if written:
+            logger.info(f"Generated {len(written)} variants of {filename}")
+    except Exception as e:
+        logger.error(f"Error generating variants of {filename}: {str(e)}")
+
+def queue_variants(filename):
+    """Generate a photo's thumbnails in the background unless they exist or are queued"""
+    if all(os.path.exists(variant_path(filename, variant)) for variant in Config.THUMBNAIL_SIZES):
+        return
+    args = (Config.UPLOAD_FOLDER, filename, Config.THUMBNAIL_SIZES, Config.THUMBNAIL_QUALITY)
+    if not Config.THUMBNAIL_WORKERS:
+        try:
+            generate_variants(*args)
+        except Exception as e:
+            logger.error(f"Error generating variants of {filename}: {str(e)}")
+        return
+    with _pool_lock:
+        if filename in _pending:
+            return
+        _pending.add(filename)
+    future = _executor().submit(generate_variants, *args)
+    future.add_done_callback(lambda done: _variants_done(filename, done))
+
+def photo_urls(filename):
+    """Original, thumbnail and WebP URLs of a stored photo.
+
+    Variants that are not generated yet fall back to the original, so
+    clients can always use the thumbnail URL.
+    """
+    if not filename:
+        return {'image_url': None, 'thumbnail_url': None, 'webp_url': None}
+    base = '/' + Config.UPLOAD_FOLDER.strip('/')
+    original = f"{base}/{filename}"
+    urls = {'image_url': original}
+    for key, variant in (('thumbnail_url', 'thumb'), ('webp_url', 'medium')):
+        if os.path.exists(variant_path(filename, variant)):
+            urls[key] = f"{base}/{THUMBNAIL_DIR}/{variant_filename(filename, variant)}"
+        else:
+            urls[key] = original
+    return urls
+
+def shutdown_thumbnail_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
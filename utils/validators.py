@@ -1,5 +1,6 @@
 import re
 from typing import Optional, Tuple
+from utils.uploads import upload_size
 
 def validate_email(email: str) -> Tuple[bool, str]:
     """Validate email format."""
@@ -66,14 +67,11 @@ def validate_animal_data(data: dict, file=None) -> tuple[bool, str | None]:
 
     # Validate photo if provided
     if file and file.filename:
-        # Check file size (max 5MB)
+        # Check file size (max 5MB) without reading the upload into memory
         MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB in bytes
-        if len(file.read()) > MAX_FILE_SIZE:
+        if upload_size(file) > MAX_FILE_SIZE:
             return False, "Photo must not exceed 5MB"
         
-        # Reset file pointer after reading
-        file.seek(0)
-        
         # Check file extension
         allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
         if not '.' in file.filename or \
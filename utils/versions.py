@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from flask import request, jsonify, Response
+import hashlib
+import threading
+
+# Data versions are maintained by the triggers of the animals.db v7
+# migration; reading one is a primary-key lookup that never touches the
+# history tables.
+
+def animal_version(conn, user_id, animal_id):
+    """Data version of a user's animal, or None if the user has no such animal"""
+    row = conn.execute('''
+        SELECT COALESCE(v.version, 0) AS version
+        FROM animal a
+        LEFT JOIN animal_versions v ON v.animal_id = a.id
+        WHERE a.id = ? AND a.user_id = ?
+    ''', (animal_id, user_id)).fetchone()
+    return row['version'] if row else None
+
+def user_version(conn, user_id):
+    """Version bumped by every write to any of a user's animals or their history"""
+    row = conn.execute('SELECT version FROM user_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row['version'] if row else 0
+
+def make_etag(*parts):
+    """Opaque ETag for a response built from ``parts`` (resource, version, query...)"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+def is_fresh(etag):
+    """True when the client's If-None-Match already holds ``etag``"""
+    return etag in request.if_none_match
+
+def not_modified(etag):
+    """Empty 304 response for a fresh conditional GET"""
+    response = Response(status=304)
+    return _tag(response, etag)
+
+def etag_json(payload, etag):
+    """JSON response carrying ``etag``; clients must revalidate before reuse"""
+    return _tag(jsonify(payload), etag)
+
+def _tag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+class VersionedCache:
+    """Bounded LRU of values derived from a user's data, valid while its version holds.
+
+    ``get`` returns the cached value when it was computed at ``version``
+    and otherwise calls ``compute`` and keeps the result; a write to the
+    herd bumps the version, so stale entries are never served.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key: (version, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,24 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# High-water marks of incremental jobs, stored in the job_watermarks table
+# of animals.db. A job processes rows with ids above its mark and advances
+# the mark in the same transaction as its own writes.
+
+def get_watermark(conn, name):
+    """Return the last processed id of a job, 0 if it never ran"""
+    row = conn.execute('SELECT last_id FROM job_watermarks WHERE name = ?', (name,)).fetchone()
+    return row['last_id'] if row else 0
+
+def set_watermark(conn, name, last_id):
+    """Record the last processed id of a job; does not commit"""
+    conn.execute('''
+        INSERT INTO job_watermarks (name, last_id, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+    ''', (name, last_id))
+
+def reset_watermark(conn, name):
+    """Forget a job's progress so it starts again from the first row; does not commit"""
+    conn.execute('DELETE FROM job_watermarks WHERE name = ?', (name,))